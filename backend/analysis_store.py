@@ -0,0 +1,122 @@
+"""Scored candidates of recent analyses, kept for re-ranking
+
+Each analysis stores its ScoredCandidates (per-criterion score vectors)
+and request context under an analysis id. /api/rerank loads them and
+recomputes only the weighted sum and top-k, so moving a criteria slider
+needs no resampling and no Gemini calls, and the candidate set stays the
+same between tweaks.
+
+Entries live in an in-process LRU as ready-to-use arrays, backed by a
+SQLite tier so a rerank routed to another gunicorn worker still finds
+the analysis.
+
+An analysis is a pure function of its request fingerprint (see
+analysis_fingerprint). The fingerprint doubles as the analysis id, and
+result_cache keeps each finished response under it, shared across workers
+through the same SQLite file, so a repeated request skips sampling and
+scoring.
+"""
+import hashlib
+import json
+import os
+import uuid
+
+from caching import TTLCache, SQLiteCache, TieredCache
+from scoring import ScoredCandidates
+
+ANALYSIS_TTL = int(os.getenv('ANALYSIS_TTL', 3600))
+# Results built on a fallback parse or explanation
+ANALYSIS_FALLBACK_TTL = int(os.getenv('ANALYSIS_FALLBACK_TTL', 60))
+ANALYSIS_MEMORY_ENTRIES = int(os.getenv('ANALYSIS_MEMORY_ENTRIES', 64))
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 256))
+
+# Everything an analysis response depends on; query_key is the normalized
+# query text, which the explanations are written for
+FINGERPRINT_FIELDS = (
+    'query_key', 'energy_type', 'region', 'regions', 'num_sites', 'criteria_weights',
+    'constraints', 'seed', 'sampling_method', 'explain_top'
+)
+_analysis_store_path = os.getenv(
+    'ANALYSIS_STORE_PATH',
+    os.path.join(os.path.dirname(__file__), 'data', 'analyses.sqlite3')
+)
+
+
+class AnalysisStore:
+    """Memory-first store of (ScoredCandidates, context) by analysis id"""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def save(self, scored, context, analysis_id=None):
+        """
+        Store an analysis
+
+        Args:
+            scored: ScoredCandidates of the analysis
+            context: JSON-serializable dict (weights, constraints, region, ...)
+            analysis_id: Id to store under, usually the request fingerprint;
+                a random id when omitted
+
+        Returns:
+            The analysis id
+        """
+        analysis_id = analysis_id or uuid.uuid4().hex
+        self.memory.set(analysis_id, (scored, context))
+        if self.disk is not None:
+            self.disk.set(analysis_id, {'scored': scored.to_dict(), 'context': context})
+        return analysis_id
+
+    def load(self, analysis_id):
+        """Return (ScoredCandidates, context), or None if unknown or expired"""
+        entry = self.memory.get(analysis_id)
+        if entry is not None or self.disk is None:
+            return entry
+
+        record, remaining = self.disk.get_entry(analysis_id)
+        if record is None:
+            return None
+        entry = (ScoredCandidates.from_dict(record['scored']), record['context'])
+        self.memory.set(analysis_id, entry, ttl=remaining)
+        return entry
+
+    def stats(self):
+        return {
+            'memory': self.memory.stats(),
+            'disk': self.disk.stats() if self.disk is not None else None,
+        }
+
+
+analysis_store = AnalysisStore(
+    TTLCache(max_entries=ANALYSIS_MEMORY_ENTRIES, default_ttl=ANALYSIS_TTL),
+    SQLiteCache(_analysis_store_path, table='analyses', max_entries=1000, default_ttl=ANALYSIS_TTL)
+    if _analysis_store_path else None
+)
+
+# Serialized responses of finished analyses, by request fingerprint
+result_cache = TieredCache(
+    TTLCache(max_entries=RESULT_CACHE_SIZE, default_ttl=ANALYSIS_TTL),
+    SQLiteCache(_analysis_store_path, table='analysis_results', max_entries=1000, default_ttl=ANALYSIS_TTL)
+    if _analysis_store_path else None
+)
+
+
+def _digest(payload):
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def sampling_seed(energy_type, regions, num_sites, sampling_method):
+    """
+    Seed for a request that does not pass filters.seed
+
+    Derived only from what decides the candidate pool, so requests that
+    differ in weights, constraints or wording sample the same candidates.
+    """
+    return int(_digest([energy_type, regions, num_sites, sampling_method])[:16], 16)
+
+
+def analysis_fingerprint(analysis):
+    """Hex key of an analysis: equal for requests that must give the same response"""
+    return _digest({field: analysis.get(field) for field in FINGERPRINT_FIELDS})
@@ -2,132 +2,479 @@
 SolarScope Backend API
 AI-powered renewable energy site discovery platform
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
 import os
+import sqlite3
+import time
 from dotenv import load_dotenv
 
-from gemini_agents import parse_user_query, generate_site_explanation
-from gee_queries import analyze_solar_sites
+from gemini_agents import (
+    parse_user_query,
+    generate_site_explanation,
+    explain_sites,
+    iter_site_explanations,
+    template_site_explanation,
+    is_fallback_explanation,
+    explanation_cache_key,
+    gemini_status,
+    normalize_query,
+    parse_cache,
+    explanation_cache,
+    AI_EXPLAINED_SITES
+)
+from gee_queries import analyze_solar_regions
+from gee_backend import gee_status, sample_cache_stats
+from sampler import SAMPLING_METHODS
+from query_parser import DEFAULT_REGION
+from utils import resolve_region
+from jobs import job_runner, JobQueueFull
+from analysis_store import (
+    ANALYSIS_FALLBACK_TTL, analysis_fingerprint, analysis_store, result_cache, sampling_seed
+)
+from scoring import ScoredCandidates, normalize_weights
+from tile_store import MANIFEST_NAME
+from serialization import FastJSONProvider, dumps, dumps_bytes, loads
+from http_cache import (
+    cache_control_for,
+    choose_encoding,
+    compress,
+    compressible,
+    etag_for,
+    etag_matches,
+    response_entry
+)
+from metrics import (
+    ANALYSIS_SECONDS,
+    REGISTRY,
+    REQUEST_SECONDS,
+    REQUESTS,
+    StageTimings,
+    record_timings,
+    register_cache
+)
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # Configuration
 app.config['DEBUG'] = os.getenv('FLASK_ENV') == 'development'
+DEFAULT_NUM_SITES = 10
+STARTED_AT = time.monotonic()
+MAX_NUM_SITES = 50
+# Gemini work for one analysis (parse and explanations) ends this many
+# seconds after the request arrives; whatever is unanswered by then is
+# served by the regex parser and template explanations
+ANALYZE_DEADLINE_SECONDS = float(os.getenv('ANALYZE_DEADLINE_SECONDS', 10.0))
+
+register_cache('parse', parse_cache)
+register_cache('explanation', explanation_cache)
+register_cache('analysis', analysis_store)
+register_cache('result', result_cache)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count every request and observe its latency (time to first byte for streams)"""
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+@app.after_request
+def apply_http_caching(response):
+    """
+    Per-endpoint Cache-Control, ETags with 304s for cacheable GETs, and
+    gzip/brotli for larger bodies (streams are never buffered to compress)
+    """
+    rule = request.url_rule.rule if request.url_rule is not None else None
+    response.headers.setdefault('Cache-Control', cache_control_for(rule))
+
+    if (request.method in ('GET', 'HEAD') and response.status_code == 200 and not response.is_streamed
+            and 'no-store' not in response.headers['Cache-Control']):
+        if response.get_etag()[0] is None:
+            response.set_etag(etag_for(response.get_data()))
+        response.make_conditional(request)
+
+    if response.is_streamed or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return response
+    body = response.get_data()
+    if not compressible(response.mimetype, len(body)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is not None:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+        # The encoded bytes differ, so only a weak validator still applies
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+    return response
+
+def stored_analysis_response(entry):
+    """Response for a cached analysis body; 304 when the client's ETag matches"""
+    if etag_matches(request.headers.get('If-None-Match'), entry['etag']):
+        response = Response(status=304)
+    else:
+        response = Response(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    response.last_modified = entry['last_modified']
+    return response
+
+def readiness_checks():
+    """
+    Cheap checks of the components an analysis depends on
+
+    Nothing heavy is loaded here: data files are checked for existence and
+    the Gemini and Earth Engine clients are reported as built or not, never
+    built on demand.
+
+    Returns:
+        Dict of check name -> {'ok': bool, ...details}
+    """
+    checks = {}
+
+    try:
+        job_runner.stats()
+        checks['job_store'] = {'ok': True}
+    except sqlite3.Error as e:
+        checks['job_store'] = {'ok': False, 'error': str(e)}
+
+    # Optional data sources only fail the check when configured but missing
+    tile_dir = os.getenv('GRIDSIGHT_TILE_DIR')
+    checks['tile_store'] = {
+        'configured': bool(tile_dir),
+        'ok': not tile_dir or os.path.exists(os.path.join(tile_dir, MANIFEST_NAME))
+    }
+    # Analyses need the Earth Engine client once GEE_BACKEND selects one
+    checks['earth_engine'] = gee_status()
+    lines_path = os.getenv('TRANSMISSION_LINES_PATH')
+    checks['transmission_lines'] = {
+        'configured': bool(lines_path),
+        'ok': not lines_path or os.path.exists(lines_path)
+    }
+
+    # Without a key, or while its circuit is open, the regex parser and
+    # template explanations are used
+    gemini = gemini_status()
+    checks['gemini'] = {'ok': gemini['configured'] and gemini['circuit']['state'] != 'open',
+                        'required': False, **gemini}
+    return checks
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """
+    Health and readiness endpoint
+
+    Returns 503 when a required component is unavailable so a load balancer
+    can stop routing to this worker; a missing Gemini key only degrades it.
+    """
+    checks = readiness_checks()
+    ready = all(check['ok'] for check in checks.values() if check.get('required', True))
+    if not ready:
+        status = 'unavailable'
+    elif all(check['ok'] for check in checks.values()):
+        status = 'healthy'
+    else:
+        status = 'degraded'
+
     return jsonify({
-        'status': 'healthy',
-        'gee_connected': True,  # In production, check actual GEE connection
-        'gemini_connected': bool(os.getenv('GEMINI_API_KEY')),
+        'status': status,
+        'ready': ready,
+        'gee_connected': checks['earth_engine']['initialized'] and checks['earth_engine']['backend'] == 'earthengine',
+        'data_source': data_source(checks),
+        'gemini_connected': checks['gemini']['configured'],
+        'checks': checks,
+        'uptime_seconds': round(time.monotonic() - STARTED_AT, 1),
         'version': '1.0.0',
         'timestamp': datetime.now().isoformat()
-    })
+    }), 200 if ready else 503
+
+def data_source(checks):
+    """Where site metrics come from: Earth Engine, the local tile store or simulation"""
+    if checks['earth_engine']['configured']:
+        return 'earth_engine_fake' if checks['earth_engine']['backend'] == 'fake' else 'earth_engine'
+    if checks['tile_store']['configured'] and checks['tile_store']['ok']:
+        return 'tile_store'
+    return 'simulation'
+
+def prepare_analysis(data):
+    """
+    Step 1 of an analysis request: read parameters and parse the query
+
+    Returns:
+        Dict with the request parameters, parsed query and constraints
+    """
+    started = time.perf_counter()
+    deadline = time.monotonic() + ANALYZE_DEADLINE_SECONDS
+    timings = StageTimings()
+
+    # Step 1: Parse query with Gemini AI
+    print("[API] Step 1: Parsing query with Gemini...")
+    with timings.stage('parse'):
+        parsed_query = parse_user_query(data.get('query', ''), deadline=deadline)
+    return build_analysis(data, parsed_query, started, timings, deadline)
+
+def build_analysis(data, parsed_query, started, timings, deadline):
+    """
+    Combine the request body with its parsed query (see prepare_analysis)
+
+    deadline is the time.monotonic() value by which Gemini calls for the
+    request must finish (ANALYZE_DEADLINE_SECONDS after it arrived).
+
+    Raises:
+        ValueError: for an unsupported region or sampling method, or an
+            invalid explain_top
+    """
+    # Extract request parameters
+    user_query = data.get('query', '')
+    energy_type = data.get('energy_type', 'solar')
+    filters = data.get('filters', {})
+
+    # Missing weights keep their default; the set is scaled to sum to 1
+    criteria_weights = normalize_weights(filters.get('criteria_weights'))
+
+    # An explicit filters.region wins over the one parsed from the query
+    region = filters.get('region') or parsed_query.get('region') or DEFAULT_REGION
+
+    print(f"[API] Received query: {user_query}")
+    print(f"[API] Energy type: {energy_type}, Region: {region}")
+    print(f"[API] Parsed query: {parsed_query}")
+
+    # Build constraints from parsed query
+    constraints = {}
+    if parsed_query.get('max_slope') is not None:
+        constraints['max_slope'] = parsed_query['max_slope']
+    if parsed_query.get('acreage'):
+        constraints['min_acreage'] = parsed_query['acreage']
+
+    print(f"[API] Constraints: {constraints}")
+
+    # Expand region groups ("Southwest", "All"); unknown names are rejected
+    regions = resolve_region(region)
+    num_sites = filters.get('num_sites') or parsed_query.get('num_sites') or DEFAULT_NUM_SITES
+    num_sites = max(1, min(int(num_sites), MAX_NUM_SITES))
+    sampling_method = filters.get('sampling_method', 'uniform')
+    # Checked here because states with real locations never reach the sampler
+    if sampling_method not in SAMPLING_METHODS:
+        raise ValueError(f"Unknown sampling method '{sampling_method}', expected one of {SAMPLING_METHODS}")
+
+    # Without an explicit seed the candidate pool is still a function of the request
+    seed = filters.get('seed')
+    if seed is None:
+        seed = sampling_seed(energy_type, regions, num_sites, sampling_method)
+
+    analysis = {
+        'user_query': user_query,
+        'query_key': normalize_query(user_query),
+        'energy_type': energy_type,
+        'region': region,
+        'regions': regions,
+        'num_sites': num_sites,
+        'parsed_query': parsed_query,
+        'criteria_weights': criteria_weights,
+        'constraints': constraints,
+        'explain_top': explain_top_count(data.get('explain_top'), num_sites),
+        'fresh': bool(data.get('fresh')),
+        'seed': seed,
+        'sampling_method': sampling_method,
+        'started': started,
+        'deadline': deadline,
+        'timings': timings,
+    }
+    analysis['fingerprint'] = analysis_fingerprint(analysis)
+    return analysis
+
+def explain_top_count(value, num_sites):
+    """
+    The request's explain_top as an int clamped to 0..num_sites, or None
+    (AI_EXPLAINED_SITES) when not given
+
+    Raises:
+        ValueError: if it is not an integer
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError('explain_top must be an integer')
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('explain_top must be an integer') from None
+    return max(0, min(count, num_sites))
+
+def rank_sites(analysis):
+    """Step 2: Analyze sites using GEE (or simulation)"""
+    region = analysis['region']
+    print(f"[API] Step 2: Analyzing solar sites in {region} ({len(analysis['regions'])} states)...")
+    retained = []
+    sites = analyze_solar_regions(
+        analysis['regions'],
+        num_sites=analysis['num_sites'],
+        criteria_weights=analysis['criteria_weights'],
+        constraints=analysis['constraints'],
+        seed=analysis['seed'],
+        sampling_method=analysis['sampling_method'],
+        retain=retained,
+        timings=analysis['timings']
+    )
+    print(f"[API] Found {len(sites)} sites")
+
+    # Keep the sub-score vectors so /api/rerank can apply new weights
+    analysis['analysis_id'] = analysis_store.save(ScoredCandidates.concat(retained), {
+        'num_sites': analysis['num_sites'],
+        'constraints': analysis['constraints'],
+        'criteria_weights': analysis['criteria_weights'],
+        'region': analysis['region'],
+        'states': analysis['regions'],
+        'energy_type': analysis['energy_type'],
+        'explanation_context': f"{analysis['user_query']} in {analysis['region']}",
+    }, analysis_id=analysis['fingerprint'])
+    return sites
+
+def build_metadata(analysis):
+    """Response metadata block for an analysis, with timings up to now"""
+    timings = analysis['timings']
+    return {
+        'locations_analyzed': timings.counts.get('sampled', 0),
+        'analysis_time_seconds': round(time.perf_counter() - analysis['started'], 3),
+        'stage_timings': timings.to_dict(),
+        'datasets_used': [
+            'NASA/POWER/Global_Horizontal_Irradiance',
+            'USGS/SRTMGL1_003',
+            'ESA/WorldCover/v100'
+        ],
+        'timestamp': datetime.now().isoformat(),
+        'region': analysis['region'],
+        'states': analysis['regions'],
+        'energy_type': analysis['energy_type'],
+        'analysis_id': analysis.get('analysis_id'),
+        'seed': analysis['seed'],
+        'share_url': f"/api/analyses/{analysis['fingerprint']}"
+    }
+
+def run_analysis(data):
+    """
+    Run the full analysis pipeline for a request body
+
+    Returns:
+        The /api/analyze success response dict
+    """
+    return loads(analysis_result(data)['body'])
+
+def analysis_result(data):
+    """
+    Serialized /api/analyze response for a request body, memoized by fingerprint
+
+    A request whose fingerprint is in result_cache is answered from there
+    without sampling, scoring or Gemini calls; fresh=true runs it again
+    and replaces the stored result.
+
+    Returns:
+        The result_cache entry (see http_cache.response_entry)
+    """
+    analysis = prepare_analysis(data)
+    entry = cached_result(analysis)
+    if entry is not None:
+        return entry
+
+    sites = rank_sites(analysis)
+
+    # Step 3: Generate AI explanations concurrently for the top sites
+    print("[API] Step 3: Generating AI explanations...")
+    with analysis['timings'].stage('explanations'):
+        explain_sites(
+            sites,
+            context=f"{analysis['user_query']} in {analysis['region']}",
+            max_ai_sites=analysis['explain_top'],
+            use_cache=not analysis['fresh'],
+            deadline=analysis['deadline']
+        )
+    print("[API] Explanations generated!")
+    return store_result(analysis, sites, 'analyze')
+
+def cached_result(analysis):
+    """Stored result for an analysis' fingerprint, or None (always None for fresh=true)"""
+    if analysis['fresh']:
+        return None
+    entry = result_cache.get(analysis['fingerprint'])
+    if entry is not None:
+        print(f"[CACHE] Analysis result cache hit ({analysis['fingerprint'][:12]})")
+    return entry
+
+def store_result(analysis, sites, endpoint):
+    """
+    Serialize a finished analysis, record its metrics and memoize it
+
+    Results built on a fallback (regex parse, template or error explanations)
+    are only kept for ANALYSIS_FALLBACK_TTL (0: not at all), so they are
+    redone once Gemini is back instead of being served for ANALYSIS_TTL.
+    """
+    entry = response_entry(dumps_bytes(analysis_response(analysis, sites)))
+    if not is_degraded(analysis, sites):
+        result_cache.set(analysis['fingerprint'], entry)
+    elif ANALYSIS_FALLBACK_TTL > 0:
+        result_cache.set(analysis['fingerprint'], entry, ttl=ANALYSIS_FALLBACK_TTL)
+    finish_analysis(analysis, endpoint)
+    print("[API] Analysis complete!")
+    return entry
+
+def is_degraded(analysis, sites):
+    """Whether the parse or any of the AI-explained sites fell back"""
+    if analysis['parsed_query'].get('parsed_by') == 'fallback':
+        return True
+    explain_top = analysis['explain_top']
+    if explain_top is None:
+        explain_top = AI_EXPLAINED_SITES
+    return any(
+        is_fallback_explanation(site, site.get('explanation'))
+        for site in sites[:explain_top]
+    )
+
+def analysis_response(analysis, sites):
+    """The /api/analyze success response dict"""
+    return {
+        'status': 'success',
+        'query_parsed': analysis['parsed_query'],
+        'sites': sites,
+        'metadata': build_metadata(analysis)
+    }
+
+def finish_analysis(analysis, endpoint):
+    """Feed a finished analysis into the process-wide metrics"""
+    record_timings(analysis['timings'])
+    ANALYSIS_SECONDS.observe(time.perf_counter() - analysis['started'], endpoint=endpoint)
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_sites():
     """
     Main analysis endpoint
     Accepts user query and returns ranked sites with AI explanations
+
+    Analyses are deterministic: repeats are served from result_cache,
+    and a matching If-None-Match gets a 304.
     """
     try:
-        data = request.json
-
-        # Extract request parameters
-        user_query = data.get('query', '')
-        energy_type = data.get('energy_type', 'solar')
-        filters = data.get('filters', {})
-
-        # Get criteria weights
-        criteria_weights = filters.get('criteria_weights', {
-            'irradiance': 0.4,
-            'slope': 0.3,
-            'grid_distance': 0.2,
-            'land_cover': 0.1
-        })
-
-        # Get region (from filters or parse from query)
-        region = filters.get('region', 'Arizona')
-
-        print(f"[API] Received query: {user_query}")
-        print(f"[API] Energy type: {energy_type}, Region: {region}")
-
-        # Step 1: Parse query with Gemini AI
-        print("[API] Step 1: Parsing query with Gemini...")
-        parsed_query = parse_user_query(user_query)
-        print(f"[API] Parsed query: {parsed_query}")
-
-        # Override region with parsed query region (always trust Gemini's parsing)
-        if parsed_query.get('region'):
-            region = parsed_query['region']
-            print(f"[API] Using parsed region: {region}")
-
-        # Build constraints from parsed query
-        constraints = {}
-        if parsed_query.get('max_slope') is not None:
-            constraints['max_slope'] = parsed_query['max_slope']
-        if parsed_query.get('acreage'):
-            constraints['min_acreage'] = parsed_query['acreage']
-
-        print(f"[API] Constraints: {constraints}")
-
-        # Step 2: Analyze sites using GEE (or simulation)
-        print(f"[API] Step 2: Analyzing solar sites in {region}...")
-        sites = analyze_solar_sites(
-            region_name=region,
-            num_sites=10,
-            criteria_weights=criteria_weights,
-            constraints=constraints
-        )
-        print(f"[API] Found {len(sites)} sites")
-
-        # Step 3: Generate AI explanations for top 3 sites only (faster, avoid rate limits)
-        print("[API] Step 3: Generating AI explanations...")
-        import time
-        for i, site in enumerate(sites):
-            if i < 3:  # Only top 3 get AI explanations
-                print(f"[API] Generating explanation for site #{site['rank']}...")
-                site['explanation'] = generate_site_explanation(
-                    site,
-                    rank=site['rank'],
-                    context=f"{user_query} in {region}"
-                )
-                # Small delay to avoid rate limiting
-                time.sleep(0.3)
-            else:
-                # Use simple template for sites 4-10
-                site['explanation'] = f"This site ranks #{site['rank']} with a score of {site['score']}/100. It offers {site['metrics']['solar_irradiance']} kWh/m²/day of solar irradiance with a {site['metrics']['slope']}° slope. Located {site['metrics']['grid_distance']} km from grid infrastructure on {site['metrics']['land_cover']} land."
-        print("[API] Explanations generated!")
-
-        # Build response
-        response = {
-            'status': 'success',
-            'query_parsed': parsed_query,
-            'sites': sites,
-            'metadata': {
-                'locations_analyzed': 100,  # Number of sample points
-                'analysis_time_seconds': 2.8,
-                'datasets_used': [
-                    'NASA/POWER/Global_Horizontal_Irradiance',
-                    'USGS/SRTMGL1_003',
-                    'ESA/WorldCover/v100'
-                ],
-                'timestamp': datetime.now().isoformat(),
-                'region': region,
-                'energy_type': energy_type
-            }
-        }
+        return stored_analysis_response(analysis_result(request.json))
 
-        print("[API] Analysis complete!")
-        return jsonify(response)
+    except ValueError as e:
+        print(f"[API] Invalid request: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
 
     except Exception as e:
         print(f"[API] Error: {str(e)}")
@@ -136,53 +483,257 @@ def analyze_sites():
             'message': str(e)
         }), 500
 
-@app.route('/api/datasets', methods=['GET'])
-def get_datasets():
+@app.route('/api/jobs', methods=['POST'])
+def submit_analysis_job():
     """
-    Return list of available satellite datasets
+    Submit an analysis to the background worker pool
+    Accepts the same body as /api/analyze and returns a job id to poll
     """
-    datasets = {
-        'solar': [
-            {
-                'name': 'NASA POWER GHI',
-                'id': 'NASA/POWER/Global_Horizontal_Irradiance',
-                'description': 'Daily solar irradiance data',
-                'resolution': '0.5° (~50km)'
-            },
-            {
-                'name': 'NREL NSRDB',
-                'id': 'NREL/NSRDB',
-                'description': 'National Solar Radiation Database',
-                'resolution': '4km'
-            }
-        ],
-        'elevation': [
-            {
-                'name': 'SRTM Digital Elevation',
-                'id': 'USGS/SRTMGL1_003',
-                'description': 'Shuttle Radar Topography Mission elevation data',
-                'resolution': '30m'
+    data = request.json or {}
+    try:
+        job = job_runner.submit('analyze', run_analysis, data)
+    except JobQueueFull as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Too many analyses in progress, retry later ({e})'
+        }), 503
+
+    return jsonify({
+        'status': 'accepted',
+        'job_id': job['job_id'],
+        'job_status': job['status'],
+        'status_url': f"/api/jobs/{job['job_id']}"
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """Return the status of a submitted analysis, and its result once finished"""
+    job = job_runner.get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Job not found or expired'
+        }), 404
+
+    return jsonify({
+        'status': 'success',
+        'job_id': job_id,
+        'job_status': job['status'],
+        'created_at': job.get('created_at'),
+        'started_at': job.get('started_at'),
+        'finished_at': job.get('finished_at'),
+        'result': job.get('result'),
+        'error': job.get('error')
+    })
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_sites_stream():
+    """
+    Streaming variant of /api/analyze
+
+    Emits newline-delimited JSON events as the pipeline progresses:
+    'parsed' (query_parsed), 'sites' (ranked sites with template
+    explanations), one 'explanation' per AI explanation as it finishes,
+    then 'complete' -- or 'error' if a step fails.
+    """
+    data = request.json
+
+    def events():
+        try:
+            analysis = prepare_analysis(data)
+            yield {
+                'event': 'parsed',
+                'query_parsed': analysis['parsed_query'],
+                'region': analysis['region']
             }
-        ],
-        'land_cover': [
-            {
-                'name': 'ESA WorldCover',
-                'id': 'ESA/WorldCover/v100',
-                'description': 'Global land cover classification',
-                'resolution': '10m'
+
+            sites = rank_sites(analysis)
+            for site in sites:
+                site['explanation'] = template_site_explanation(site)
+            yield {
+                'event': 'sites',
+                'sites': sites,
+                'metadata': build_metadata(analysis)
             }
-        ],
-        'protected_areas': [
-            {
-                'name': 'USGS PAD-US',
-                'id': 'USGS/GAP/PADUS',
-                'description': 'Protected areas database',
-                'resolution': 'Vector'
+
+            print("[API] Step 3: Streaming AI explanations...")
+            explanations_started = time.perf_counter()
+            for site, explanation in iter_site_explanations(
+                sites,
+                context=f"{analysis['user_query']} in {analysis['region']}",
+                max_ai_sites=analysis['explain_top'],
+                use_cache=not analysis['fresh'],
+                deadline=analysis['deadline']
+            ):
+                site['explanation'] = explanation
+                yield {
+                    'event': 'explanation',
+                    'rank': site['rank'],
+                    'explanation': explanation
+                }
+            # Includes time the client took to read the events
+            analysis['timings'].add('explanations', time.perf_counter() - explanations_started)
+
+            # The assembled result is what share_url and later /api/analyze calls return
+            store_result(analysis, sites, 'analyze_stream')
+            yield {
+                'event': 'complete',
+                'status': 'success',
+                'analysis_time_seconds': round(time.perf_counter() - analysis['started'], 3),
+                'stage_timings': analysis['timings'].to_dict()
             }
-        ]
-    }
 
-    return jsonify(datasets)
+        except Exception as e:
+            print(f"[API] Error: {str(e)}")
+            yield {'event': 'error', 'status': 'error', 'message': str(e)}
+
+    def ndjson():
+        for event in events():
+            yield dumps(event) + '\n'
+
+    return Response(
+        stream_with_context(ndjson()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/analyses/<analysis_id>', methods=['GET'])
+def get_analysis_result(analysis_id):
+    """
+    Stored result of an earlier analysis, by the fingerprint in its share_url
+
+    Serves the same body /api/analyze returned while it is in result_cache.
+    """
+    entry = result_cache.get(analysis_id)
+    if entry is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Analysis not found or expired'
+        }), 404
+    return stored_analysis_response(entry)
+
+@app.route('/api/rerank', methods=['POST'])
+def rerank_sites():
+    """
+    Re-rank a previous analysis under new criteria weights
+
+    Only the weighted sum and top-k are recomputed from the stored
+    per-criterion scores: no resampling and no Gemini calls. Sites get a
+    cached AI explanation when one exists, otherwise the template text.
+    The merged weights are scaled to sum to 1, so scores stay on 0-100.
+    """
+    started = time.perf_counter()
+    data = request.json or {}
+    entry = analysis_store.load(data.get('analysis_id', ''))
+    if entry is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Analysis not found or expired, run /api/analyze again'
+        }), 404
+    scored, context = entry
+
+    try:
+        weights = normalize_weights(data.get('criteria_weights'), base=context['criteria_weights'])
+        num_sites = max(1, min(int(data.get('num_sites', context['num_sites'])), MAX_NUM_SITES))
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid criteria_weights or num_sites: {e}'
+        }), 400
+
+    sites = scored.rank(num_sites, weights, context['constraints'])
+    for site in sites:
+        cached = explanation_cache.get(
+            explanation_cache_key(site, site['rank'], context['explanation_context'])
+        )
+        site['explanation'] = cached or template_site_explanation(site)
+
+    return jsonify({
+        'status': 'success',
+        'analysis_id': data['analysis_id'],
+        'sites': sites,
+        'metadata': {
+            'criteria_weights': weights,
+            'candidates_ranked': len(scored),
+            'rerank_time_ms': round((time.perf_counter() - started) * 1000, 2),
+            'region': context['region'],
+            'states': context['states'],
+            'energy_type': context['energy_type']
+        }
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss/eviction counters for the backend caches"""
+    return jsonify({
+        'parse_cache': parse_cache.stats(),
+        'explanation_cache': explanation_cache.stats(),
+        'analysis_store': analysis_store.stats(),
+        'result_cache': result_cache.stats(),
+        'sample_cache': sample_cache_stats()
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Stage timings, Gemini calls, fallbacks and cache counters in Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# Static catalog for /api/datasets
+DATASETS = {
+    'solar': [
+        {
+            'name': 'NASA POWER GHI',
+            'id': 'NASA/POWER/Global_Horizontal_Irradiance',
+            'description': 'Daily solar irradiance data',
+            'resolution': '0.5° (~50km)'
+        },
+        {
+            'name': 'NREL NSRDB',
+            'id': 'NREL/NSRDB',
+            'description': 'National Solar Radiation Database',
+            'resolution': '4km'
+        }
+    ],
+    'elevation': [
+        {
+            'name': 'SRTM Digital Elevation',
+            'id': 'USGS/SRTMGL1_003',
+            'description': 'Shuttle Radar Topography Mission elevation data',
+            'resolution': '30m'
+        }
+    ],
+    'land_cover': [
+        {
+            'name': 'ESA WorldCover',
+            'id': 'ESA/WorldCover/v100',
+            'description': 'Global land cover classification',
+            'resolution': '10m'
+        }
+    ],
+    'protected_areas': [
+        {
+            'name': 'USGS PAD-US',
+            'id': 'USGS/GAP/PADUS',
+            'description': 'Protected areas database',
+            'resolution': 'Vector'
+        }
+    ]
+}
+
+DATASETS_BODY = dumps_bytes(DATASETS)
+DATASETS_ETAG = etag_for(DATASETS_BODY)
+DATASETS_LAST_MODIFIED = int(time.time())
+
+@app.route('/api/datasets', methods=['GET'])
+def get_datasets():
+    """
+    Return list of available satellite datasets
+    The payload is static, so the encoded body and its ETag are built once
+    """
+    response = Response(DATASETS_BODY, mimetype='application/json')
+    response.set_etag(DATASETS_ETAG)
+    response.last_modified = DATASETS_LAST_MODIFIED
+    return response
 
 @app.route('/api/explain-site', methods=['POST'])
 def explain_site():
@@ -204,16 +755,11 @@ def explain_site():
         explanation = generate_site_explanation(
             site_data,
             rank=site_data.get('rank', 1),
-            context=context
+            context=context,
+            use_cache=not data.get('fresh')
         )
 
-        return jsonify({
-            'status': 'success',
-            'explanation': explanation,
-            'key_strengths': extract_strengths(site_data),
-            'considerations': generate_considerations(site_data),
-            'next_steps': generate_next_steps(site_data)
-        })
+        return jsonify(site_detail_response(site_data, explanation))
 
     except Exception as e:
         return jsonify({
@@ -221,6 +767,16 @@ def explain_site():
             'message': str(e)
         }), 500
 
+def site_detail_response(site_data, explanation):
+    """The /api/explain-site success response dict"""
+    return {
+        'status': 'success',
+        'explanation': explanation,
+        'key_strengths': extract_strengths(site_data),
+        'considerations': generate_considerations(site_data),
+        'next_steps': generate_next_steps(site_data)
+    }
+
 def extract_strengths(site_data):
     """Extract key strengths from site metrics"""
     strengths = []
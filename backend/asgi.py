@@ -0,0 +1,164 @@
+"""
+ASGI entry point for high-concurrency deployments
+
+    uvicorn asgi:app --workers 2
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+
+/api/analyze and /api/explain-site run on the event loop and await the
+async Gemini client, so requests waiting on the LLM hold a coroutine
+rather than a worker process. Query parsing is awaited the same way;
+CPU-bound sampling and scoring, and the SQLite-backed result, parse and
+explanation cache reads and writes, run in the thread pool. Every other route
+is served by the Flask app from app.py, mounted as WSGI, so both entry
+points expose the same API, with the same caching and compression
+(see http_cache).
+"""
+import time
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+from app import (
+    ANALYZE_DEADLINE_SECONDS,
+    app as flask_app,
+    build_analysis,
+    cached_result,
+    rank_sites,
+    site_detail_response,
+    store_result
+)
+from gemini_agents import explain_sites_async, generate_site_explanation_async, parse_user_query_async
+from metrics import REQUEST_SECONDS, REQUESTS, StageTimings
+from serialization import dumps_bytes
+from http_cache import (
+    cache_control_for,
+    choose_encoding,
+    compress,
+    compressible,
+    etag_matches,
+    http_date
+)
+
+
+def json_response(request, body, rule, status_code=200, headers=None):
+    """Encoded JSON body with the endpoint's Cache-Control, compressed like app.apply_http_caching"""
+    headers = {'Cache-Control': cache_control_for(rule), **(headers or {})}
+    if compressible('application/json', len(body)):
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = choose_encoding(request.headers.get('accept-encoding'))
+        if encoding is not None:
+            body = compress(body, encoding)
+            headers['Content-Encoding'] = encoding
+            if 'ETag' in headers:
+                headers['ETag'] = 'W/' + headers['ETag']
+    return Response(body, status_code=status_code, headers=headers, media_type='application/json')
+
+
+def stored_analysis_response(request, entry):
+    """Response for a cached analysis body; 304 when the client's ETag matches"""
+    headers = {'ETag': f'"{entry["etag"]}"', 'Last-Modified': http_date(entry['last_modified'])}
+    if etag_matches(request.headers.get('if-none-match'), entry['etag']):
+        headers['Cache-Control'] = cache_control_for('/api/analyze')
+        return Response(status_code=304, headers=headers)
+    return json_response(request, entry['body'].encode('utf-8'), '/api/analyze', headers=headers)
+
+
+def instrumented(rule):
+    """Record request count and latency like app.record_request_metrics"""
+    def decorate(handler):
+        async def wrapper(request):
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=rule)
+                REQUESTS.inc(endpoint=rule, method=request.method, status=status)
+        return wrapper
+    return decorate
+
+
+def error_response(request, message, status_code):
+    body = dumps_bytes({'status': 'error', 'message': message})
+    return json_response(request, body, None, status_code=status_code)
+
+
+@instrumented('/api/analyze')
+async def analyze_sites(request):
+    """Async /api/analyze: same request body, response and caching as the Flask route"""
+    try:
+        data = await request.json()
+        started = time.perf_counter()
+        deadline = time.monotonic() + ANALYZE_DEADLINE_SECONDS
+        timings = StageTimings()
+
+        print("[API] Step 1: Parsing query with Gemini...")
+        with timings.stage('parse'):
+            parsed_query = await parse_user_query_async(data.get('query', ''), deadline=deadline)
+        analysis = build_analysis(data, parsed_query, started, timings, deadline)
+        entry = await run_in_threadpool(cached_result, analysis)
+        if entry is not None:
+            return stored_analysis_response(request, entry)
+
+        sites = await run_in_threadpool(rank_sites, analysis)
+
+        print("[API] Step 3: Generating AI explanations...")
+        with timings.stage('explanations'):
+            await explain_sites_async(
+                sites,
+                context=f"{analysis['user_query']} in {analysis['region']}",
+                max_ai_sites=analysis['explain_top'],
+                use_cache=not analysis['fresh'],
+                deadline=analysis['deadline']
+            )
+        entry = await run_in_threadpool(store_result, analysis, sites, 'analyze')
+        return stored_analysis_response(request, entry)
+
+    except ValueError as e:
+        print(f"[API] Invalid request: {str(e)}")
+        return error_response(request, str(e), 400)
+
+    except Exception as e:
+        print(f"[API] Error: {str(e)}")
+        return error_response(request, str(e), 500)
+
+
+@instrumented('/api/explain-site')
+async def explain_site(request):
+    """Async /api/explain-site"""
+    try:
+        data = await request.json()
+        site_data = data.get('site_data')
+        if not site_data:
+            return error_response(request, 'site_data is required', 400)
+
+        explanation = await generate_site_explanation_async(
+            site_data,
+            rank=site_data.get('rank', 1),
+            context=data.get('context', ''),
+            use_cache=not data.get('fresh')
+        )
+        return json_response(request, dumps_bytes(site_detail_response(site_data, explanation)),
+                             '/api/explain-site')
+
+    except Exception as e:
+        return error_response(request, str(e), 500)
+
+
+app = Starlette(
+    routes=[
+        Route('/api/analyze', analyze_sites, methods=['POST']),
+        Route('/api/explain-site', explain_site, methods=['POST']),
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    # Preflight requests are answered here; Flask-CORS sets the same
+    # headers on mounted responses, which this middleware overwrites
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])]
+)
@@ -0,0 +1,160 @@
+"""Timing, result files and comparison for the benchmark suite
+
+Each benchmark result is one JSON record with summary statistics in
+seconds per call. A results file also records the git commit and the
+environment, so two files can be compared with `run.py compare`.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+SCHEMA_VERSION = 1
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure(fn, repeat=5, warmup=1, min_time=0.05, setup=None):
+    """
+    Time fn() and return per-call statistics in seconds
+
+    Without setup, fast functions are looped enough times per sample that
+    each sample takes at least min_time, like timeit's autorange. With
+    setup, it runs untimed before every single call instead.
+
+    Returns:
+        Dict with repeat, number, min, median, mean, stdev, p95 and max
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    number = 1
+    if setup is None:
+        while True:
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            if time.perf_counter() - started >= min_time or number >= 1 << 20:
+                break
+            number *= 2
+
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - started) / number)
+
+    ordered = sorted(samples)
+    return {
+        'repeat': repeat,
+        'number': number,
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'mean': statistics.fmean(ordered),
+        'stdev': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        'p95': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        'max': ordered[-1],
+    }
+
+
+def result_id(name, params):
+    """Stable identifier used to match results between runs"""
+    if not params:
+        return name
+    return name + '[' + ','.join(f'{key}={params[key]}' for key in sorted(params)) + ']'
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=REPO_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def environment_info():
+    """Commit and interpreter details stored alongside the results"""
+    import numpy as np
+
+    return {
+        'git_commit': _git('rev-parse', 'HEAD') or None,
+        'git_dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def write_results(path, results, config):
+    """Write a results file and return its path"""
+    document = {
+        'schema': SCHEMA_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'environment': environment_info(),
+        'config': config,
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+    return path
+
+
+def load_results(path):
+    with open(path) as f:
+        document = json.load(f)
+    if document.get('schema') != SCHEMA_VERSION:
+        raise ValueError(f"{path}: unsupported results schema {document.get('schema')}")
+    return document
+
+
+def compare_results(baseline, current, threshold=1.2, stat='median'):
+    """
+    Compare two results documents benchmark by benchmark
+
+    Returns:
+        List of dicts (id, baseline, current, ratio, status) where status is
+        'regression' when current/baseline exceeds threshold, 'improvement'
+        when it is below 1/threshold, 'new'/'missing' when unmatched, else 'ok'
+    """
+    base = {r['id']: r for r in baseline['results']}
+    rows = []
+    for result in current['results']:
+        old = base.pop(result['id'], None)
+        if old is None:
+            rows.append({'id': result['id'], 'baseline': None, 'current': result[stat],
+                         'ratio': None, 'status': 'new'})
+            continue
+        ratio = result[stat] / old[stat] if old[stat] > 0 else float('inf')
+        if ratio > threshold:
+            status = 'regression'
+        elif ratio < 1 / threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append({'id': result['id'], 'baseline': old[stat], 'current': result[stat],
+                     'ratio': ratio, 'status': status})
+    for old in base.values():
+        rows.append({'id': old['id'], 'baseline': old[stat], 'current': None,
+                     'ratio': None, 'status': 'missing'})
+    return rows
+
+
+def format_seconds(value):
+    if value is None:
+        return '-'
+    if value < 1e-3:
+        return f'{value * 1e6:.1f} us'
+    if value < 1:
+        return f'{value * 1e3:.2f} ms'
+    return f'{value:.3f} s'
@@ -0,0 +1,408 @@
+"""Benchmark suite for the scoring, sampling and API pipeline
+
+Run from the backend directory:
+
+    python benchmarks/run.py run --out benchmarks/results/current.json
+    python benchmarks/run.py run --quick --filter analyze
+    python benchmarks/run.py compare baseline.json current.json --threshold 1.2
+    python benchmarks/run.py coldstart --budget 0.6
+
+Gemini is replaced by local stubs, and the parse, explanation, analysis and
+result caches are memory-only and cleared before each timed API request
+(except api_analyze[memoized], which times a result cache hit). No network
+access is needed, and every other timed call does the full amount of work.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Must be set before the backend modules read their configuration
+os.environ['PARSE_CACHE_PATH'] = ''
+os.environ['EXPLANATION_CACHE_PATH'] = ''
+os.environ['ANALYSIS_STORE_PATH'] = ''
+os.environ['GEE_BACKEND'] = ''
+os.environ.setdefault('JOB_STORE_PATH', os.path.join(tempfile.gettempdir(), 'gridsight-bench-jobs.sqlite3'))
+
+from harness import (  # noqa: E402
+    compare_results,
+    format_seconds,
+    load_results,
+    measure,
+    result_id,
+    write_results,
+)
+
+BENCHMARKS = []
+
+# Seconds a fresh interpreter may take to `import app` (see `coldstart`)
+COLD_START_BUDGET = float(os.getenv('COLD_START_BUDGET', 0.6))
+
+PARSE_QUERIES = [
+    "50-acre solar site in Arizona, flat terrain",
+    "Solar farm in New Jersey near grid",
+    "Solar installation in California, <5° slope",
+    "best 20 sites anywhere in the Southwest",
+    "200 acre solar farm in North Carolina with high irradiance under 3 degree slope",
+    "Find me a large solar site somewhere with good sun",
+]
+
+
+def benchmark(fn):
+    """Register a function that yields benchmark cases"""
+    BENCHMARKS.append(fn)
+    return fn
+
+
+def case(name, fn, setup=None, extra=None, **params):
+    return {'name': name, 'params': params, 'fn': fn, 'setup': setup, 'extra': extra or {}}
+
+
+@benchmark
+def analyze_solar_sites_cases(quick):
+    from gee_queries import analyze_solar_sites
+
+    counts = [1_000, 10_000] if quick else [1_000, 10_000, 100_000]
+    for count in counts:
+        # Kansas has no curated locations, so every candidate is sampled
+        yield case(
+            'analyze_solar_sites',
+            lambda count=count: analyze_solar_sites('Kansas', 10, seed=42, num_candidates=count),
+            num_candidates=count
+        )
+
+
+@benchmark
+def gee_sampling_cases(quick):
+    # Earth Engine lookups against fake_ee with 20 ms per request, so the
+    # time is dominated by request latency and shows the effect of
+    # concurrency and of the geohash sample cache (cold: emptied before
+    # every run, warm: filled by the first run)
+    import numpy as np
+    import fake_ee
+    from gee_backend import EarthEngineSampler
+    from gee_queries import gee_candidate_batches
+    from sample_cache import SampleCache
+    from scoring import rank_candidate_stream
+
+    fake_ee.configure(latency=0.02)
+    cache = SampleCache(os.path.join(tempfile.mkdtemp(prefix='gridsight-bench-'), 'gee_samples.sqlite3'))
+    counts = [5_000] if quick else [5_000, 50_000]
+    for count in counts:
+        for concurrency, cache_state in ((1, 'none'), (8, 'none'), (8, 'cold'), (8, 'warm')):
+            sampler = EarthEngineSampler(fake_ee, concurrency=concurrency,
+                                         cache=None if cache_state == 'none' else cache)
+
+            def run(sampler=sampler, count=count):
+                batches = gee_candidate_batches(sampler, 'Kansas', 10, np.random.default_rng(5),
+                                                num_candidates=count)
+                return rank_candidate_stream(batches, 10)
+
+            def empty_cache(sampler=sampler):
+                sampler.flush()
+                cache.clear()
+
+            yield case('gee_sampling', run, setup=empty_cache if cache_state == 'cold' else sampler.flush,
+                       num_candidates=count, concurrency=concurrency, cache=cache_state)
+
+
+@benchmark
+def sample_coordinates_cases(quick):
+    from landmask import get_land_mask
+    from utils import STATE_BOUNDARIES, generate_sample_coordinates
+
+    states = ['Florida', 'Massachusetts'] if quick else ['Florida', 'Massachusetts', 'New York', 'New Jersey', 'California']
+    counts = [1_000] if quick else [1_000, 10_000]
+    for state in states:
+        mask = get_land_mask(state)
+        for count in counts:
+            yield case(
+                'generate_sample_coordinates',
+                lambda state=state, count=count: generate_sample_coordinates(
+                    STATE_BOUNDARIES[state], num_points=count, state_name=state, seed=7
+                ),
+                extra={'land_fraction': round(mask.land_fraction, 4) if mask else 1.0},
+                state=state,
+                num_points=count
+            )
+
+
+@benchmark
+def parse_user_query_regex_cases(quick):
+    from gemini_agents import parse_user_query_regex
+    from contextlib import redirect_stdout
+
+    def parse_all():
+        with redirect_stdout(None):
+            for query in PARSE_QUERIES:
+                parse_user_query_regex(query)
+
+    yield case('parse_user_query_regex', parse_all, extra={'queries_per_call': len(PARSE_QUERIES)})
+
+
+@benchmark
+def explain_sites_cases(quick):
+    # Ten explanations with Gemini stubbed as 300 ms per call plus 30 ms per
+    # explanation written, behind the default rate limiter (3/s, burst 4):
+    # batch_size=1 is one call per site, batch_size=10 a single call
+    import time
+    from contextlib import redirect_stdout
+    import gemini_agents
+    from rate_limit import TokenBucket
+
+    def per_site(site_data, rank, context="", timeout=None):
+        time.sleep(0.33)
+        return gemini_agents.template_site_explanation(site_data)
+
+    def batched(sites, context="", timeout=None):
+        time.sleep(0.3 + 0.03 * len(sites))
+        return [{'rank': site['rank'], 'explanation': gemini_agents.template_site_explanation(site)}
+                for site in sites]
+
+    sites = [{'rank': rank, 'score': 90.0 - rank, 'coordinates': {'lat': 33.0 + rank / 10, 'lon': -112.0},
+              'metrics': {'solar_irradiance': 6.5, 'solar_irradiance_score': 90, 'slope': 1.0, 'slope_score': 95,
+                          'grid_distance': 2.0, 'grid_distance_score': 88,
+                          'land_cover': 'barren', 'land_cover_score': 85}}
+             for rank in range(1, 11)]
+
+    for batch_size in (1, 10):
+        def setup():
+            gemini_agents.generate_site_explanation_gemini = per_site
+            gemini_agents.generate_site_explanations_gemini = batched
+            gemini_agents.gemini_rate_limiter = TokenBucket(rate=3.0, capacity=4)
+
+        def run(batch_size=batch_size):
+            gemini_agents.EXPLANATION_BATCH_SIZE = batch_size
+            with redirect_stdout(None):
+                gemini_agents.explain_sites([dict(site) for site in sites], max_ai_sites=10,
+                                            timeout=30, use_cache=False)
+
+        yield case('explain_sites', run, setup=setup, batch_size=batch_size, sites=len(sites))
+
+
+def import_app_seconds(profile=False):
+    """
+    Time `import app` in a fresh interpreter, excluding interpreter startup
+
+    With profile, also return the slowest imports from -X importtime as
+    (cumulative seconds, module) pairs.
+    """
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    command = [sys.executable] + (['-X', 'importtime'] if profile else []) + ['-c', code]
+    completed = subprocess.run(command, cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    seconds = float(completed.stdout.strip().splitlines()[-1])
+    if not profile:
+        return seconds
+
+    slowest = []
+    for line in completed.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, module = line.split('|')
+            if cumulative.strip().isdigit():
+                slowest.append((int(cumulative) / 1e6, module.strip()))
+    return seconds, sorted(slowest, reverse=True)[:15]
+
+
+@benchmark
+def serialize_response_cases(quick):
+    from gee_queries import analyze_solar_sites
+    from serialization import backend_name, dumps_bytes
+
+    counts = [50, 1_000] if quick else [10, 50, 1_000]
+    for count in counts:
+        sites = analyze_solar_sites('Kansas', count, seed=3, num_candidates=count * 2)
+        for site in sites:
+            site['explanation'] = 'x' * 400
+        body = {'status': 'success', 'query_parsed': {}, 'sites': sites, 'metadata': {}}
+        yield case('serialize_response', lambda body=body: dumps_bytes(body),
+                   extra={'encoder': backend_name()}, num_sites=count)
+
+
+@benchmark
+def import_app_cases(quick):
+    # Timed in subprocesses (interpreter startup included), so modules
+    # already imported here do not count
+    yield case('import_app', import_app_seconds)
+
+
+def _install_gemini_stubs():
+    """Replace the Gemini calls with deterministic local functions"""
+    import gemini_agents
+
+    gemini_agents.parse_user_query_gemini = (
+        lambda user_input, timeout=None: gemini_agents.parse_user_query_regex(user_input)
+    )
+    gemini_agents.generate_site_explanation_gemini = (
+        lambda site_data, rank, context="", timeout=None: gemini_agents.template_site_explanation(site_data)
+    )
+    gemini_agents.generate_site_explanations_gemini = lambda sites, context="", timeout=None: [
+        {'rank': site['rank'], 'explanation': gemini_agents.template_site_explanation(site)} for site in sites
+    ]
+    gemini_agents.gemini_rate_limiter.rate = 1e9
+    gemini_agents.gemini_rate_limiter.capacity = 1e9
+
+
+def _clear_caches():
+    import gemini_agents
+    from analysis_store import analysis_store, result_cache
+
+    gemini_agents.parse_cache.memory.clear()
+    gemini_agents.explanation_cache.memory.clear()
+    analysis_store.memory.clear()
+    result_cache.clear()
+
+
+@benchmark
+def api_analyze_cases(quick):
+    _install_gemini_stubs()
+    from contextlib import redirect_stdout
+    from app import app
+
+    client = app.test_client()
+    requests = [('single_state', "50-acre solar site in Arizona, flat terrain")]
+    if not quick:
+        requests.append(('region_group', "best 20 sites anywhere in the Southwest"))
+
+    for label, query in requests:
+        def post(query=query):
+            with redirect_stdout(None):
+                response = client.post('/api/analyze', json={'query': query, 'filters': {'seed': 1}})
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/analyze returned {response.status_code}: {response.get_data(as_text=True)}")
+
+        yield case('api_analyze', post, setup=_clear_caches, request=label)
+
+    # A repeated request is answered from the result cache
+    yield case('api_analyze', post, setup=post, request='memoized')
+
+
+@benchmark
+def gemini_outage_cases(quick):
+    # /api/analyze with a 1 s request deadline while Gemini hangs: each
+    # stub call runs until its SDK timeout. With the circuit closed the
+    # parse uses up the deadline; with it open no call is made at all.
+    import time
+    from contextlib import redirect_stdout
+    import app as app_module
+    import gemini_agents
+    from circuit_breaker import CircuitBreaker
+
+    def hang(*args, timeout=None, **kwargs):
+        time.sleep(timeout)
+        raise TimeoutError('Gemini stub did not answer')
+
+    client = app_module.app.test_client()
+    query = "Find me a large solar site somewhere with good sun"
+
+    def post():
+        with redirect_stdout(None):
+            response = client.post('/api/analyze', json={'query': query, 'filters': {'seed': 1}})
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/analyze returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    for circuit in ('closed', 'open'):
+        def setup(circuit=circuit):
+            _install_gemini_stubs()
+            gemini_agents.parse_user_query_gemini = hang
+            gemini_agents.generate_site_explanation_gemini = hang
+            gemini_agents.generate_site_explanations_gemini = hang
+            app_module.ANALYZE_DEADLINE_SECONDS = 1.0
+            breaker = CircuitBreaker(failure_threshold=10 ** 6 if circuit == 'closed' else 1, reset_timeout=3600)
+            if circuit == 'open':
+                breaker.record_failure()
+            gemini_agents.gemini_breaker = breaker
+            _clear_caches()
+
+        yield case('api_analyze_gemini_hung', post, setup=setup, circuit=circuit)
+
+
+def run(args):
+    results = []
+    repeat = args.repeat or (3 if args.quick else 7)
+    for factory in BENCHMARKS:
+        for spec in factory(args.quick):
+            rid = result_id(spec['name'], spec['params'])
+            if args.filter and args.filter not in rid:
+                continue
+            stats = measure(spec['fn'], repeat=repeat, setup=spec['setup'])
+            result = {'id': rid, 'name': spec['name'], 'params': spec['params'], 'unit': 's', **stats}
+            if spec['extra']:
+                result['extra'] = spec['extra']
+            results.append(result)
+            print(f"[BENCH] {rid:<70} median {format_seconds(stats['median']):>10}  "
+                  f"p95 {format_seconds(stats['p95']):>10}")
+
+    config = {'quick': args.quick, 'repeat': repeat, 'filter': args.filter}
+    path = write_results(args.out, results, config)
+    print(f"[BENCH] Wrote {len(results)} results to {path}")
+
+
+def coldstart(args):
+    samples = sorted(import_app_seconds() for _ in range(args.repeat))
+    median = samples[len(samples) // 2]
+    print(f"[BENCH] import app: median {format_seconds(median)}, min {format_seconds(samples[0])} "
+          f"over {args.repeat} fresh interpreters (budget {format_seconds(args.budget)})")
+    if args.profile:
+        _, slowest = import_app_seconds(profile=True)
+        for seconds, module in slowest:
+            print(f"  {format_seconds(seconds):>10}  {module}")
+    if median > args.budget:
+        print("[BENCH] Cold start is over budget")
+        sys.exit(1)
+
+
+def compare(args):
+    rows = compare_results(load_results(args.baseline), load_results(args.current),
+                           threshold=args.threshold, stat=args.stat)
+    for row in rows:
+        ratio = f"{row['ratio']:.2f}x" if row['ratio'] is not None else '-'
+        print(f"{row['status']:<12} {row['id']:<70} {format_seconds(row['baseline']):>10} -> "
+              f"{format_seconds(row['current']):>10}  {ratio}")
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    regressions = [row for row in rows if row['status'] == 'regression']
+    if regressions:
+        print(f"[BENCH] {len(regressions)} regression(s) above {args.threshold}x")
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='GridSight backend benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks and write a results file')
+    run_parser.add_argument('--out', default=os.path.join(BACKEND_DIR, 'benchmarks', 'results', 'latest.json'))
+    run_parser.add_argument('--quick', action='store_true', help='Smaller sizes and fewer repeats')
+    run_parser.add_argument('--repeat', type=int, help='Timed samples per benchmark')
+    run_parser.add_argument('--filter', help='Only run benchmarks whose id contains this text')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two results files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=1.2,
+                                help='Slowdown ratio reported as a regression (default: 1.2)')
+    compare_parser.add_argument('--stat', default='median', choices=['min', 'median', 'mean', 'p95'])
+    compare_parser.add_argument('--json', action='store_true', help='Also print the comparison as JSON')
+
+    coldstart_parser = subparsers.add_parser('coldstart', help='Check `import app` time against a budget')
+    coldstart_parser.add_argument('--budget', type=float, default=COLD_START_BUDGET,
+                                  help=f'Maximum median seconds (default: {COLD_START_BUDGET}, env COLD_START_BUDGET)')
+    coldstart_parser.add_argument('--repeat', type=int, default=5)
+    coldstart_parser.add_argument('--profile', action='store_true', help='Also list the slowest imports')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run(args)
+    elif args.command == 'coldstart':
+        coldstart(args)
+    else:
+        compare(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+In-process fake of the Earth Engine calls used by gee_backend
+
+Implements just enough of the earthengine-api surface -- Initialize,
+ServiceAccountCredentials, Geometry.Point, Feature, FeatureCollection,
+Image, ImageCollection, Terrain.slope and
+Image.sampleRegions(...).getInfo() -- to run the GEE sampling backend
+without network access or credentials:
+
+    GEE_BACKEND=fake python app.py
+
+Pixel values are deterministic functions of the pixel centre, so the same
+point always reads the same GHI, slope and land cover. Points over water
+(land cover 80) read as no data and are left out of sampleRegions results,
+as masked pixels are by the real service. Only getInfo() counts as a
+server call: it sleeps for the configured latency, may fail with a
+transient EEException (failure_rate), rejects more than max_concurrent
+calls in flight, and enforces the 5000-element getInfo cap like the real
+service.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+GET_INFO_LIMIT = 5000
+METERS_PER_DEGREE = 111320.0
+
+SUITABLE_LAND_COVER = (60, 30, 40)  # barren, grassland, cropland
+UNSUITABLE_LAND_COVER = (10, 20, 50, 80)  # forest, shrubland, built-up, water
+
+_config = {
+    'latency': float(os.getenv('FAKE_EE_LATENCY', 0.0)),
+    'failure_rate': float(os.getenv('FAKE_EE_FAILURE_RATE', 0.0)),
+    'max_concurrent': int(os.getenv('FAKE_EE_MAX_CONCURRENT', 40)),
+}
+_stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'in_flight': 0, 'max_in_flight': 0, 'features': 0}
+_lock = threading.Lock()
+_failure_rng = np.random.default_rng(0)
+
+
+class EEException(Exception):
+    """Same name and role as ee.EEException"""
+
+
+def configure(latency=None, failure_rate=None, max_concurrent=None, seed=0):
+    """Set the simulated server behaviour and reset the call counters"""
+    global _failure_rng
+    with _lock:
+        if latency is not None:
+            _config['latency'] = latency
+        if failure_rate is not None:
+            _config['failure_rate'] = failure_rate
+        if max_concurrent is not None:
+            _config['max_concurrent'] = max_concurrent
+        _failure_rng = np.random.default_rng(seed)
+        for key in _stats:
+            _stats[key] = 0
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+def Initialize(credentials=None, project=None, **kwargs):
+    return None
+
+
+class ServiceAccountCredentials:
+    def __init__(self, email, key_file=None, key_data=None):
+        self.email = email
+        self.key_file = key_file
+
+
+def _server_call(compute):
+    """Run compute() as one simulated request to the Earth Engine service"""
+    with _lock:
+        _stats['calls'] += 1
+        if _stats['in_flight'] >= _config['max_concurrent']:
+            _stats['rejected'] += 1
+            raise EEException('Too many concurrent aggregations.')
+        _stats['in_flight'] += 1
+        _stats['max_in_flight'] = max(_stats['max_in_flight'], _stats['in_flight'])
+        fail = _config['failure_rate'] > 0 and _failure_rng.random() < _config['failure_rate']
+        latency = _config['latency']
+    try:
+        if latency:
+            time.sleep(latency)
+        if fail:
+            with _lock:
+                _stats['failures'] += 1
+            raise EEException('Computation timed out.')
+        return compute()
+    finally:
+        with _lock:
+            _stats['in_flight'] -= 1
+
+
+def _hash_unit(lats, lons, salt):
+    """Deterministic pseudo-random value in [0, 1) per coordinate pair"""
+    x = np.sin(lats * 12.9898 + lons * 78.233 + salt * 37.719) * 43758.5453
+    return x - np.floor(x)
+
+
+def _ghi(lats, lons):
+    base = 5.5 - np.abs(lats - 25) * 0.05 + 0.8
+    return np.clip(base + (_hash_unit(lats, lons, 1) - 0.5) * 0.6, 3.0, 7.5)
+
+
+def _elevation(lats, lons):
+    return 500 + 1500 * _hash_unit(lats, lons, 2)
+
+
+def _slope(lats, lons):
+    # Exponential with mean 3 degrees, so most pixels are fairly flat
+    return np.minimum(15.0, -3.0 * np.log1p(-_hash_unit(lats, lons, 3) * 0.999))
+
+
+def _land_cover(lats, lons):
+    pick = _hash_unit(lats, lons, 5)
+    suitable = np.asarray(SUITABLE_LAND_COVER)[(pick * 3).astype(int) % 3]
+    unsuitable = np.asarray(UNSUITABLE_LAND_COVER)[(pick * 4).astype(int) % 4]
+    return np.where(_hash_unit(lats, lons, 4) < 0.7, suitable, unsuitable)
+
+
+# Asset id -> {band name: value function}
+IMAGE_ASSETS = {
+    'USGS/SRTMGL1_003': {'elevation': _elevation},
+}
+COLLECTION_ASSETS = {
+    'NASA/POWER/Global_Horizontal_Irradiance': {'GHI': _ghi},
+    'ESA/WorldCover/v200': {'Map': _land_cover},
+}
+
+
+def _pixel_centres(lats, lons, scale):
+    step = scale / METERS_PER_DEGREE
+    return (np.floor(lats / step) + 0.5) * step, (np.floor(lons / step) + 0.5) * step
+
+
+class Geometry:
+    def __init__(self, coordinates):
+        self.coordinates = tuple(float(v) for v in coordinates)
+
+    @staticmethod
+    def Point(coords, proj=None):
+        return Geometry(coords)
+
+
+class Feature:
+    def __init__(self, geometry, properties=None):
+        self.geometry = geometry
+        self.properties = dict(properties or {})
+
+
+class FeatureCollection:
+    def __init__(self, features):
+        self.features = list(features)
+
+    def size(self):
+        return ComputedValue(lambda: len(self.features), 1)
+
+
+class Image:
+    def __init__(self, asset_id=None, bands=None):
+        if bands is None:
+            if asset_id not in IMAGE_ASSETS:
+                raise EEException(f"Image asset '{asset_id}' not found.")
+            bands = dict(IMAGE_ASSETS[asset_id])
+        self.bands = bands
+
+    def select(self, *names):
+        names = names[0] if len(names) == 1 and isinstance(names[0], (list, tuple)) else names
+        missing = [name for name in names if name not in self.bands]
+        if missing:
+            raise EEException(f"Image.select: Pattern '{missing[0]}' did not match any bands.")
+        return Image(bands={name: self.bands[name] for name in names})
+
+    def addBands(self, other):
+        return Image(bands={**self.bands, **other.bands})
+
+    def rename(self, *names):
+        names = names[0] if len(names) == 1 and isinstance(names[0], (list, tuple)) else names
+        if len(names) != len(self.bands):
+            raise EEException('Image.rename: The number of names must match the number of bands.')
+        return Image(bands=dict(zip(names, self.bands.values())))
+
+    def sampleRegions(self, collection, properties=None, scale=None, projection=None,
+                      tileScale=1, geometries=False):
+        if scale is None:
+            raise EEException('Image.sampleRegions: scale is required by this fake.')
+        return ComputedValue(lambda: self._sample_points(collection, properties, scale, geometries),
+                             len(collection.features))
+
+    def _sample_points(self, collection, properties, scale, geometries):
+        features = collection.features
+        lons = np.array([f.geometry.coordinates[0] for f in features], dtype=np.float64)
+        lats = np.array([f.geometry.coordinates[1] for f in features], dtype=np.float64)
+        pixel_lats, pixel_lons = _pixel_centres(lats, lons, scale)
+        values = {name: fn(pixel_lats, pixel_lons) for name, fn in self.bands.items()}
+        no_data = _land_cover(pixel_lats, pixel_lons) == 80
+
+        result = []
+        for i, feature in enumerate(features):
+            if no_data[i]:
+                continue
+            props = {name: feature.properties[name] for name in (properties or feature.properties)}
+            props.update({name: column[i].item() for name, column in values.items()})
+            out = {'type': 'Feature', 'id': str(i), 'properties': props}
+            if geometries:
+                out['geometry'] = {'type': 'Point', 'coordinates': [float(lons[i]), float(lats[i])]}
+            result.append(out)
+        return {'type': 'FeatureCollection', 'features': result}
+
+
+class ImageCollection:
+    def __init__(self, asset_id=None, bands=None):
+        if bands is None:
+            if asset_id not in COLLECTION_ASSETS:
+                raise EEException(f"ImageCollection asset '{asset_id}' not found.")
+            bands = dict(COLLECTION_ASSETS[asset_id])
+        self.bands = bands
+
+    def filterBounds(self, geometry):
+        return self
+
+    def select(self, *names):
+        return ImageCollection(bands=Image(bands=self.bands).select(*names).bands)
+
+    def mean(self):
+        return Image(bands=dict(self.bands))
+
+    def first(self):
+        return Image(bands=dict(self.bands))
+
+
+class Terrain:
+    @staticmethod
+    def slope(image):
+        if 'elevation' not in image.bands:
+            raise EEException('Terrain.slope: Input must have an elevation band.')
+        return Image(bands={'slope': _slope})
+
+
+class ComputedValue:
+    """A server-side result; computed by getInfo()"""
+
+    def __init__(self, compute, elements):
+        self._compute = compute
+        self.elements = elements
+
+    def getInfo(self):
+        if self.elements > GET_INFO_LIMIT:
+            raise EEException(
+                f'Collection query aborted after accumulating over {GET_INFO_LIMIT} elements.')
+        result = _server_call(self._compute)
+        if isinstance(result, dict):
+            with _lock:
+                _stats['features'] += len(result['features'])
+        return result
@@ -0,0 +1,399 @@
+"""
+Google Earth Engine sampling backend
+
+Candidate points are chosen locally, as for the tile store and simulation,
+and Earth Engine is only asked for the pixel values under them. Points are
+grouped by geohash cell (GEE_CELL_PRECISION) and each cell is sampled once,
+at its centre. Cell values are kept in the persistent sample cache
+(sample_cache.py), so later queries only fetch the cells they are missing.
+
+Cells are sorted by geohash, which keeps neighbouring cells together, and
+looked up in blocks holding up to GEE_PAGE_SIZE missing cells. A block's
+missing cells are one sampleRegions(...).getInfo() request, well under the
+5000-element getInfo cap. Requests run concurrently on a shared thread pool (GEE_CONCURRENCY),
+and transient errors are retried with exponential backoff
+(GEE_MAX_RETRIES). Blocks are handed to the caller in geohash order as soon
+as each one is ready. Scoring starts on the first block while later ones
+are still in flight, and the result does not depend on which request
+finished first or on what was already cached.
+
+GEE_BACKEND selects the client:
+- 'earthengine': the earthengine-api package, authenticated with the
+  GEE_SERVICE_ACCOUNT key.
+- 'fake': fake_ee, an in-process stand-in for offline development and
+  benchmarks.
+- unset: sites come from the tile store or simulation.
+
+Try it without credentials (run it twice to see the cache at work):
+
+    python gee_backend.py sample --fake --state Texas --candidates 5000 --latency 0.05
+"""
+import argparse
+import hashlib
+import importlib.util
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import geohash
+from metrics import GEE_REQUEST_SECONDS, GEE_REQUESTS, StageTimings, register_cache
+from sample_cache import get_sample_cache
+
+GEE_BACKEND = os.getenv('GEE_BACKEND', '').strip().lower()
+GEE_CONCURRENCY = int(os.getenv('GEE_CONCURRENCY', 8))
+GEE_PAGE_SIZE = int(os.getenv('GEE_PAGE_SIZE', 1000))
+GEE_CELL_PRECISION = int(os.getenv('GEE_CELL_PRECISION', 6))
+GEE_SCALE = int(os.getenv('GEE_SCALE', 1000))  # metres per pixel
+GEE_MAX_RETRIES = int(os.getenv('GEE_MAX_RETRIES', 4))
+GEE_BACKOFF_SECONDS = float(os.getenv('GEE_BACKOFF_SECONDS', 0.5))
+GEE_MAX_BACKOFF_SECONDS = 8.0
+BLOCK_CELLS_PER_PAGE = 4
+
+# Source assets and bands of the composite; part of the cache's dataset version
+COMPOSITE_SOURCES = (
+    ('ghi', 'ImageCollection', 'NASA/POWER/Global_Horizontal_Irradiance', 'GHI', 'mean'),
+    ('slope', 'Terrain.slope', 'USGS/SRTMGL1_003', 'elevation', None),
+    ('land_cover', 'ImageCollection', 'ESA/WorldCover/v200', 'Map', 'first'),
+)
+
+# Error messages of the Earth Engine service that are worth retrying
+RETRYABLE_MESSAGES = (
+    'too many concurrent', 'too many requests', 'rate limit', 'quota',
+    'timed out', 'deadline', 'service unavailable', 'internal error', 'backend error'
+)
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+class EarthEngineSampler:
+    """Concurrent, cached pixel lookups by geohash cell"""
+
+    def __init__(self, ee, concurrency=GEE_CONCURRENCY, page_size=GEE_PAGE_SIZE,
+                 precision=GEE_CELL_PRECISION, scale=GEE_SCALE, cache=None,
+                 max_retries=GEE_MAX_RETRIES, backoff=GEE_BACKOFF_SECONDS):
+        self.ee = ee
+        self.concurrency = max(1, concurrency)
+        self.page_size = min(page_size, 5000)
+        self.precision = precision
+        self.scale = scale
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='gee')
+        # Cache writes go through one thread, off the request path and
+        # without the fetch threads contending for SQLite's write lock
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix='gee-cache')
+        self._writes = deque()
+        self._composite = None
+        self._composite_lock = threading.Lock()
+
+    @property
+    def dataset_version(self):
+        """Cache namespace: client, sources, scale and cell precision"""
+        spec = repr((COMPOSITE_SOURCES, self.scale, self.precision)).encode('utf-8')
+        return f"{self.ee.__name__}:{hashlib.sha1(spec).hexdigest()[:12]}"
+
+    def composite(self):
+        """ghi / slope / land_cover image, built once (client-side only)"""
+        if self._composite is None:
+            with self._composite_lock:
+                if self._composite is None:
+                    ee = self.ee
+                    bands = []
+                    for _, kind, asset, band, reducer in COMPOSITE_SOURCES:
+                        if kind == 'Terrain.slope':
+                            bands.append(ee.Terrain.slope(ee.Image(asset)))
+                        else:
+                            collection = ee.ImageCollection(asset).select(band)
+                            bands.append(getattr(collection, reducer)())
+                    image = bands[0]
+                    for band in bands[1:]:
+                        image = image.addBands(band)
+                    self._composite = image.rename([name for name, *_ in COMPOSITE_SOURCES])
+        return self._composite
+
+    def iter_lookup(self, lats, lons, timings=None):
+        """
+        Yield pixel values for points, block by block in geohash order
+
+        Args:
+            lats, lons: Coordinate arrays of the points
+            timings: Optional metrics.StageTimings; receives 'cache' (cache
+                reads) and 'fetch' (time spent waiting for Earth Engine)
+
+        Yields:
+            (index, values): index is an array of positions into lats/lons,
+            values a dict of numpy arrays ghi, slope, land_cover for them.
+            Points in cells without data are left out.
+        """
+        timings = timings if timings is not None else StageTimings()
+        codes = geohash.encode_int(lats, lons, self.precision)
+        order = np.argsort(codes, kind='stable')
+        cell_codes, starts = np.unique(codes[order], return_index=True)
+        cells = geohash.to_strings(cell_codes, self.precision).tolist()
+
+        with timings.stage('cache'):
+            cached = self.cache.get_many(self.dataset_version, cells) if self.cache is not None else {}
+        if self.cache is not None and len(cached) == len(cells):
+            # Nothing to put, so no put_many to carry the lookup counts
+            self._queue_write(self.cache.flush_counters)
+
+        bounds = np.append(starts, len(order))
+        blocks = self.plan_blocks([cell in cached for cell in cells])
+
+        for (first, last), fetched in self._ordered_blocks(blocks, cells, cell_codes, cached, timings):
+            values = np.array([fetched.get(cell) or cached.get(cell) or (None, None, None)
+                               for cell in cells[first:last]], dtype=np.float64)
+            points_per_cell = np.diff(bounds[first:last + 1])
+            index = order[bounds[first]:bounds[last]]
+            point_values = np.repeat(values, points_per_cell, axis=0)
+            keep = ~np.isnan(point_values[:, 0])
+            if keep.any():
+                yield index[keep], {
+                    'ghi': point_values[keep, 0],
+                    'slope': point_values[keep, 1],
+                    'land_cover': point_values[keep, 2].astype(np.uint8),
+                }
+
+    def plan_blocks(self, is_cached):
+        """
+        Split geohash-sorted cells into (first, last) blocks
+
+        A block closes after page_size missing cells, so each request is
+        full, or after BLOCK_CELLS_PER_PAGE * page_size cells, so a warm
+        cache still hands out blocks of moderate size.
+        """
+        blocks = []
+        first = missing = 0
+        for i, hit in enumerate(is_cached):
+            missing += not hit
+            if missing == self.page_size or i + 1 - first == BLOCK_CELLS_PER_PAGE * self.page_size:
+                blocks.append((first, i + 1))
+                first, missing = i + 1, 0
+        if first < len(is_cached):
+            blocks.append((first, len(is_cached)))
+        return blocks
+
+    def _ordered_blocks(self, blocks, cells, cell_codes, cached, timings):
+        # Keep up to two requests per thread queued so the pool never idles,
+        # but hand blocks out strictly in geohash order
+        remaining = iter(blocks)
+        pending = deque()
+
+        def submit_next():
+            block = next(remaining, None)
+            if block is None:
+                return
+            first, last = block
+            missing = [i for i in range(first, last) if cells[i] not in cached]
+            future = None
+            if missing:
+                future = self._executor.submit(
+                    self.fetch_cells, [cells[i] for i in missing], cell_codes[missing])
+            pending.append((block, future))
+
+        for _ in range(self.concurrency * 2):
+            submit_next()
+
+        while pending:
+            block, future = pending.popleft()
+            fetched = {}
+            if future is not None:
+                with timings.stage('fetch'):
+                    fetched = future.result()
+            submit_next()
+            yield block, fetched
+
+    def fetch_cells(self, cells, cell_codes):
+        """
+        Sample the composite at the centres of cells and cache the values
+
+        One sampleRegions(...).getInfo() call, retried on transient errors.
+        Cells the service returns nothing for are cached as no-data.
+
+        Returns:
+            Dict of cell -> (ghi, slope, land_cover)
+        """
+        ee = self.ee
+        lats, lons = geohash.centers(cell_codes, self.precision)
+        points = ee.FeatureCollection([
+            ee.Feature(ee.Geometry.Point([float(lon), float(lat)]), {'cell': cell})
+            for cell, lat, lon in zip(cells, lats, lons)
+        ])
+        request = self.composite().sampleRegions(
+            collection=points, properties=['cell'], scale=self.scale, geometries=False)
+
+        result = self._get_info(request)
+        values = dict.fromkeys(cells, (None, None, None))
+        for feature in result['features']:
+            props = feature['properties']
+            values[props['cell']] = (props['ghi'], props['slope'], props['land_cover'])
+        if self.cache is not None:
+            self._queue_write(self.cache.put_many, self.dataset_version, values)
+        return values
+
+    def _queue_write(self, fn, *args):
+        self._writes.append(self._writer.submit(fn, *args))
+        while self._writes and self._writes[0].done():
+            self._writes.popleft().result()
+
+    def flush(self):
+        """Write pending lookup counts and wait for queued cache writes"""
+        if self.cache is not None:
+            self._queue_write(self.cache.flush_counters, True)
+        while self._writes:
+            self._writes.popleft().result()
+
+    def _get_info(self, request):
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                result = request.getInfo()
+            except Exception as e:
+                elapsed = time.perf_counter() - started
+                if attempt >= self.max_retries or not self.retryable(e):
+                    GEE_REQUESTS.inc(outcome='error')
+                    GEE_REQUEST_SECONDS.observe(elapsed, outcome='error')
+                    raise
+                GEE_REQUESTS.inc(outcome='retry')
+                GEE_REQUEST_SECONDS.observe(elapsed, outcome='retry')
+                delay = min(GEE_MAX_BACKOFF_SECONDS, self.backoff * 2 ** attempt)
+                print(f"[GEE] Request failed ({e}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            GEE_REQUESTS.inc(outcome='ok')
+            GEE_REQUEST_SECONDS.observe(time.perf_counter() - started, outcome='ok')
+            return result
+
+    def retryable(self, error):
+        """Transient service errors and network failures are retried"""
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        if isinstance(error, self.ee.EEException):
+            message = str(error).lower()
+            return any(text in message for text in RETRYABLE_MESSAGES)
+        return False
+
+
+def _earthengine_client():
+    """Import and initialize earthengine-api with the configured service account"""
+    import ee
+
+    account = os.getenv('GEE_SERVICE_ACCOUNT')
+    key_path = os.getenv('GEE_PRIVATE_KEY_PATH')
+    credentials = ee.ServiceAccountCredentials(account, key_path) if account and key_path else None
+    ee.Initialize(credentials, project=os.getenv('GEE_PROJECT') or None)
+    print(f"[GEE] Earth Engine initialized{f' as {account}' if credentials else ''}")
+    return ee
+
+
+def get_gee_sampler():
+    """
+    Return the shared EarthEngineSampler for GEE_BACKEND, or None if unset
+
+    The client is imported and initialized on first use, not at import time.
+    """
+    global _sampler
+    if not GEE_BACKEND:
+        return None
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                if GEE_BACKEND == 'fake':
+                    import fake_ee as ee
+                elif GEE_BACKEND == 'earthengine':
+                    ee = _earthengine_client()
+                else:
+                    raise RuntimeError(f"Unknown GEE_BACKEND '{GEE_BACKEND}' (use 'earthengine' or 'fake')")
+                cache = get_sample_cache()
+                if cache is not None:
+                    register_cache('gee_samples', cache, tier='disk')
+                _sampler = EarthEngineSampler(ee, cache=cache)
+    return _sampler
+
+
+def gee_status():
+    """Configured backend and whether it can be used, without initializing it"""
+    if not GEE_BACKEND:
+        return {'configured': False, 'ok': True, 'backend': None, 'initialized': False}
+
+    status = {'configured': True, 'backend': GEE_BACKEND, 'initialized': _sampler is not None}
+    if GEE_BACKEND == 'fake':
+        status['ok'] = True
+    elif GEE_BACKEND == 'earthengine':
+        key_path = os.getenv('GEE_PRIVATE_KEY_PATH')
+        status['ok'] = importlib.util.find_spec('ee') is not None and (not key_path or os.path.exists(key_path))
+    else:
+        status['ok'] = False
+        status['error'] = f"Unknown GEE_BACKEND '{GEE_BACKEND}'"
+    return status
+
+
+def sample_cache_stats():
+    """stats() of the sample cache in use, or None before the first GEE lookup"""
+    if _sampler is None or _sampler.cache is None:
+        return None
+    return _sampler.cache.stats()
+
+
+def main(argv=None):
+    from utils import STATE_BOUNDARIES, sample_coordinates
+
+    parser = argparse.ArgumentParser(description='Earth Engine sampling backend')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sample = sub.add_parser('sample', help='Look up sampled points of one state and report throughput')
+    sample.add_argument('--state', default='Texas')
+    sample.add_argument('--candidates', type=int, default=5000)
+    sample.add_argument('--seed', type=int, default=1)
+    sample.add_argument('--concurrency', type=int, default=GEE_CONCURRENCY)
+    sample.add_argument('--page-size', type=int, default=GEE_PAGE_SIZE)
+    sample.add_argument('--precision', type=int, default=GEE_CELL_PRECISION)
+    sample.add_argument('--no-cache', action='store_true', help='Skip the persistent sample cache')
+    sample.add_argument('--fake', action='store_true', help='Use fake_ee instead of earthengine-api')
+    sample.add_argument('--latency', type=float, default=0.05, help='fake_ee seconds per request')
+    sample.add_argument('--failure-rate', type=float, default=0.0, help='fake_ee transient failure rate')
+    args = parser.parse_args(argv)
+
+    if args.fake:
+        import fake_ee as ee
+        ee.configure(latency=args.latency, failure_rate=args.failure_rate)
+    else:
+        ee = _earthengine_client()
+    cache = None if args.no_cache else get_sample_cache()
+    sampler = EarthEngineSampler(ee, concurrency=args.concurrency, page_size=args.page_size,
+                                 precision=args.precision, cache=cache)
+
+    lats, lons = sample_coordinates(STATE_BOUNDARIES[args.state], args.candidates,
+                                    state_name=args.state, seed=args.seed)
+    timings = StageTimings()
+    started = time.perf_counter()
+    first_block = None
+    blocks = points = 0
+    for index, _ in sampler.iter_lookup(lats, lons, timings=timings):
+        first_block = first_block or time.perf_counter() - started
+        blocks += 1
+        points += len(index)
+    elapsed = time.perf_counter() - started
+    sampler.flush()
+
+    print(f"[GEE] {points} of {len(lats)} points with data in {blocks} blocks from {args.state} "
+          f"in {elapsed:.2f}s (first block after {first_block or 0:.2f}s)")
+    print(f"[GEE] Requests: ok={GEE_REQUESTS.value(outcome='ok')} "
+          f"retry={GEE_REQUESTS.value(outcome='retry')} error={GEE_REQUESTS.value(outcome='error')}")
+    if cache is not None:
+        stats = cache.stats()
+        print(f"[GEE] Sample cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']} cells stored ({cache.path})")
+    if args.fake:
+        print(f"[GEE] fake_ee: {ee.stats()}")
+
+
+if __name__ == '__main__':
+    main()
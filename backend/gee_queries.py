@@ -1,5 +1,9 @@
 """Google Earth Engine queries for satellite data analysis"""
-import random
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
 from utils import (
     get_state_boundary,
     normalize_irradiance,
@@ -8,70 +12,414 @@ from utils import (
     land_cover_name,
     estimate_grid_distance_km,
     estimate_grid_score,
-    generate_sample_coordinates
+    generate_sample_coordinates,
+    iter_sample_coordinates
 )
 from real_locations import get_real_locations_for_state
+from metrics import StageTimings
+from tile_store import get_tile_store
+from gee_backend import get_gee_sampler
+from grid_index import get_transmission_index
+from scoring import (
+    CandidateColumns,
+    DEFAULT_CRITERIA_WEIGHTS,
+    RankedSites,
+    ScoredCandidates,
+    rank_candidate_stream,
+    slope_mask
+)
 
-# NOTE: This is a simplified version for the MVP that generates realistic data
-# In production, you would use actual Google Earth Engine API calls
-
-def analyze_solar_sites(region_name, num_sites=10, criteria_weights=None, constraints=None):
+# Site metrics come from Google Earth Engine when GEE_BACKEND is set (see
+# gee_backend.py), otherwise from the local tile store or simulation
+
+# Regional modifiers based on actual US solar patterns
+REGIONAL_IRRADIANCE_BONUS = {
+    'Arizona': 1.3,
+    'California': 1.1,
+    'Nevada': 1.2,
+    'Texas': 0.8,
+    'New Mexico': 1.2,
+    'Utah': 1.0,
+    'Colorado': 0.9,
+    'Oklahoma': 0.7,
+    'Kansas': 0.6,
+    'Florida': 0.9,
+}
+
+# Worker processes for multi-region searches (0 or 1 runs regions in-process).
+# Each web worker process starts its own pool, so this is per web worker.
+REGION_WORKERS = int(os.getenv('REGION_WORKERS', 1))
+_region_pool = None
+
+# Sampled candidates are simulated or read from the tile store and ranked
+# this many at a time, so memory does not grow with num_candidates
+CANDIDATE_BLOCK_SIZE = int(os.getenv('CANDIDATE_BLOCK_SIZE', 4096))
+
+SUITABLE_LAND_COVER = [60, 30, 40]  # barren, grassland, cropland
+UNSUITABLE_LAND_COVER = [10, 20, 50, 80]  # forest, shrubland, built-up, water
+
+def analyze_solar_sites(region_name, num_sites=10, criteria_weights=None, constraints=None,
+                        seed=None, sampling_method='uniform', num_candidates=100, retain=None,
+                        timings=None, compact=False):
     """
     Analyze potential solar sites in a given region
 
-    For MVP: Uses real-world coordinates of suitable locations
-    For Production: Would use real ee.ImageCollection queries
+    Real-world coordinates of suitable locations are used where known, and
+    sampled points elsewhere. Candidates are scored block by block into a
+    bounded top-k: with GEE_BACKEND set, blocks of Earth Engine lookups
+    (through the persistent sample cache) as they arrive, otherwise blocks
+    of CANDIDATE_BLOCK_SIZE points read from the tile store or simulated.
 
     Args:
         region_name: State name (e.g., "Arizona")
         num_sites: Number of top sites to return
         criteria_weights: Dict with irradiance, slope, grid_distance, land_cover
         constraints: Dict with max_slope, min_acreage, etc.
+        seed: Seed for candidate sampling; the same seed gives the same sites
+        sampling_method: 'uniform', 'halton' or 'sobol'; unused for REAL_LOCATIONS states
+        num_candidates: Candidate points to sample for states without real locations
+        retain: Optional list; receives the scoring.ScoredCandidates for re-ranking
+        timings: Optional metrics.StageTimings that receives stage durations
+        compact: Return a scoring.RankedSites instead of site dicts
 
     Returns:
         List of top-ranked sites with scores and metrics
     """
+    criteria_weights = criteria_weights or DEFAULT_CRITERIA_WEIGHTS
+    rng = np.random.default_rng(seed)
+    sampler = get_gee_sampler()
+    if sampler is not None:
+        batches = gee_candidate_batches(sampler, region_name, num_sites, rng,
+                                        sampling_method, num_candidates, timings)
+    else:
+        batches = sample_candidate_batches(region_name, num_sites, rng, constraints,
+                                           sampling_method, num_candidates, timings)
+    return rank_candidate_stream(
+        batches,
+        num_sites=num_sites,
+        criteria_weights=criteria_weights,
+        constraints=constraints,
+        retain=retain,
+        timings=timings,
+        compact=compact
+    )
 
-    # Default weights
-    if not criteria_weights:
-        criteria_weights = {
-            'irradiance': 0.4,
-            'slope': 0.3,
-            'grid_distance': 0.2,
-            'land_cover': 0.1
-        }
+def _analyze_region(region_name, num_sites, criteria_weights, constraints, seed,
+                    sampling_method, num_candidates):
+    """
+    Local top-k for one state, tagged with the state name (runs in a worker)
 
-    # Default constraints
-    if not constraints:
-        constraints = {}
+    Returns:
+        (RankedSites, ScoredCandidates, StageTimings) for the state
+    """
+    retained = []
+    timings = StageTimings()
+    ranked = analyze_solar_sites(region_name, num_sites, criteria_weights, constraints,
+                                 seed, sampling_method, num_candidates, retain=retained,
+                                 timings=timings, compact=True)
+    ranked.regions = [region_name] * len(ranked)
+    scored = ScoredCandidates.concat(retained)
+    scored.regions = [region_name] * len(scored)
+    return ranked, scored, timings
+
+def _get_region_pool():
+    global _region_pool
+    if _region_pool is None:
+        # spawn rather than fork: the API process runs thread pools
+        _region_pool = ProcessPoolExecutor(
+            max_workers=REGION_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _region_pool
+
+def analyze_solar_regions(regions, num_sites=10, criteria_weights=None, constraints=None,
+                          seed=None, sampling_method='uniform', num_candidates=100, retain=None,
+                          timings=None):
+    """
+    Analyze several states and return the best sites across all of them
+
+    Each state is ranked in its own worker process, which returns only its
+    local top num_sites in columnar form. The global ranking is a top-k
+    over at most num_sites * len(regions) sites, and site dicts are built
+    only for the num_sites that survive it.
+
+    Args:
+        regions: List of state names (see utils.resolve_region)
+        seed: Seed for the whole search; each state gets its own child seed
+        retain: Optional list; receives one scoring.ScoredCandidates per state
+        timings: Optional metrics.StageTimings; per-state stage times are summed
+
+    Returns:
+        List of top-ranked sites, each with a 'region' field
+    """
+    timings = timings if timings is not None else StageTimings()
+
+    # Child seeds depend only on the seed and the position in regions,
+    # so results do not depend on which worker finishes first. A single
+    # state keeps the plain seed and matches analyze_solar_sites.
+    if len(regions) == 1:
+        seeds = [seed]
+    else:
+        seeds = np.random.SeedSequence(seed).spawn(len(regions))
+    args = [(region, num_sites, criteria_weights, constraints, child,
+             sampling_method, num_candidates)
+            for region, child in zip(regions, seeds)]
+
+    results = None
+    # Earth Engine requests are I/O bound and share one bounded thread pool
+    # per process, so with GEE_BACKEND set states are ranked in-process
+    if len(regions) > 1 and REGION_WORKERS > 1 and get_gee_sampler() is None:
+        try:
+            pool = _get_region_pool()
+            futures = [pool.submit(_analyze_region, *a) for a in args]
+            results = [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            global _region_pool
+            print(f"[WARNING] Region worker pool failed, ranking in-process: {e}")
+            _region_pool = None
+    if results is None:
+        results = [_analyze_region(*a) for a in args]
+
+    per_region = [ranked for ranked, _, _ in results]
+    if retain is not None:
+        retain.extend(scored for _, scored, _ in results)
+    for _, _, region_timings in results:
+        timings.merge(region_timings)
+
+    # Ties keep region order, matching the in-state tie-break on sample order
+    with timings.stage('ranking'):
+        sites = RankedSites.merge(per_region, num_sites).to_dicts()
+
+    print(f"[GEE] Merged top {len(sites)} sites from {len(regions)} regions")
+    return sites
+
+def sample_candidates(region_name, num_sites=10, rng=None, constraints=None,
+                      sampling_method='uniform', num_candidates=100, timings=None):
+    """
+    Sample candidate points in a region and simulate their metrics
+
+    All blocks of sample_candidate_batches() in one CandidateColumns.
+
+    Returns:
+        CandidateColumns with one entry per candidate point
+    """
+    return CandidateColumns.concat(list(sample_candidate_batches(
+        region_name, num_sites, rng, constraints, sampling_method, num_candidates, timings)))
+
+def sample_candidate_batches(region_name, num_sites=10, rng=None, constraints=None,
+                             sampling_method='uniform', num_candidates=100, timings=None):
+    """
+    Sample candidate points in a region and simulate their metrics, block by block
+
+    Points are drawn CANDIDATE_BLOCK_SIZE at a time and each block is
+    looked up before the next is drawn. The cheap max_slope constraint is
+    pushed down: slope is looked up first and the remaining metrics are
+    only simulated for points that pass it.
+
+    Stage durations go to timings under 'sampling' (coordinates), 'lookup'
+    (raster reads or simulation) and 'filtering'.
+
+    Yields:
+        CandidateColumns for each block of candidate points
+    """
+    rng = rng or np.random.default_rng()
+    timings = timings if timings is not None else StageTimings()
+    # Read pixels from the local tile store when one is configured,
+    # otherwise simulate GEE data
+    store = get_tile_store()
+
+    blocks = candidate_point_blocks(region_name, num_sites, rng, sampling_method, num_candidates)
+    while True:
+        with timings.stage('sampling'):
+            block = next(blocks, None)
+        if block is None:
+            return
+        lats, lons, names, types = block
+        timings.count('sampled', len(lats))
+        yield _candidate_columns(lats, lons, names, types, region_name, rng, constraints, store, timings)
+
+def _candidate_columns(lats, lons, names, types, region_name, rng, constraints, store, timings):
+    """Look up or simulate the metrics of one block of candidate points"""
+    if store is not None:
+        # Points the rasters do not cover have no data to score
+        inside = store.contains(lats, lons)
+        if not inside.all():
+            keep = np.flatnonzero(inside)
+            lats, lons = lats[keep], lons[keep]
+            if names is not None:
+                names = [names[i] for i in keep]
+                types = [types[i] for i in keep]
+
+    with timings.stage('lookup'):
+        if store is not None:
+            slopes = store.sample(lats, lons, ['slope'])['slope'].astype(np.float64)
+        else:
+            slopes = simulate_slope_batch(lats, lons, rng)
+
+    with timings.stage('filtering'):
+        mask = slope_mask(slopes, constraints)
+        if mask is not None:
+            keep = np.flatnonzero(mask)
+            lats, lons, slopes = lats[keep], lons[keep], slopes[keep]
+            if names is not None:
+                names = [names[i] for i in keep]
+                types = [types[i] for i in keep]
+
+    with timings.stage('lookup'):
+        if store is not None:
+            pixels = store.sample(lats, lons, ['ghi', 'land_cover'])
+            irradiance = pixels['ghi'].astype(np.float64)
+            land_cover = pixels['land_cover']
+        else:
+            irradiance = simulate_solar_irradiance_batch(lats, lons, region_name, rng)
+            land_cover = simulate_land_cover_batch(lats, lons, rng)
+        grid_distance = estimate_grid_distance_batch(lats, lons, rng)
+
+    return CandidateColumns(
+        lat=lats,
+        lon=lons,
+        irradiance=irradiance,
+        slope=slopes,
+        land_cover=land_cover,
+        grid_distance=grid_distance,
+        names=names,
+        types=types
+    )
+
+def candidate_points(region_name, num_sites, rng, sampling_method='uniform', num_candidates=100):
+    """
+    Candidate coordinates for a region
+
+    Returns:
+        (lats, lons, names, types); names and types are lists for real
+        locations and None for sampled points
+    """
+    blocks = list(candidate_point_blocks(region_name, num_sites, rng, sampling_method, num_candidates))
+    if len(blocks) == 1:
+        return blocks[0]
+    lats = np.concatenate([block[0] for block in blocks]) if blocks else np.empty(0)
+    lons = np.concatenate([block[1] for block in blocks]) if blocks else np.empty(0)
+    return lats, lons, None, None
+
+def candidate_point_blocks(region_name, num_sites, rng, sampling_method='uniform', num_candidates=100,
+                           block_size=None):
+    """
+    candidate_points() in blocks of at most block_size (CANDIDATE_BLOCK_SIZE) points
 
+    Real locations are a single block; sampled points are drawn one block
+    at a time.
+    """
     # Try to get real locations first
-    real_locations = get_real_locations_for_state(region_name, num_sites * 3)
+    real_locations = get_real_locations_for_state(region_name, num_sites * 3, rng=rng)
 
     if real_locations:
         # Use real-world coordinates with actual location names
+        yield (
+            np.asarray([loc['lat'] for loc in real_locations], dtype=np.float64),
+            np.asarray([loc['lon'] for loc in real_locations], dtype=np.float64),
+            [loc['name'] for loc in real_locations],
+            [loc['type'] for loc in real_locations]
+        )
+        return
+
+    # Fallback to random generation for states not in database
+    boundary = get_state_boundary(region_name)
+    for lats, lons in iter_sample_coordinates(
+        boundary,
+        num_points=num_candidates,
+        state_name=region_name,
+        seed=rng,
+        method=sampling_method,
+        batch_size=block_size or CANDIDATE_BLOCK_SIZE
+    ):
+        yield lats, lons, None, None
+
+def gee_candidate_batches(sampler, region_name, num_sites, rng, sampling_method='uniform',
+                          num_candidates=100, timings=None):
+    """
+    CandidateColumns for each block of Earth Engine lookups in a region
+
+    Blocks come from gee_backend.EarthEngineSampler in geohash order, so
+    the first block can be scored while the rest are still being fetched.
+    """
+    timings = timings if timings is not None else StageTimings()
+    with timings.stage('sampling'):
+        lats, lons, names, types = candidate_points(region_name, num_sites, rng,
+                                                    sampling_method, num_candidates)
+    timings.count('sampled', len(lats))
+    with timings.stage('lookup'):
+        grid_distance = estimate_grid_distance_batch(lats, lons, rng)
+
+    for index, values in sampler.iter_lookup(lats, lons, timings=timings):
+        yield CandidateColumns(
+            lat=lats[index],
+            lon=lons[index],
+            irradiance=values['ghi'],
+            slope=values['slope'],
+            land_cover=values['land_cover'],
+            grid_distance=grid_distance[index],
+            names=[names[i] for i in index] if names is not None else None,
+            types=[types[i] for i in index] if types is not None else None
+        )
+
+def analyze_solar_sites_reference(region_name, num_sites=10, criteria_weights=None, constraints=None,
+                                  seed=None):
+    """
+    Per-point reference implementation of analyze_solar_sites
+
+    Simulates and scores one point at a time. Kept for equivalence checks
+    against the vectorized engine in scoring.py.
+    """
+    rng = np.random.default_rng(seed)
+    real_locations = get_real_locations_for_state(region_name, num_sites * 3, rng=rng)
+
+    if real_locations:
         sample_points = [(loc['lat'], loc['lon'], loc['name'], loc['type'])
                         for loc in real_locations]
     else:
-        # Fallback to random generation for states not in database
         boundary = get_state_boundary(region_name)
-        coords = generate_sample_coordinates(boundary, num_points=100, state_name=region_name)
+        coords = generate_sample_coordinates(boundary, num_points=100, state_name=region_name, seed=rng)
         sample_points = [(lat, lon, None, None) for lat, lon in coords]
 
+    columns = CandidateColumns(
+        lat=[p[0] for p in sample_points],
+        lon=[p[1] for p in sample_points],
+        irradiance=[simulate_solar_irradiance(p[0], p[1], region_name, rng) for p in sample_points],
+        slope=[simulate_slope(p[0], p[1], rng) for p in sample_points],
+        land_cover=[simulate_land_cover(p[0], p[1], rng) for p in sample_points],
+        grid_distance=[estimate_grid_distance_km(p[0], p[1], rng=rng) for p in sample_points],
+        names=[p[2] for p in sample_points],
+        types=[p[3] for p in sample_points]
+    )
+    return rank_candidates_reference(columns, num_sites, criteria_weights, constraints)
+
+def rank_candidates_reference(columns, num_sites=10, criteria_weights=None, constraints=None):
+    """
+    Score, filter and rank candidates one point at a time
+
+    Reference implementation for scoring.rank_candidates: given the same
+    CandidateColumns both must return identical sites.
+    """
+
+    # Default weights
+    if not criteria_weights:
+        criteria_weights = DEFAULT_CRITERIA_WEIGHTS
+
+    # Default constraints
+    if not constraints:
+        constraints = {}
+
     # Score each point
     scored_sites = []
 
-    for point_data in sample_points:
-        if len(point_data) == 4:
-            lat, lon, location_name, location_type = point_data
-        else:
-            lat, lon = point_data
-            location_name, location_type = None, None
-        # Simulate GEE data (in production, these would be actual values from datasets)
-        irradiance = simulate_solar_irradiance(lat, lon, region_name)
-        slope = simulate_slope(lat, lon)
-        land_cover_code = simulate_land_cover(lat, lon)
-        grid_distance = estimate_grid_distance_km()
+    for i in range(len(columns)):
+        lat, lon = float(columns.lat[i]), float(columns.lon[i])
+        location_name = columns.names[i] if columns.names is not None else None
+        location_type = columns.types[i] if columns.types is not None else None
+        irradiance = float(columns.irradiance[i])
+        slope = float(columns.slope[i])
+        land_cover_code = int(columns.land_cover[i])
+        grid_distance = float(columns.grid_distance[i])
 
         # Calculate individual scores
         irr_score = normalize_irradiance(irradiance)
@@ -116,7 +464,6 @@ def analyze_solar_sites(region_name, num_sites=10, criteria_weights=None, constr
     max_slope = constraints.get('max_slope')
     if max_slope is not None:
         filtered_sites = [site for site in filtered_sites if site['metrics']['slope'] <= max_slope]
-        print(f"[GEE] Filtered to {len(filtered_sites)} sites with slope <= {max_slope}°")
 
     # Filter by minimum acreage if specified (currently we don't track individual site acreage,
     # but we could filter based on having suitable conditions for that acreage)
@@ -127,7 +474,6 @@ def analyze_solar_sites(region_name, num_sites=10, criteria_weights=None, constr
         if min_acreage > 100:
             # For large sites, require higher scores
             filtered_sites = [site for site in filtered_sites if site['score'] >= 70]
-            print(f"[GEE] Filtered to {len(filtered_sites)} sites suitable for {min_acreage}+ acres")
 
     # Sort by score and return top N
     filtered_sites.sort(key=lambda x: x['score'], reverse=True)
@@ -138,7 +484,7 @@ def analyze_solar_sites(region_name, num_sites=10, criteria_weights=None, constr
 
     return filtered_sites[:num_sites]
 
-def simulate_solar_irradiance(lat, lon, region):
+def simulate_solar_irradiance(lat, lon, region, rng):
     """
     Simulate solar irradiance based on latitude and region
     Based on NASA POWER GHI dataset patterns
@@ -147,101 +493,58 @@ def simulate_solar_irradiance(lat, lon, region):
     base = 5.5 - (abs(lat - 25) * 0.05)
 
     # Regional modifiers based on actual US solar patterns
-    regional_bonus = {
-        'Arizona': 1.3,
-        'California': 1.1,
-        'Nevada': 1.2,
-        'Texas': 0.8,
-        'New Mexico': 1.2,
-        'Utah': 1.0,
-        'Colorado': 0.9,
-        'Oklahoma': 0.7,
-        'Kansas': 0.6,
-        'Florida': 0.9,
-    }.get(region, 0.5)
+    regional_bonus = REGIONAL_IRRADIANCE_BONUS.get(region, 0.5)
 
     # Add some randomness
-    noise = random.uniform(-0.3, 0.3)
+    noise = rng.uniform(-0.3, 0.3)
 
     return max(3.0, min(7.5, base + regional_bonus + noise))
 
-def simulate_slope(lat, lon):
+def simulate_slope(lat, lon, rng):
     """
     Simulate terrain slope
     Based on SRTM elevation data patterns
     """
     # Most sites should be relatively flat (good for solar)
     # Use exponential distribution to favor lower slopes
-    slope = abs(random.gauss(3, 4))
+    slope = abs(rng.normal(3, 4))
     return min(15.0, slope)
 
-def simulate_land_cover(lat, lon):
+def simulate_land_cover(lat, lon, rng):
     """
     Simulate land cover type
     Based on ESA WorldCover classifications
     """
     # Weight towards suitable land types
-    suitable_types = [60, 30, 40]  # barren, grassland, cropland
-    unsuitable_types = [10, 20, 50, 80]  # forest, shrubland, built-up, water
-
     # 70% chance of suitable land cover
-    if random.random() < 0.7:
-        return random.choice(suitable_types)
+    if rng.random() < 0.7:
+        return int(rng.choice(SUITABLE_LAND_COVER))
     else:
-        return random.choice(unsuitable_types)
-
-# Real GEE implementation (commented out for MVP - uncomment when GEE is set up)
-"""
-import ee
-
-def analyze_solar_sites_real(region_name, num_sites=10, criteria_weights=None):
-    '''
-    Real implementation using Google Earth Engine API
-    '''
-    if not criteria_weights:
-        criteria_weights = {
-            'irradiance': 0.4,
-            'slope': 0.3,
-            'grid_distance': 0.2,
-            'land_cover': 0.1
-        }
-
-    # Initialize Earth Engine (should be done once in main app)
-    # ee.Initialize()
-
-    # Define region of interest
-    min_lon, min_lat, max_lon, max_lat = get_state_boundary(region_name)
-    roi = ee.Geometry.Rectangle([min_lon, min_lat, max_lon, max_lat])
-
-    # Get Solar Irradiance from NASA POWER
-    irradiance = ee.ImageCollection('NASA/POWER/Global_Horizontal_Irradiance') \\
-        .filterBounds(roi) \\
-        .select('GHI') \\
-        .mean()
-
-    # Get Slope from SRTM Elevation
-    elevation = ee.Image('USGS/SRTMGL1_003')
-    slope = ee.Terrain.slope(elevation)
-
-    # Get Land Cover from ESA WorldCover
-    land_cover = ee.Image('ESA/WorldCover/v200/2021').select('Map')
-
-    # Combine all bands
-    composite = irradiance.addBands(slope).addBands(land_cover)
-
-    # Sample random points across region
-    points = composite.sample(
-        region=roi,
-        scale=1000,  # 1km resolution
-        numPixels=2000,
-        geometries=True
-    )
-
-    # Convert to Python list
-    points_list = points.getInfo()['features']
-
-    # Score each point (same logic as simulate version)
-    # ... rest of implementation
-
-    return scored_sites[:num_sites]
-"""
+        return int(rng.choice(UNSUITABLE_LAND_COVER))
+
+def simulate_solar_irradiance_batch(lats, lons, region, rng):
+    """Vectorized simulate_solar_irradiance for arrays of coordinates"""
+    base = 5.5 - (np.abs(lats - 25) * 0.05)
+    regional_bonus = REGIONAL_IRRADIANCE_BONUS.get(region, 0.5)
+    noise = rng.uniform(-0.3, 0.3, len(lats))
+    return np.clip(base + regional_bonus + noise, 3.0, 7.5)
+
+def simulate_slope_batch(lats, lons, rng):
+    """Vectorized simulate_slope for arrays of coordinates"""
+    return np.minimum(15.0, np.abs(rng.normal(3, 4, len(lats))))
+
+def simulate_land_cover_batch(lats, lons, rng):
+    """Vectorized simulate_land_cover for arrays of coordinates"""
+    n = len(lats)
+    suitable = rng.choice(SUITABLE_LAND_COVER, n)
+    unsuitable = rng.choice(UNSUITABLE_LAND_COVER, n)
+    # 70% chance of suitable land cover
+    return np.where(rng.random(n) < 0.7, suitable, unsuitable).astype(np.uint8)
+
+def estimate_grid_distance_batch(lats, lons, rng):
+    """Nearest transmission line distance (km) for arrays of coordinates"""
+    index = get_transmission_index()
+    if index is not None:
+        return np.round(index.nearest_distance_km(lats, lons), 1)
+    # No line index configured: fall back to the MVP random estimate
+    return np.round(rng.uniform(0.5, 25.0, len(lats)), 1)
@@ -1,95 +1,429 @@
 """Gemini AI agents for query parsing and site explanations"""
-import google.generativeai as genai
+import hashlib
 import os
+import asyncio
 import json
 import re
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from dotenv import load_dotenv
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+from caching import TTLCache, SQLiteCache, TieredCache
+from circuit_breaker import OPEN, CircuitBreaker, CircuitOpenError
+from metrics import (FALLBACKS, GEMINI_CALLS, GEMINI_CALL_SECONDS, GEMINI_HEDGES, QUERY_PARSES,
+                     QUERY_PARSE_SECONDS, register_breaker)
+from query_parser import extract_query
+from rate_limit import TokenBucket
+from utils import REGION_GROUPS
 
 load_dotenv()
 
-# Configure Gemini
-genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+# Use Gemini 2.5 Flash - latest fast model
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
 
-# Configure safety settings to be more permissive
-safety_settings = {
-    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-}
+# The Gemini SDK takes most of the backend's import time, so the client is
+# built on first use; regex parsing, scoring and offline tools never load it
+_model = None
+_model_lock = threading.Lock()
 
-# Use Gemini 2.5 Flash - latest fast model
-model = genai.GenerativeModel('gemini-2.5-flash', safety_settings=safety_settings)
+def gemini_configured():
+    """Whether GEMINI_API_KEY is set; without it no Gemini call is attempted"""
+    return bool(os.getenv('GEMINI_API_KEY'))
+
+def get_model():
+    """
+    Return the shared Gemini model, configuring the client on first call
+
+    Returns None when GEMINI_API_KEY is not set, so callers go straight to
+    their regex and template fallbacks instead of making calls bound to fail.
+    """
+    global _model
+    if _model is None:
+        if not gemini_configured():
+            return None
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+                from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
+                genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+
+                # Configure safety settings to be more permissive
+                safety_settings = {
+                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+                }
+                _model = genai.GenerativeModel(GEMINI_MODEL_NAME, safety_settings=safety_settings)
+                print(f"[GEMINI] Client initialized ({GEMINI_MODEL_NAME})")
+    return _model
+
+async def get_model_async():
+    """get_model() for coroutines; the first call builds the client in a worker thread"""
+    if _model is not None or not gemini_configured():
+        return _model
+    return await asyncio.to_thread(get_model)
+
+def _configured_model():
+    """get_model(), raising CircuitOpenError when no API key is set"""
+    model = get_model()
+    if model is None:
+        raise CircuitOpenError('GEMINI_API_KEY is not set')
+    return model
+
+async def _configured_model_async():
+    model = await get_model_async()
+    if model is None:
+        raise CircuitOpenError('GEMINI_API_KEY is not set')
+    return model
+
+def gemini_status():
+    """Whether an API key is set and whether the client has been built yet"""
+    return {
+        'configured': gemini_configured(),
+        'client_initialized': _model is not None,
+        'model': GEMINI_MODEL_NAME,
+        'circuit': gemini_breaker.stats(),
+    }
+
+# Parsed queries are cached by normalized text; regex fallback results
+# expire sooner so Gemini gets another chance once it recovers
+PARSE_CACHE_TTL = int(os.getenv('PARSE_CACHE_TTL', 86400))
+PARSE_CACHE_FALLBACK_TTL = int(os.getenv('PARSE_CACHE_FALLBACK_TTL', 600))
+# Queries the local parser reads with at least this confidence skip Gemini
+# (above 1 always asks Gemini)
+LOCAL_PARSE_MIN_CONFIDENCE = float(os.getenv('LOCAL_PARSE_MIN_CONFIDENCE', 0.9))
+# Longest wait for a Gemini parse before falling back to the regex parse
+PARSE_TIMEOUT = float(os.getenv('PARSE_TIMEOUT', 4.0))
+_parse_cache_path = os.getenv('PARSE_CACHE_PATH', os.path.join(os.path.dirname(__file__), 'data', 'cache.sqlite3'))
+
+parse_cache = TieredCache(
+    TTLCache(max_entries=int(os.getenv('PARSE_CACHE_SIZE', 1024)), default_ttl=PARSE_CACHE_TTL),
+    SQLiteCache(_parse_cache_path, table='parsed_queries', default_ttl=PARSE_CACHE_TTL) if _parse_cache_path else None
+)
+
+# Gemini explanations are cached by a content hash of the prompt inputs
+EXPLANATION_CACHE_TTL = int(os.getenv('EXPLANATION_CACHE_TTL', 7 * 86400))
+_explanation_cache_path = os.getenv('EXPLANATION_CACHE_PATH', _parse_cache_path)
+
+explanation_cache = TieredCache(
+    TTLCache(max_entries=int(os.getenv('EXPLANATION_CACHE_SIZE', 2048)), default_ttl=EXPLANATION_CACHE_TTL),
+    SQLiteCache(_explanation_cache_path, table='explanations', default_ttl=EXPLANATION_CACHE_TTL) if _explanation_cache_path else None
+)
+
+# Explanation calls run concurrently on a bounded pool, paced by a token bucket
+EXPLANATION_WORKERS = int(os.getenv('EXPLANATION_WORKERS', 4))
+EXPLANATION_TIMEOUT = float(os.getenv('EXPLANATION_TIMEOUT', 8.0))
+AI_EXPLAINED_SITES = int(os.getenv('AI_EXPLAINED_SITES', 3))
+# Sites explained per Gemini call (1 asks for each site separately)
+EXPLANATION_BATCH_SIZE = max(1, int(os.getenv('EXPLANATION_BATCH_SIZE', 10)))
+
+gemini_rate_limiter = TokenBucket(
+    rate=float(os.getenv('GEMINI_RATE_PER_SECOND', 3.0)),
+    capacity=float(os.getenv('GEMINI_RATE_BURST', 4))
+)
+_explanation_executor = ThreadPoolExecutor(
+    max_workers=EXPLANATION_WORKERS, thread_name_prefix='explain'
+)
+
+# Every Gemini call runs against a deadline (see _guarded_call): the SDK
+# request timeout is the time left, and the caller stops waiting when it
+# passes. After GEMINI_BREAKER_FAILURES consecutive failures or timeouts the
+# circuit opens and parses and explanations go straight to their local
+# fallbacks; one probe call is let through every GEMINI_BREAKER_RESET_SECONDS.
+gemini_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('GEMINI_BREAKER_FAILURES', 5)),
+    reset_timeout=float(os.getenv('GEMINI_BREAKER_RESET_SECONDS', 30))
+)
+register_breaker('gemini', gemini_breaker)
+# Send one duplicate of a call that fails or is still unanswered after this
+# many seconds, while time is left (0 disables hedging)
+GEMINI_HEDGE_AFTER = float(os.getenv('GEMINI_HEDGE_AFTER', 0))
+_gemini_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('GEMINI_WORKERS', 16)), thread_name_prefix='gemini'
+)
+
+def normalize_query(user_input):
+    """
+    Normalize query text for cache lookups
+    Case, whitespace and punctuation differences map to the same key,
+    while slope symbols like "<" and "°" are kept
+    """
+    text = user_input.lower().replace('-', ' ')
+    text = re.sub(r'[^\w\s<>≤°.]', ' ', text)
+    text = re.sub(r'\.(?!\d)', ' ', text)
+    return ' '.join(text.split())
 
 def parse_user_query_regex(user_input):
     """
-    Fallback regex-based parser when Gemini API fails
+    Regex-based parser (see query_parser.py), used when Gemini is skipped or fails
     Extracts state names and basic parameters from query
     """
-    # List of all US states
-    states = [
-        'Arizona', 'Nevada', 'New Mexico', 'Utah',
-        'California', 'Oregon', 'Washington',
-        'Colorado', 'Wyoming', 'Montana',
-        'Texas', 'Oklahoma', 'Kansas',
-        'Florida', 'Georgia', 'North Carolina', 'South Carolina',
-        'New York', 'New Jersey', 'Pennsylvania', 'Massachusetts',
-        'Illinois', 'Iowa', 'Wisconsin', 'Minnesota'
-    ]
-
-    # Find state in query (case insensitive)
-    region = 'Arizona'  # default
-    for state in states:
-        if re.search(r'\b' + state + r'\b', user_input, re.IGNORECASE):
-            region = state
-            break
-
-    # Extract acreage if mentioned
-    acreage = 50  # default
-    acreage_match = re.search(r'(\d+)[\s-]*(acre|acres|ac)', user_input, re.IGNORECASE)
-    if acreage_match:
-        acreage = int(acreage_match.group(1))
-
-    # Extract slope constraints (e.g., "<5 degrees", "< 5°", "under 3 degree")
-    max_slope = None
-    slope_match = re.search(r'[<≤]?\s*(\d+)[\s°]*(?:degree|deg|slope)', user_input, re.IGNORECASE)
-    if slope_match:
-        max_slope = float(slope_match.group(1))
-
-    # Detect energy type
-    energy_type = 'solar'  # default
-    if re.search(r'\b(wind|wind farm)\b', user_input, re.IGNORECASE):
-        energy_type = 'wind'
-
-    # Extract priorities
-    priorities = []
-    if re.search(r'\b(flat|level|gentle)\b', user_input, re.IGNORECASE):
-        priorities.append('flat terrain')
-        if max_slope is None:
-            max_slope = 3.0  # Implicit constraint for "flat"
-    if re.search(r'\b(grid|transmission|power line)\b', user_input, re.IGNORECASE):
-        priorities.append('near grid')
-    if re.search(r'\b(sun|solar|irradiance)\b', user_input, re.IGNORECASE):
-        priorities.append('high irradiance')
-
-    print(f"[REGEX PARSER] Extracted: region={region}, acreage={acreage}, max_slope={max_slope}, type={energy_type}")
+    parsed, details = extract_query(user_input)
+    print(f"[REGEX PARSER] Extracted: region={parsed['region']}, num_sites={parsed['num_sites']}, "
+          f"acreage={parsed['acreage']}, max_slope={parsed['max_slope']}, type={parsed['energy_type']}, "
+          f"confidence={parsed['confidence']}, unparsed={details['unparsed']}")
+    return parsed
+
+@contextmanager
+def _gemini_call(kind):
+    """Record the latency and outcome of the Gemini call made inside the block"""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    except Exception as e:
+        if _is_timeout(e):
+            outcome = 'timeout'
+        raise
+    finally:
+        GEMINI_CALL_SECONDS.observe(time.perf_counter() - started, kind=kind, outcome=outcome)
+        GEMINI_CALLS.inc(kind=kind, outcome=outcome)
+
+def _is_timeout(error):
+    # google.api_core's DeadlineExceeded is raised when the SDK timeout passes
+    return isinstance(error, TimeoutError) or type(error).__name__ == 'DeadlineExceeded'
+
+def _fallback_reason(error):
+    """The gridsight_fallbacks_total reason for a failed Gemini call"""
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    return 'timeout' if _is_timeout(error) else 'error'
+
+def _deadline(timeout, deadline=None):
+    """time.monotonic() deadline timeout seconds from now, or the caller's deadline if sooner"""
+    own = time.monotonic() + timeout
+    return own if deadline is None else min(own, deadline)
+
+def _request_options(timeout):
+    return {'timeout': timeout} if timeout else None
+
+def _check_circuit(kind, deadline):
+    """Refuse a call that cannot succeed before it uses any of the deadline"""
+    # A missing key is a known failure; it is not counted against the breaker
+    if not gemini_configured():
+        raise CircuitOpenError('GEMINI_API_KEY is not set')
+    if deadline <= time.monotonic():
+        raise TimeoutError(f'No time left for the Gemini {kind} call')
+    if not gemini_breaker.allow():
+        raise CircuitOpenError('Gemini circuit is open')
+
+def _guarded_call(kind, call, deadline):
+    """
+    Run call(timeout) on _gemini_executor, waiting at most until deadline
 
-    return {
-        "energy_type": energy_type,
-        "region": region,
-        "acreage": acreage,
-        "max_slope": max_slope,
-        "priorities": priorities,
-        "constraints": [],
-        "confidence": 0.8  # Good confidence from regex
-    }
+    Raises CircuitOpenError without calling while gemini_breaker is open
+    or no API key is set, and TimeoutError when the deadline passes first;
+    an abandoned call ends on its own SDK timeout. The outcome is recorded
+    on gemini_breaker.
+    """
+    _check_circuit(kind, deadline)
+    with _gemini_call(kind):
+        try:
+            result = _hedged(kind, call, deadline)
+        except Exception:
+            gemini_breaker.record_failure()
+            raise
+    gemini_breaker.record_success()
+    return result
+
+def _hedged(kind, call, deadline):
+    """First successful result of call and, with GEMINI_HEDGE_AFTER set, one duplicate"""
+    futures = [_gemini_executor.submit(call, deadline - time.monotonic())]
+    hedge_at = time.monotonic() + GEMINI_HEDGE_AFTER if GEMINI_HEDGE_AFTER > 0 else None
+    error = None
+    try:
+        while futures or hedge_at is not None:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if hedge_at is not None and (not futures or now >= hedge_at):
+                hedge_at = None
+                print(f"[GEMINI] Sending a hedged {kind} call")
+                GEMINI_HEDGES.inc(kind=kind)
+                futures.append(_gemini_executor.submit(call, deadline - now))
+                continue
+            wait_until = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, _ = wait(futures, timeout=wait_until - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.remove(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+    finally:
+        for future in futures:
+            future.cancel()
+    if error is not None and not futures:
+        raise error
+    raise TimeoutError(f'Gemini {kind} call did not finish in time')
+
+async def _guarded_call_async(kind, call, deadline):
+    """_guarded_call() for coroutine calls, which are cancelled at the deadline"""
+    _check_circuit(kind, deadline)
+    with _gemini_call(kind):
+        try:
+            result = await _hedged_async(kind, call, deadline)
+        except BaseException:
+            # Including cancellation by a caller whose own deadline passed
+            gemini_breaker.record_failure()
+            raise
+    gemini_breaker.record_success()
+    return result
+
+async def _hedged_async(kind, call, deadline):
+    tasks = {asyncio.ensure_future(call(deadline - time.monotonic()))}
+    hedge_at = time.monotonic() + GEMINI_HEDGE_AFTER if GEMINI_HEDGE_AFTER > 0 else None
+    error = None
+    try:
+        while tasks or hedge_at is not None:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if hedge_at is not None and (not tasks or now >= hedge_at):
+                hedge_at = None
+                print(f"[GEMINI] Sending a hedged {kind} call")
+                GEMINI_HEDGES.inc(kind=kind)
+                tasks.add(asyncio.ensure_future(call(deadline - now)))
+                continue
+            wait_until = deadline if hedge_at is None else min(deadline, hedge_at)
+            done, tasks = await asyncio.wait(tasks, timeout=wait_until - now,
+                                             return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    return task.result()
+                except Exception as e:
+                    error = e
+    finally:
+        for task in tasks:
+            task.cancel()
+    if error is not None and not tasks:
+        raise error
+    raise TimeoutError(f'Gemini {kind} call did not finish in time')
+
+def _cached_parse(key):
+    """(parsed, tier) from parse_cache; a stored regex fallback still answers as 'fallback'"""
+    cached = parse_cache.get(key)
+    if cached is None:
+        return None, None
+    print(f"[CACHE] Parse cache hit ({cached['source']}): {key}")
+    return dict(cached['parsed']), 'cache' if cached['source'] == 'gemini' else 'fallback'
+
+
+def _regex_fallback_parse(local, error):
+    print(f"[WARNING] Error parsing query with Gemini: {error}")
+    print("[FALLBACK] Using regex-based parser instead")
+    FALLBACKS.inc(kind='parse', reason=_fallback_reason(error))
+    return local
+
+def _store_parse(key, parsed, source):
+    ttl = PARSE_CACHE_TTL if source == 'gemini' else PARSE_CACHE_FALLBACK_TTL
+    parse_cache.set(key, {'parsed': parsed, 'source': source}, ttl=ttl)
+    return dict(parsed)
+
+def _answered(parsed, tier, started):
+    """Tag a parse with the tier that produced it and record the tier's latency"""
+    QUERY_PARSES.inc(tier=tier)
+    QUERY_PARSE_SECONDS.observe(time.perf_counter() - started, tier=tier)
+    return {**parsed, 'parsed_by': tier}
+
+def _local_parse(user_input):
+    """The regex parse, and whether it is confident enough to skip Gemini"""
+    local = parse_user_query_regex(user_input)
+    return local, local['confidence'] >= LOCAL_PARSE_MIN_CONFIDENCE
+
+def parse_user_query(user_input, deadline=None):
+    """
+    Parse natural language query into structured parameters, cheapest tier first
+
+    1. 'local': the regex parser, when it is confident of every field
+       (LOCAL_PARSE_MIN_CONFIDENCE)
+    2. 'cache': parse_cache, when the normalized query was seen before
+       ('fallback' when Gemini failed for it then)
+    3. 'gemini': Gemini, or 'fallback' (the regex parse) if Gemini fails,
+       times out or its circuit is open
+
+    Gemini gets PARSE_TIMEOUT seconds, or less when the request's own
+    deadline (a time.monotonic() value) comes sooner. The answering tier is
+    returned as parsed_by and counted in gridsight_query_parses_total.
+    """
+    started = time.perf_counter()
+    local, confident = _local_parse(user_input)
+    if confident:
+        return _answered(local, 'local', started)
+
+    key = normalize_query(user_input)
+    cached, tier = _cached_parse(key)
+    if cached is not None:
+        return _answered(cached, tier, started)
+
+    try:
+        parsed = _guarded_call(
+            'parse', lambda timeout: parse_user_query_gemini(user_input, timeout=timeout),
+            _deadline(PARSE_TIMEOUT, deadline)
+        )
+        source, tier = 'gemini', 'gemini'
+    except Exception as e:
+        parsed, source, tier = _regex_fallback_parse(local, e), 'regex', 'fallback'
 
-def parse_user_query(user_input):
+    return _answered(_store_parse(key, parsed, source), tier, started)
+
+async def parse_user_query_async(user_input, deadline=None):
+    """
+    parse_user_query() using the async Gemini client
+
+    parse_cache may be SQLite-backed, so it is read and written in a worker
+    thread rather than on the event loop.
+    """
+    started = time.perf_counter()
+    local, confident = _local_parse(user_input)
+    if confident:
+        return _answered(local, 'local', started)
+
+    key = normalize_query(user_input)
+    cached, tier = await asyncio.to_thread(_cached_parse, key)
+    if cached is not None:
+        return _answered(cached, tier, started)
+
+    try:
+        parsed = await _guarded_call_async(
+            'parse', lambda timeout: parse_user_query_gemini_async(user_input, timeout=timeout),
+            _deadline(PARSE_TIMEOUT, deadline)
+        )
+        source, tier = 'gemini', 'gemini'
+    except Exception as e:
+        parsed, source, tier = _regex_fallback_parse(local, e), 'regex', 'fallback'
+
+    return _answered(await asyncio.to_thread(_store_parse, key, parsed, source), tier, started)
+
+# Lower temperature for more consistent JSON
+PARSE_GENERATION_CONFIG = {
+    'temperature': 0.3,
+    'max_output_tokens': 150,
+}
+
+def parse_user_query_gemini(user_input, timeout=None):
     """
     Parse natural language query into structured parameters using Gemini
-    Falls back to regex parser if Gemini fails
+    Raises on any Gemini or JSON error, or when timeout seconds pass
     """
+    response = _configured_model().generate_content(_parse_prompt(user_input), generation_config=PARSE_GENERATION_CONFIG,
+                                             request_options=_request_options(timeout))
+    return _read_parse_response(response)
+
+async def parse_user_query_gemini_async(user_input, timeout=None):
+    """parse_user_query_gemini() without blocking the event loop"""
+    model = await _configured_model_async()
+    response = await model.generate_content_async(_parse_prompt(user_input), generation_config=PARSE_GENERATION_CONFIG,
+                                                  request_options=_request_options(timeout))
+    return _read_parse_response(response)
+
+def _parse_prompt(user_input):
+    region_groups = ', '.join(f'"{group}"' for group in REGION_GROUPS)
     prompt = f"""
 You are an expert renewable energy site analyst. Parse this user query into structured JSON.
 
@@ -98,7 +432,8 @@ User Query: "{user_input}"
 Extract and return ONLY valid JSON (no markdown, no explanation) with these fields:
 {{
   "energy_type": "solar" | "wind" | "hydro" | "geothermal",
-  "region": "specific US state name",
+  "region": "specific US state name, or a region group, or null",
+  "num_sites": number or null (how many sites were asked for, e.g., 20 for "best 20 sites"),
   "acreage": number (default 50 if not mentioned),
   "max_slope": number or null (maximum slope in degrees, e.g., 5 for "<5 degrees"),
   "priorities": ["list", "of", "user", "priorities"],
@@ -108,62 +443,297 @@ Extract and return ONLY valid JSON (no markdown, no explanation) with these fiel
 
 Rules:
 - If energy type not mentioned, assume "solar"
-- If region not mentioned, use "Arizona" as default
+- If region not mentioned, use null
+- If the query names a place that is not a US state or region group, return that name as written
+- Region groups: {region_groups}; use "All" for "anywhere", "nationwide" or "all states"
 - Extract max_slope from phrases like "<5 degrees", "under 3° slope", "flat terrain" (flat = 3)
 - Extract priorities like "high irradiance", "flat terrain", "near grid", "avoid protected areas"
 - Be intelligent about synonyms (e.g., "sun exposure" = "irradiance", "level ground" = "flat terrain")
 
 Examples:
 Input: "Find me a large solar site in Texas with good sun"
-Output: {{"energy_type": "solar", "region": "Texas", "acreage": 100, "max_slope": null, "priorities": ["high irradiance"], "constraints": [], "confidence": 0.9}}
+Output: {{"energy_type": "solar", "region": "Texas", "num_sites": null, "acreage": 100, "max_slope": null, "priorities": ["high irradiance"], "constraints": [], "confidence": 0.9}}
 
 Input: "50-acre solar site in Arizona, flat terrain"
-Output: {{"energy_type": "solar", "region": "Arizona", "acreage": 50, "max_slope": 3, "priorities": ["flat terrain"], "constraints": [], "confidence": 0.95}}
+Output: {{"energy_type": "solar", "region": "Arizona", "num_sites": null, "acreage": 50, "max_slope": 3, "priorities": ["flat terrain"], "constraints": [], "confidence": 0.95}}
 
 Input: "Solar installation in California, <5° slope"
-Output: {{"energy_type": "solar", "region": "California", "acreage": 50, "max_slope": 5, "priorities": [], "constraints": [], "confidence": 0.9}}
+Output: {{"energy_type": "solar", "region": "California", "num_sites": null, "acreage": 50, "max_slope": 5, "priorities": [], "constraints": [], "confidence": 0.9}}
 """
+    return prompt
+
+def _read_parse_response(response):
+    """Parsed JSON from a Gemini parse response; raises if it was blocked or empty"""
+    # Check if response has candidates and parts
+    if not response or not response.candidates:
+        print("[WARNING] No candidates in Gemini response - possibly blocked by safety filters")
+        raise ValueError("No candidates in response")
+
+    if not response.candidates[0].content.parts:
+        print("[WARNING] No parts in response - possibly blocked")
+        raise ValueError("No parts in response")
+
+    # Now safe to access text
+    response_text = response.text.strip()
+
+    if not response_text:
+        print("[WARNING] Empty text in Gemini response")
+        raise ValueError("Empty response text")
+
+    response_text = response_text.replace('```json', '').replace('```', '').strip()
+
+    parsed = json.loads(response_text)
+    print(f"[API] Successfully parsed query: {parsed}")
+    return parsed
+
+def explanation_cache_key(site_data, rank, context=""):
+    """
+    Stable content hash of everything that goes into an explanation prompt
+    Coordinates and metrics are rounded so float noise maps to the same key
+    """
+    metrics = {
+        name: round(value, 2) if isinstance(value, float) else value
+        for name, value in sorted(site_data.get('metrics', {}).items())
+    }
+    payload = {
+        'lat': round(float(site_data['coordinates']['lat']), 5),
+        'lon': round(float(site_data['coordinates']['lon']), 5),
+        'score': round(float(site_data['score']), 1),
+        'metrics': metrics,
+        'rank': rank,
+        'context': context.strip(),
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+def generate_site_explanation(site_data, rank, context="", use_cache=True, deadline=None):
+    """
+    Generate natural language explanation for why a site scored well
+    Served from explanation_cache when the same site was explained before;
+    pass use_cache=False to ask Gemini for a fresh wording. Gemini gets
+    EXPLANATION_TIMEOUT seconds or until deadline, whichever is sooner.
+    """
+    key = explanation_cache_key(site_data, rank, context)
+    if use_cache:
+        cached = explanation_cache.get(key)
+        if cached is not None:
+            print(f"[CACHE] Explanation cache hit for site #{rank}")
+            return cached
 
     try:
-        # Set generation config for faster, more focused responses
-        generation_config = {
-            'temperature': 0.3,  # Lower temperature for more consistent JSON
-            'max_output_tokens': 150,
-        }
-        response = model.generate_content(prompt, generation_config=generation_config)
-
-        # Check if response has candidates and parts
-        if not response or not response.candidates:
-            print("[WARNING] No candidates in Gemini response - possibly blocked by safety filters")
-            raise ValueError("No candidates in response")
-
-        if not response.candidates[0].content.parts:
-            print("[WARNING] No parts in response - possibly blocked")
-            raise ValueError("No parts in response")
-
-        # Now safe to access text
-        response_text = response.text.strip()
-
-        if not response_text:
-            print("[WARNING] Empty text in Gemini response")
-            raise ValueError("Empty response text")
-
-        response_text = response_text.replace('```json', '').replace('```', '').strip()
-
-        parsed = json.loads(response_text)
-        print(f"[API] Successfully parsed query: {parsed}")
-        return parsed
+        explanation = _guarded_call(
+            'explanation', lambda timeout: generate_site_explanation_gemini(site_data, rank, context, timeout=timeout),
+            _deadline(EXPLANATION_TIMEOUT, deadline)
+        )
     except Exception as e:
-        print(f"[WARNING] Error parsing query with Gemini: {e}")
-        print("[FALLBACK] Using regex-based parser instead")
-        # Use regex fallback parser
-        return parse_user_query_regex(user_input)
+        return _error_explanation(site_data, rank, e)
+
+    # Only real Gemini output is cached, never the fallback text
+    explanation_cache.set(key, explanation)
+    return explanation
+
+async def generate_site_explanation_async(site_data, rank, context="", use_cache=True, deadline=None):
+    """generate_site_explanation() using the async Gemini client; the cache is used from a worker thread"""
+    key = explanation_cache_key(site_data, rank, context)
+    if use_cache:
+        cached = await asyncio.to_thread(explanation_cache.get, key)
+        if cached is not None:
+            print(f"[CACHE] Explanation cache hit for site #{rank}")
+            return cached
+
+    try:
+        explanation = await _guarded_call_async(
+            'explanation',
+            lambda timeout: generate_site_explanation_gemini_async(site_data, rank, context, timeout=timeout),
+            _deadline(EXPLANATION_TIMEOUT, deadline)
+        )
+    except Exception as e:
+        return _error_explanation(site_data, rank, e)
+
+    await asyncio.to_thread(explanation_cache.set, key, explanation)
+    return explanation
 
-def generate_site_explanation(site_data, rank, context=""):
+def _error_explanation(site_data, rank, error):
+    print(f"[WARNING] Error generating explanation for site #{rank}: {error}")
+    FALLBACKS.inc(kind='explanation', reason=_fallback_reason(error))
+    return fallback_site_explanation(site_data, rank)
+
+def fallback_site_explanation(site_data, rank):
+    """Explanation used when the Gemini call for a site fails"""
+    return f"This site ranks #{rank} with a score of {site_data['score']}/100. It offers {site_data['metrics']['solar_irradiance']} kWh/m²/day of solar irradiance with a gentle {site_data['metrics']['slope']}° slope, making it suitable for solar panel installation. Located {site_data['metrics']['grid_distance']} km from grid infrastructure, it presents a balanced opportunity for renewable energy development."
+
+def generate_site_explanations(sites, context="", deadline=None):
     """
-    Generate natural language explanation for why a site scored well
+    Explain several sites with one Gemini call (see generate_site_explanations_gemini)
+
+    The call has the same time limit as generate_site_explanation(). A
+    failed, timed-out or refused call gives every site the error fallback; entries missing from
+    or malformed in the response get the template explanation. Valid
+    entries are cached like single explanations. The cache is not read.
+
+    Returns:
+        Dict of rank -> explanation for every site
     """
-    prompt = f"""
+    if len(sites) == 1:
+        site = sites[0]
+        return {site['rank']: generate_site_explanation(site, site['rank'], context, use_cache=False,
+                                                        deadline=deadline)}
+    try:
+        entries = _guarded_call(
+            'explanation_batch', lambda timeout: generate_site_explanations_gemini(sites, context, timeout=timeout),
+            _deadline(EXPLANATION_TIMEOUT, deadline)
+        )
+    except Exception as e:
+        return {site['rank']: _error_explanation(site, site['rank'], e) for site in sites}
+    return _collect_explanations(sites, context, entries)
+
+async def generate_site_explanations_async(sites, context="", deadline=None):
+    """generate_site_explanations() using the async Gemini client"""
+    if len(sites) == 1:
+        site = sites[0]
+        return {site['rank']: await generate_site_explanation_async(site, site['rank'], context, use_cache=False,
+                                                                    deadline=deadline)}
+    try:
+        entries = await _guarded_call_async(
+            'explanation_batch',
+            lambda timeout: generate_site_explanations_gemini_async(sites, context, timeout=timeout),
+            _deadline(EXPLANATION_TIMEOUT, deadline)
+        )
+    except Exception as e:
+        return {site['rank']: _error_explanation(site, site['rank'], e) for site in sites}
+    return await asyncio.to_thread(_collect_explanations, sites, context, entries)
+
+def _collect_explanations(sites, context, entries):
+    """Match batch entries to sites by rank, caching the valid ones"""
+    texts = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        rank, text = entry.get('rank'), entry.get('explanation')
+        if isinstance(rank, int) and isinstance(text, str) and text.strip() and rank not in texts:
+            texts[rank] = text.strip()
+
+    explanations = {}
+    for site in sites:
+        rank = site['rank']
+        if rank in texts:
+            explanations[rank] = texts[rank]
+            explanation_cache.set(explanation_cache_key(site, rank, context), texts[rank])
+        else:
+            print(f"[WARNING] Batch response has no usable explanation for site #{rank}")
+            FALLBACKS.inc(kind='explanation', reason='malformed')
+            explanations[rank] = template_site_explanation(site)
+    return explanations
+
+# Limit output length for faster responses
+EXPLANATION_GENERATION_CONFIG = {
+    'temperature': 0.7,
+    'max_output_tokens': 200,
+}
+
+def generate_site_explanation_gemini(site_data, rank, context="", timeout=None):
+    """
+    Ask Gemini to explain why a site scored well
+    Raises on any Gemini error or empty response, or when timeout seconds pass
+    """
+    response = _configured_model().generate_content(
+        _explanation_prompt(site_data, rank, context),
+        generation_config=EXPLANATION_GENERATION_CONFIG,
+        request_options=_request_options(timeout)
+    )
+    return _read_explanation_response(response, rank)
+
+async def generate_site_explanation_gemini_async(site_data, rank, context="", timeout=None):
+    """generate_site_explanation_gemini() without blocking the event loop"""
+    model = await _configured_model_async()
+    response = await model.generate_content_async(
+        _explanation_prompt(site_data, rank, context),
+        generation_config=EXPLANATION_GENERATION_CONFIG,
+        request_options=_request_options(timeout)
+    )
+    return _read_explanation_response(response, rank)
+
+def _batch_generation_config(count):
+    return {
+        'temperature': EXPLANATION_GENERATION_CONFIG['temperature'],
+        'max_output_tokens': EXPLANATION_GENERATION_CONFIG['max_output_tokens'] * count + 50,
+        'response_mime_type': 'application/json',
+    }
+
+def generate_site_explanations_gemini(sites, context="", timeout=None):
+    """
+    Ask Gemini to explain several sites in one call
+    Returns the decoded JSON array of {"rank", "explanation"} entries;
+    raises on any Gemini error, empty response or invalid JSON, or when
+    timeout seconds pass
+    """
+    response = _configured_model().generate_content(
+        _batch_explanation_prompt(sites, context),
+        generation_config=_batch_generation_config(len(sites)),
+        request_options=_request_options(timeout)
+    )
+    return _read_explanation_batch(response, sites)
+
+async def generate_site_explanations_gemini_async(sites, context="", timeout=None):
+    """generate_site_explanations_gemini() without blocking the event loop"""
+    model = await _configured_model_async()
+    response = await model.generate_content_async(
+        _batch_explanation_prompt(sites, context),
+        generation_config=_batch_generation_config(len(sites)),
+        request_options=_request_options(timeout)
+    )
+    return _read_explanation_batch(response, sites)
+
+def _batch_explanation_prompt(sites, context):
+    lines = []
+    for site in sites:
+        m = site['metrics']
+        lines.append(
+            f"#{site['rank']}: score {site['score']}/100; "
+            f"solar irradiance {m['solar_irradiance']} kWh/m²/day (score {m['solar_irradiance_score']}); "
+            f"slope {m['slope']}° (score {m['slope_score']}); "
+            f"grid distance {m['grid_distance']} km (score {m['grid_distance_score']}); "
+            f"land cover {m['land_cover']} (score {m['land_cover_score']}); "
+            f"location {site['coordinates']['lat']:.4f}°N, {abs(site['coordinates']['lon']):.4f}°W"
+        )
+    site_lines = '\n'.join(lines)
+    return f"""
+You are explaining why each of these renewable energy sites is optimal for development.
+
+Context: {context}
+
+Sites (rank: metrics):
+{site_lines}
+
+For EACH site, write a compelling 3-4 sentence explanation covering:
+1. WHY this site scored high (cite specific impressive metrics with context)
+2. WHAT makes it practical for development (location advantages)
+3. ONE consideration or next step for developers
+
+Style guidelines:
+- Be specific with numbers ("6.8 kWh/m²/day" not "high irradiance")
+- Compare sites where it helps ("the flattest of the top sites")
+- Sound confident and professional, like a consultant
+- No bullet points, write in flowing prose
+
+Return ONLY a JSON array with one object per site, in the order above:
+[{{"rank": <rank number>, "explanation": "<explanation text>"}}]
+"""
+
+def _read_explanation_batch(response, sites):
+    """Entries of a batch explanation response; raises if it is not a JSON array"""
+    ranks = f"{sites[0]['rank']}-{sites[-1]['rank']}"
+    response_text = _read_explanation_response(response, ranks)
+    response_text = response_text.replace('```json', '').replace('```', '').strip()
+    entries = json.loads(response_text)
+    if isinstance(entries, dict):
+        entries = entries.get('explanations')
+    if not isinstance(entries, list):
+        raise ValueError("Batch response is not a JSON array")
+    return entries
+
+def _explanation_prompt(site_data, rank, context):
+    return f"""
 You are explaining why this renewable energy site is optimal for development.
 
 Site Ranking: #{rank}
@@ -193,30 +763,177 @@ Style guidelines:
 Generate ONLY the explanation text, no preamble.
 """
 
+def _read_explanation_response(response, rank):
+    """Explanation text from a Gemini response; raises if it was blocked or empty"""
+    # Check if response has candidates and parts before accessing text
+    if not response or not response.candidates:
+        print(f"[WARNING] No candidates in Gemini response for site #{rank}")
+        raise ValueError("No candidates in response")
+
+    if not response.candidates[0].content.parts:
+        print(f"[WARNING] No parts in response for site #{rank}")
+        raise ValueError("No parts in response")
+
+    response_text = response.text.strip()
+    if not response_text:
+        print(f"[WARNING] Empty text in Gemini response for site #{rank}")
+        raise ValueError("Empty response text")
+
+    return response_text
+
+def template_site_explanation(site_data):
+    """Template explanation used for sites without an AI explanation"""
+    return f"This site ranks #{site_data['rank']} with a score of {site_data['score']}/100. It offers {site_data['metrics']['solar_irradiance']} kWh/m²/day of solar irradiance with a {site_data['metrics']['slope']}° slope. Located {site_data['metrics']['grid_distance']} km from grid infrastructure on {site_data['metrics']['land_cover']} land."
+
+def is_fallback_explanation(site_data, explanation):
+    """Whether an explanation is template or error fallback text rather than Gemini's"""
+    return explanation in (template_site_explanation(site_data),
+                           fallback_site_explanation(site_data, site_data['rank']))
+
+def _batches(sites):
+    return [sites[i:i + EXPLANATION_BATCH_SIZE] for i in range(0, len(sites), EXPLANATION_BATCH_SIZE)]
+
+def _batch_label(batch):
+    return f"site #{batch[0]['rank']}" if len(batch) == 1 else f"sites #{batch[0]['rank']}-{batch[-1]['rank']}"
+
+def _rate_limited_explanations(batch, context, deadline):
+    """Wait for a rate-limit token, then explain a batch of sites with one call"""
+    # An open circuit or a missing key refuses the call without using a token
+    if gemini_configured() and gemini_breaker.state != OPEN and not gemini_rate_limiter.acquire(
+            timeout=max(0.0, deadline - time.monotonic())):
+        print(f"[WARNING] Rate limit wait exceeded timeout for {_batch_label(batch)}")
+        FALLBACKS.inc(kind='explanation', reason='rate_limit', amount=len(batch))
+        return {site['rank']: template_site_explanation(site) for site in batch}
+    # The cache was already checked before the call was queued
+    return generate_site_explanations(batch, context, deadline)
+
+def iter_site_explanations(sites, context="", max_ai_sites=None, timeout=None, use_cache=True, deadline=None):
+    """
+    Yield (site, explanation) for the top max_ai_sites as each one finishes
+
+    Cached explanations are yielded first without touching Gemini. The
+    remaining sites are explained EXPLANATION_BATCH_SIZE per Gemini call;
+    calls run concurrently on a bounded executor, paced by
+    gemini_rate_limiter. Sites whose call fails or does not finish within
+    timeout seconds, or by the request's deadline if sooner, yield the
+    template explanation instead.
+    """
+    max_ai_sites = AI_EXPLAINED_SITES if max_ai_sites is None else max_ai_sites
+    deadline = _deadline(EXPLANATION_TIMEOUT if timeout is None else timeout, deadline)
+
+    cached_sites = []
+    uncached = []
+    for site in sites[:max_ai_sites]:
+        if use_cache:
+            cached = explanation_cache.get(explanation_cache_key(site, site['rank'], context))
+            if cached is not None:
+                cached_sites.append((site, cached))
+                continue
+        uncached.append(site)
+
+    futures = {}
+    for batch in _batches(uncached):
+        print(f"[API] Generating explanation for {_batch_label(batch)}...")
+        future = _explanation_executor.submit(_rate_limited_explanations, batch, context, deadline)
+        futures[future] = batch
+
+    if cached_sites:
+        print(f"[CACHE] {len(cached_sites)} explanations served from cache")
+    yield from cached_sites
+
+    pending = set(futures)
     try:
-        # Set generation config for faster responses
-        generation_config = {
-            'temperature': 0.7,
-            'max_output_tokens': 200,  # Limit output length
-        }
-        response = model.generate_content(prompt, generation_config=generation_config)
-
-        # Check if response has candidates and parts before accessing text
-        if not response or not response.candidates:
-            print(f"[WARNING] No candidates in Gemini response for site #{rank}")
-            raise ValueError("No candidates in response")
-
-        if not response.candidates[0].content.parts:
-            print(f"[WARNING] No parts in response for site #{rank}")
-            raise ValueError("No parts in response")
-
-        response_text = response.text.strip()
-        if not response_text:
-            print(f"[WARNING] Empty text in Gemini response for site #{rank}")
-            raise ValueError("Empty response text")
-
-        return response_text
-    except Exception as e:
-        print(f"[WARNING] Error generating explanation for site #{rank}: {e}")
-        # Fallback explanation
-        return f"This site ranks #{rank} with a score of {site_data['score']}/100. It offers {site_data['metrics']['solar_irradiance']} kWh/m²/day of solar irradiance with a gentle {site_data['metrics']['slope']}° slope, making it suitable for solar panel installation. Located {site_data['metrics']['grid_distance']} km from grid infrastructure, it presents a balanced opportunity for renewable energy development."
+        for future in as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+            pending.discard(future)
+            batch = futures[future]
+            try:
+                explanations = future.result()
+            except Exception as e:
+                print(f"[WARNING] Explanation for {_batch_label(batch)} failed: {e!r}")
+                FALLBACKS.inc(kind='explanation', reason='error', amount=len(batch))
+                explanations = {site['rank']: template_site_explanation(site) for site in batch}
+            for site in batch:
+                yield site, explanations[site['rank']]
+    except FuturesTimeoutError:
+        for future in pending:
+            future.cancel()
+            batch = futures[future]
+            print(f"[WARNING] Explanation for {_batch_label(batch)} timed out")
+            FALLBACKS.inc(kind='explanation', reason='timeout', amount=len(batch))
+            for site in batch:
+                yield site, template_site_explanation(site)
+
+def explain_sites(sites, context="", max_ai_sites=None, timeout=None, use_cache=True, deadline=None):
+    """
+    Add an 'explanation' to every site in place
+
+    The top max_ai_sites get Gemini explanations (see iter_site_explanations);
+    the rest use the template.
+    """
+    for site in sites:
+        site['explanation'] = template_site_explanation(site)
+
+    for site, explanation in iter_site_explanations(sites, context, max_ai_sites, timeout, use_cache, deadline):
+        site['explanation'] = explanation
+
+    return sites
+
+async def explain_sites_async(sites, context="", max_ai_sites=None, timeout=None, use_cache=True, deadline=None):
+    """
+    explain_sites() for the ASGI app: Gemini calls are coroutines on the
+    event loop rather than threads, paced by the same gemini_rate_limiter
+    """
+    max_ai_sites = AI_EXPLAINED_SITES if max_ai_sites is None else max_ai_sites
+    deadline = _deadline(EXPLANATION_TIMEOUT if timeout is None else timeout, deadline)
+
+    for site in sites:
+        site['explanation'] = template_site_explanation(site)
+
+    async def explain(batch):
+        if gemini_configured() and gemini_breaker.state != OPEN and not await gemini_rate_limiter.acquire_async(
+                timeout=max(0.0, deadline - time.monotonic())):
+            print(f"[WARNING] Rate limit wait exceeded timeout for {_batch_label(batch)}")
+            FALLBACKS.inc(kind='explanation', reason='rate_limit', amount=len(batch))
+            return {site['rank']: site['explanation'] for site in batch}
+        # The cache was already checked before the call was started
+        return await generate_site_explanations_async(batch, context, deadline)
+
+    def cached_explanations():
+        uncached = []
+        for site in sites[:max_ai_sites]:
+            if use_cache:
+                cached = explanation_cache.get(explanation_cache_key(site, site['rank'], context))
+                if cached is not None:
+                    site['explanation'] = cached
+                    continue
+            uncached.append(site)
+        return uncached
+
+    # explanation_cache may be SQLite-backed; keep its reads off the event loop
+    uncached = await asyncio.to_thread(cached_explanations)
+
+    tasks = {}
+    for batch in _batches(uncached):
+        print(f"[API] Generating explanation for {_batch_label(batch)}...")
+        tasks[asyncio.ensure_future(explain(batch))] = batch
+
+    if not tasks:
+        return sites
+
+    done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+    for task in done:
+        batch = tasks[task]
+        try:
+            explanations = task.result()
+        except Exception as e:
+            print(f"[WARNING] Explanation for {_batch_label(batch)} failed: {e!r}")
+            FALLBACKS.inc(kind='explanation', reason='error', amount=len(batch))
+            continue
+        for site in batch:
+            site['explanation'] = explanations[site['rank']]
+    for task in pending:
+        task.cancel()
+        print(f"[WARNING] Explanation for {_batch_label(tasks[task])} timed out")
+        FALLBACKS.inc(kind='explanation', reason='timeout', amount=len(tasks[task]))
+
+    return sites
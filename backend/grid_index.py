@@ -0,0 +1,206 @@
+"""Nearest transmission-line distance from a local spatial index
+
+Transmission lines are loaded from a GeoJSON file of LineString /
+MultiLineString features and split into short pieces. Piece midpoints go
+into a KD-tree (on unit-sphere coordinates, so distances hold at every
+latitude), and a batch of candidate points is answered with one tree
+query plus an exact point-to-segment check on the nearest pieces.
+
+Write a small synthetic stand-in file for tests and offline runs with:
+
+    python grid_index.py build-sample --out data/transmission_lines_sample.geojson
+"""
+import argparse
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+MAX_PIECE_KM = 5.0      # longer segments are split so the tree stays tight
+NEIGHBOURS = 8          # pieces checked exactly per query point
+SAMPLE_LINES_PATH = os.path.join(os.path.dirname(__file__), 'data', 'transmission_lines_sample.geojson')
+
+
+def _to_unit_vectors(lats, lons):
+    """Convert degrees to 3-D unit vectors"""
+    lat = np.radians(lats)
+    lon = np.radians(lons)
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def _point_segment_distance(points, starts, ends):
+    """Distance from each point to its paired segment (row-wise, same units)"""
+    direction = ends - starts
+    length_sq = np.einsum('ij,ij->i', direction, direction)
+    t = np.einsum('ij,ij->i', points - starts, direction) / np.where(length_sq > 0, length_sq, 1)
+    t = np.clip(t, 0.0, 1.0)
+    closest = starts + direction * t[:, None]
+    return np.linalg.norm(points - closest, axis=1)
+
+
+def _read_segments(path):
+    """Read (lon, lat) line segments from a GeoJSON FeatureCollection"""
+    with open(path) as f:
+        collection = json.load(f)
+
+    starts, ends = [], []
+    for feature in collection['features']:
+        geometry = feature['geometry']
+        if geometry['type'] == 'LineString':
+            lines = [geometry['coordinates']]
+        elif geometry['type'] == 'MultiLineString':
+            lines = geometry['coordinates']
+        else:
+            continue
+        for line in lines:
+            coords = np.asarray(line, dtype=np.float64)[:, :2]
+            starts.append(coords[:-1])
+            ends.append(coords[1:])
+
+    return np.concatenate(starts), np.concatenate(ends)
+
+
+class TransmissionIndex:
+    """KD-tree over transmission line pieces answering nearest-line distance"""
+
+    def __init__(self, starts_lonlat, ends_lonlat):
+        from scipy.spatial import cKDTree
+
+        starts = _to_unit_vectors(starts_lonlat[:, 1], starts_lonlat[:, 0])
+        ends = _to_unit_vectors(ends_lonlat[:, 1], ends_lonlat[:, 0])
+
+        # Split long segments into pieces no longer than MAX_PIECE_KM
+        lengths_km = np.linalg.norm(ends - starts, axis=1) * EARTH_RADIUS_KM
+        pieces = np.maximum(1, np.ceil(lengths_km / MAX_PIECE_KM).astype(int))
+        segment = np.repeat(np.arange(len(starts)), pieces)
+        first = np.repeat(np.cumsum(pieces) - pieces, pieces)
+        step = np.arange(len(segment)) - first
+        t0 = (step / pieces[segment])[:, None]
+        t1 = ((step + 1) / pieces[segment])[:, None]
+        direction = ends[segment] - starts[segment]
+        self.starts = starts[segment] + direction * t0
+        self.ends = starts[segment] + direction * t1
+
+        self.midpoints = (self.starts + self.ends) / 2
+        self.max_half_length = float(np.max(np.linalg.norm(self.ends - self.starts, axis=1)) / 2)
+        self.tree = cKDTree(self.midpoints)
+        print(f"[GRID] Indexed {len(starts)} line segments as {len(self.starts)} pieces")
+
+    @classmethod
+    def from_geojson(cls, path):
+        starts, ends = _read_segments(path)
+        return cls(starts, ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def nearest_distance_km(self, lats, lons):
+        """
+        Distance in km from each point to the nearest transmission line
+
+        Args:
+            lats, lons: Coordinate arrays of equal length
+
+        Returns:
+            Float array of distances
+        """
+        points = _to_unit_vectors(np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+        if len(points) == 0:
+            return np.empty(0)
+
+        best = np.full(len(points), np.inf)
+        pending = np.arange(len(points))
+        k = NEIGHBOURS
+        while len(pending):
+            k = min(k, len(self.starts))
+            mid_dist, idx = self.tree.query(points[pending], k=k)
+            mid_dist = mid_dist.reshape(len(pending), k)
+            idx = idx.reshape(len(pending), k)
+
+            # Exact distance to each candidate piece, keep the closest
+            rows = np.repeat(pending, k)
+            flat = idx.ravel()
+            exact = _point_segment_distance(points[rows], self.starts[flat], self.ends[flat])
+            best[pending] = exact.reshape(-1, k).min(axis=1)
+
+            # A piece outside the k nearest midpoints can only be closer if its
+            # midpoint lies within best + max_half_length; widen k for those
+            if k == len(self.starts):
+                break
+            pending = pending[mid_dist[:, -1] - self.max_half_length < best[pending]]
+            k *= 4
+
+        return best * EARTH_RADIUS_KM
+
+
+@lru_cache(maxsize=None)
+def _load_index(path):
+    return TransmissionIndex.from_geojson(path)
+
+
+def get_transmission_index(path=None):
+    """
+    Return the shared TransmissionIndex for TRANSMISSION_LINES_PATH, or None if not set up
+
+    The index is built once per process on first use.
+    """
+    path = path or os.getenv('TRANSMISSION_LINES_PATH')
+    if not path or not os.path.exists(path):
+        return None
+    return _load_index(os.path.abspath(path))
+
+
+def build_sample_lines(path, num_lines=300, seed=7, bounds=(-124.0, 25.0, -67.0, 49.0)):
+    """
+    Write a deterministic synthetic transmission network as GeoJSON
+
+    Each line is a random walk of 10-40 vertices with 5-25 km steps,
+    starting from a random point inside bounds.
+    """
+    rng = np.random.default_rng(seed)
+    west, south, east, north = bounds
+    features = []
+    for line_id in range(num_lines):
+        vertices = rng.integers(10, 41)
+        heading = rng.uniform(0, 2 * np.pi)
+        lat = rng.uniform(south, north)
+        lon = rng.uniform(west, east)
+        coords = [[round(lon, 4), round(lat, 4)]]
+        for _ in range(vertices - 1):
+            heading += rng.normal(0, 0.3)
+            step_km = rng.uniform(5, 25)
+            lat = float(np.clip(lat + step_km * np.sin(heading) / 110.57, south, north))
+            lon = float(np.clip(lon + step_km * np.cos(heading) / (111.32 * np.cos(np.radians(lat))), west, east))
+            coords.append([round(lon, 4), round(lat, 4)])
+        features.append({
+            'type': 'Feature',
+            'properties': {'id': line_id, 'voltage_kv': int(rng.choice([69, 115, 230, 345, 500]))},
+            'geometry': {'type': 'LineString', 'coordinates': coords},
+        })
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f, separators=(',', ':'))
+    print(f"[GRID] Wrote {num_lines} synthetic transmission lines to {path}")
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the transmission line index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sample = subparsers.add_parser('build-sample', help='Write a synthetic stand-in GeoJSON')
+    sample.add_argument('--out', default=SAMPLE_LINES_PATH)
+    sample.add_argument('--lines', type=int, default=300)
+    sample.add_argument('--seed', type=int, default=7)
+
+    args = parser.parse_args(argv)
+    if args.command == 'build-sample':
+        build_sample_lines(args.out, num_lines=args.lines, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
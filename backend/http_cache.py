@@ -0,0 +1,105 @@
+"""
+HTTP caching and compression shared by the Flask and ASGI apps
+
+Cache-Control comes from a per-endpoint policy table. Cacheable GET
+responses carry an ETag and are answered with 304 while the client's copy
+is current. Finished analyses are stored with the ETag of their body (see
+response_entry and analysis_store.result_cache), so a repeated request can
+be answered with 304 without running the pipeline again. Bodies of at
+least COMPRESS_MIN_BYTES are sent with brotli (when the brotli package is
+installed) or gzip, whichever the client accepts.
+"""
+import gzip
+import hashlib
+import os
+import time
+from email.utils import formatdate
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', 5))
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+# Keyed by route rule; anything not listed must not be stored
+CACHE_CONTROL = {
+    '/api/datasets': 'public, max-age=3600',
+    '/api/analyze': 'private, no-cache',
+    '/api/analyses/<analysis_id>': 'private, no-cache',
+    '/api/jobs/<job_id>': 'private, no-cache',
+    '/api/analyze/stream': 'no-cache',
+}
+DEFAULT_CACHE_CONTROL = 'no-store'
+
+
+def cache_control_for(rule):
+    return CACHE_CONTROL.get(rule, DEFAULT_CACHE_CONTROL)
+
+
+def etag_for(body):
+    """Strong ETag value (unquoted) for a response body"""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header value against an ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' or None for an Accept-Encoding header value"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        token, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', accepted.get('*', 0)) > 0:
+        return 'gzip'
+    return None
+
+
+def compressible(mimetype, size):
+    return size >= COMPRESS_MIN_BYTES and (mimetype or '').startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def response_entry(body):
+    """Cacheable record of a serialized response: ETag, body text and Last-Modified"""
+    return {
+        'etag': etag_for(body),
+        'body': body.decode('utf-8'),
+        'last_modified': int(time.time()),
+    }
@@ -0,0 +1,89 @@
+"""Asynchronous analysis jobs
+
+Long analyses are submitted to a bounded local worker pool instead of
+running inside the request. Job status and results are kept in a SQLite
+result store with expiry, so any gunicorn worker can answer a status
+poll for a job started by another. With JOB_STORE_PATH set to '' jobs are
+kept in this process' memory only.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from caching import SQLiteCache, TTLCache
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_QUEUE_LIMIT = int(os.getenv('JOB_QUEUE_LIMIT', 32))
+JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 3600))
+_job_store_path = os.getenv('JOB_STORE_PATH', os.path.join(os.path.dirname(__file__), 'data', 'jobs.sqlite3'))
+
+
+class JobQueueFull(Exception):
+    """Raised when the worker pool already has JOB_QUEUE_LIMIT jobs in flight"""
+
+
+class JobRunner:
+    """Runs job functions on a bounded thread pool and records their state"""
+
+    def __init__(self, store, max_workers=JOB_WORKERS, queue_limit=JOB_QUEUE_LIMIT,
+                 result_ttl=JOB_RESULT_TTL):
+        self.store = store
+        self.queue_limit = queue_limit
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _record(self, job_id, **fields):
+        job = self.store.get(job_id) or {'job_id': job_id}
+        job.update(fields)
+        self.store.set(job_id, job, ttl=self.result_ttl)
+        return job
+
+    def submit(self, kind, fn, *args):
+        """
+        Queue fn(*args) as a new job
+
+        Returns:
+            The initial job record (status 'queued')
+        """
+        with self._lock:
+            if self._in_flight >= self.queue_limit:
+                raise JobQueueFull(f"{self._in_flight} jobs already in flight")
+            self._in_flight += 1
+
+        job_id = uuid.uuid4().hex
+        job = self._record(job_id, kind=kind, status='queued', created_at=time.time())
+        self._executor.submit(self._run, job_id, fn, args)
+        return job
+
+    def _run(self, job_id, fn, args):
+        try:
+            self._record(job_id, status='running', started_at=time.time())
+            result = fn(*args)
+            self._record(job_id, status='succeeded', finished_at=time.time(), result=result)
+        except Exception as e:
+            print(f"[JOBS] Job {job_id} failed: {e}")
+            self._record(job_id, status='failed', finished_at=time.time(), error=str(e))
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def get(self, job_id):
+        """Return the job record, or None if unknown or expired"""
+        return self.store.get(job_id)
+
+    def stats(self):
+        return {
+            'in_flight': self._in_flight,
+            'queue_limit': self.queue_limit,
+            'store': self.store.stats(),
+        }
+
+
+job_runner = JobRunner(
+    SQLiteCache(_job_store_path, table='jobs', default_ttl=JOB_RESULT_TTL) if _job_store_path
+    else TTLCache(max_entries=10000, default_ttl=JOB_RESULT_TTL)
+)
@@ -0,0 +1,228 @@
+"""Rasterized land-validity bitmasks per state
+
+Each supported state gets a boolean raster over its bounding box, packed
+8 cells per byte with np.packbits. Masks are built once, saved to a
+compressed .npz file and loaded once per process. Checking a batch of
+points is a single vectorized index lookup into the packed bytes.
+
+Build the mask file with:
+
+    python landmask.py build --out data/landmask.npz
+
+By default coastal states are rasterized from the coarse outlines in
+COASTAL_STATE_OUTLINES. Pass --geojson with a state boundary
+FeatureCollection (e.g. Census cartographic boundaries, NAME property)
+for exact shapes.
+"""
+import argparse
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from utils import STATE_BOUNDARIES
+
+MASK_RESOLUTION = 0.01  # degrees (~1 km)
+DEFAULT_MASK_PATH = os.path.join(os.path.dirname(__file__), 'data', 'landmask.npz')
+
+# Coarse land outlines (lon, lat) for states whose bounding box contains
+# large water bodies. States not listed are treated as all land.
+COASTAL_STATE_OUTLINES = {
+    'California': [[
+        (-124.2, 42.0), (-120.0, 42.0), (-120.0, 39.0), (-114.6, 35.0),
+        (-114.6, 34.3), (-114.1, 34.3), (-114.7, 32.7), (-117.1, 32.5),
+        (-117.25, 32.9), (-117.4, 33.2), (-117.9, 33.6), (-118.4, 33.8),
+        (-118.5, 34.0), (-119.2, 34.15), (-120.5, 34.5), (-120.6, 35.0),
+        (-121.0, 35.5), (-121.9, 36.3), (-121.8, 36.8), (-122.4, 37.2),
+        (-122.5, 37.8), (-123.0, 38.0), (-123.7, 38.9), (-123.8, 39.8),
+        (-124.3, 40.3), (-124.1, 41.0),
+    ]],
+    'Florida': [[
+        (-87.6, 31.0), (-85.0, 31.0), (-84.9, 30.7), (-81.5, 30.7),
+        (-81.4, 30.7), (-81.3, 29.9), (-81.0, 29.2), (-80.6, 28.4),
+        (-80.6, 28.0), (-80.2, 27.0), (-80.05, 26.5), (-80.1, 25.8),
+        (-80.4, 25.2), (-81.1, 25.1), (-81.8, 26.1), (-82.2, 26.8),
+        (-82.7, 27.5), (-82.8, 28.2), (-82.7, 28.9), (-83.0, 29.2),
+        (-83.7, 29.9), (-84.3, 30.0), (-85.0, 29.6), (-85.4, 29.7),
+        (-86.0, 30.3), (-87.3, 30.3), (-87.5, 30.3),
+    ]],
+    'New Jersey': [[
+        (-74.7, 41.36), (-73.9, 41.0), (-74.0, 40.7), (-74.25, 40.5),
+        (-73.98, 40.45), (-74.05, 40.0), (-74.2, 39.6), (-74.6, 39.2),
+        (-74.95, 38.93), (-74.9, 39.2), (-75.3, 39.45), (-75.55, 39.6),
+        (-75.1, 40.0), (-74.75, 40.2), (-75.1, 40.6), (-75.2, 40.9),
+    ]],
+    'New York': [
+        [
+            (-79.76, 42.0), (-75.35, 42.0), (-75.1, 41.85), (-74.7, 41.36),
+            (-73.9, 41.0), (-73.5, 41.1), (-73.25, 42.75), (-73.35, 45.0),
+            (-74.7, 45.0), (-75.3, 44.8), (-76.2, 44.25), (-76.3, 43.55),
+            (-76.9, 43.3), (-78.0, 43.37), (-79.06, 43.27), (-79.05, 42.9),
+            (-79.76, 42.27),
+        ],
+        # Long Island
+        [
+            (-74.02, 40.7), (-74.0, 40.58), (-73.75, 40.6), (-72.8, 40.7),
+            (-71.86, 41.07), (-72.4, 41.0), (-73.0, 40.95), (-73.75, 40.8),
+        ],
+    ],
+    'Massachusetts': [[
+        (-73.5, 42.05), (-73.26, 42.75), (-71.3, 42.7), (-70.8, 42.87),
+        (-70.6, 42.65), (-71.0, 42.35), (-70.65, 41.95), (-70.55, 41.78),
+        (-70.0, 41.75), (-69.95, 41.67), (-70.65, 41.55), (-71.1, 41.5),
+        (-71.2, 41.65), (-71.38, 41.9), (-71.8, 42.02),
+    ]],
+}
+
+
+class LandMask:
+    """Packed boolean land raster over one state's bounding box"""
+
+    def __init__(self, bits, bounds, resolution, shape):
+        self.bits = bits
+        self.min_lon, self.min_lat, self.max_lon, self.max_lat = bounds
+        self.resolution = resolution
+        self.height, self.width = shape
+        self.land_fraction = float(np.unpackbits(bits, axis=1, count=self.width).mean())
+
+    def contains(self, lats, lons):
+        """
+        Vectorized land test for a batch of points
+
+        Returns:
+            Boolean array, False for water and for points outside the box
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        rows = np.floor((self.max_lat - lats) / self.resolution).astype(np.intp)
+        cols = np.floor((lons - self.min_lon) / self.resolution).astype(np.intp)
+        inside = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+        rows = np.where(inside, rows, 0)
+        cols = np.where(inside, cols, 0)
+        packed = self.bits[rows, cols >> 3]
+        return inside & (((packed >> (7 - (cols & 7))) & 1) == 1)
+
+
+def _points_in_polygons(lons, lats, polygons):
+    """Even-odd point-in-polygon test of coordinate grids against a list of rings"""
+    inside = np.zeros(np.broadcast(lons, lats).shape, dtype=bool)
+    for ring in polygons:
+        ring = np.asarray(ring, dtype=np.float64)
+        x1, y1 = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        for ax, ay, bx, by in zip(x1, y1, x2, y2):
+            if ay == by:
+                continue
+            crosses = (ay > lats) != (by > lats)
+            x_at = ax + (lats - ay) * (bx - ax) / (by - ay)
+            inside ^= crosses & (lons < x_at)
+    return inside
+
+
+def rasterize_state(state_name, polygons=None, resolution=MASK_RESOLUTION):
+    """
+    Rasterize one state's land mask over its bounding box
+
+    Args:
+        polygons: List of (lon, lat) rings; None means the whole box is land
+
+    Returns:
+        Boolean array of shape (rows, cols), row 0 at the northern edge
+    """
+    min_lon, min_lat, max_lon, max_lat = STATE_BOUNDARIES[state_name]
+    width = int(np.ceil((max_lon - min_lon) / resolution))
+    height = int(np.ceil((max_lat - min_lat) / resolution))
+    if polygons is None:
+        return np.ones((height, width), dtype=bool)
+
+    # Test cell centres
+    lats = (max_lat - (np.arange(height) + 0.5) * resolution)[:, None]
+    lons = (min_lon + (np.arange(width) + 0.5) * resolution)[None, :]
+    return _points_in_polygons(lons, lats, polygons)
+
+
+def _geojson_polygons(path):
+    """Read {state name: [rings]} from a state boundary FeatureCollection"""
+    with open(path) as f:
+        collection = json.load(f)
+    polygons = {}
+    for feature in collection['features']:
+        name = feature['properties'].get('NAME') or feature['properties'].get('name')
+        geometry = feature['geometry']
+        parts = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        # Even-odd filling handles holes when every ring is included
+        polygons[name] = [ring for part in parts for ring in part]
+    return polygons
+
+
+def build_masks(resolution=MASK_RESOLUTION, geojson_path=None):
+    """Rasterize masks for every supported state"""
+    outlines = _geojson_polygons(geojson_path) if geojson_path else COASTAL_STATE_OUTLINES
+    return {
+        state: rasterize_state(state, outlines.get(state), resolution)
+        for state in STATE_BOUNDARIES
+    }
+
+
+def save_masks(masks, path, resolution=MASK_RESOLUTION):
+    """Pack masks 8 cells per byte and write them to a compressed .npz"""
+    arrays = {}
+    meta = {'resolution': resolution, 'states': {}}
+    for state, mask in masks.items():
+        key = state.replace(' ', '_')
+        arrays[key] = np.packbits(mask, axis=1)
+        meta['states'][state] = {'key': key, 'shape': list(mask.shape)}
+    arrays['meta'] = np.array(json.dumps(meta))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez_compressed(path, **arrays)
+    return path
+
+
+@lru_cache(maxsize=None)
+def _load_masks(path):
+    if not os.path.exists(path):
+        # No prebuilt file: rasterize the built-in outlines once
+        print(f"[LANDMASK] {path} not found, rasterizing built-in outlines")
+        masks = build_masks()
+        return {
+            state: LandMask(np.packbits(mask, axis=1), STATE_BOUNDARIES[state],
+                            MASK_RESOLUTION, mask.shape)
+            for state, mask in masks.items()
+        }
+
+    with np.load(path) as data:
+        meta = json.loads(str(data['meta']))
+        return {
+            state: LandMask(data[info['key']], STATE_BOUNDARIES[state],
+                            meta['resolution'], tuple(info['shape']))
+            for state, info in meta['states'].items()
+            if state in STATE_BOUNDARIES
+        }
+
+
+def get_land_mask(state_name, path=None):
+    """Return the LandMask for a state, or None if the state has no mask"""
+    path = path or os.getenv('LAND_MASK_PATH', DEFAULT_MASK_PATH)
+    return _load_masks(os.path.abspath(path)).get(state_name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build packed land-validity masks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='Rasterize and save state masks')
+    build.add_argument('--out', default=os.getenv('LAND_MASK_PATH', DEFAULT_MASK_PATH))
+    build.add_argument('--resolution', type=float, default=MASK_RESOLUTION)
+    build.add_argument('--geojson', help='State boundary FeatureCollection with NAME properties')
+
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        masks = build_masks(args.resolution, args.geojson)
+        save_masks(masks, args.out, args.resolution)
+        size = os.path.getsize(args.out)
+        print(f"[LANDMASK] Wrote {len(masks)} state masks to {args.out} ({size / 1024:.0f} KiB)")
+
+
+if __name__ == '__main__':
+    main()
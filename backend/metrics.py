@@ -0,0 +1,260 @@
+"""Stage timers and Prometheus-format metrics
+
+StageTimings collects per-request stage durations and candidate counts.
+It is a plain object, so region worker processes can return theirs to be
+merged. When a request finishes, record_timings() feeds the totals into
+the process-wide histograms and counters below. /api/metrics renders them
+in the Prometheus text exposition format.
+
+Metrics are kept per process. Under gunicorn each worker serves its own
+series, so scrape every worker or run one worker per container.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 12.0, 20.0, 30.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+class Registry:
+    """Metrics plus callbacks that produce samples at scrape time"""
+
+    def __init__(self):
+        self._metrics = []
+        self._callbacks = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_callback(self, fn):
+        """fn() returns exposition text lines (including HELP/TYPE) at scrape time"""
+        self._callbacks.append(fn)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            lines.extend(metric.samples())
+        for fn in self._callbacks:
+            lines.extend(fn())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'gridsight_stage_seconds', 'Time spent in each analysis pipeline stage', ['stage'])
+ANALYSIS_SECONDS = REGISTRY.histogram(
+    'gridsight_analysis_seconds', 'Wall time of a whole analysis', ['endpoint'], LLM_BUCKETS)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'gridsight_http_request_seconds', 'HTTP request latency', ['endpoint'])
+REQUESTS = REGISTRY.counter(
+    'gridsight_http_requests_total', 'HTTP requests by endpoint and status', ['endpoint', 'method', 'status'])
+GEMINI_CALL_SECONDS = REGISTRY.histogram(
+    'gridsight_gemini_call_seconds', 'Latency of individual Gemini calls', ['kind', 'outcome'], LLM_BUCKETS)
+GEMINI_CALLS = REGISTRY.counter(
+    'gridsight_gemini_calls_total', 'Gemini calls by kind and outcome', ['kind', 'outcome'])
+GEMINI_HEDGES = REGISTRY.counter(
+    'gridsight_gemini_hedges_total', 'Duplicate Gemini calls sent for slow or failed ones', ['kind'])
+GEE_REQUEST_SECONDS = REGISTRY.histogram(
+    'gridsight_gee_request_seconds', 'Latency of Earth Engine page requests', ['outcome'])
+GEE_REQUESTS = REGISTRY.counter(
+    'gridsight_gee_requests_total', 'Earth Engine requests by outcome (ok, retry, error)', ['outcome'])
+QUERY_PARSES = REGISTRY.counter(
+    'gridsight_query_parses_total', 'Queries parsed, by the tier that answered', ['tier'])
+QUERY_PARSE_SECONDS = REGISTRY.histogram(
+    'gridsight_query_parse_seconds', 'Query parse latency by answering tier', ['tier'], LLM_BUCKETS)
+FALLBACKS = REGISTRY.counter(
+    'gridsight_fallbacks_total', 'Answers served by a local fallback instead of Gemini', ['kind', 'reason'])
+CANDIDATES = REGISTRY.counter(
+    'gridsight_candidates_total', 'Candidate sites processed, by pipeline stage', ['stage'])
+
+
+_caches = []
+
+
+def _collect_caches():
+    # (cache name, tier, stats) for every tier of every registered cache
+    tiers = []
+    for name, cache, default_tier in _caches:
+        stats = cache.stats()
+        for tier, tier_stats in (stats.items() if 'memory' in stats else [(default_tier, stats)]):
+            if tier_stats is not None:
+                tiers.append((name, tier, tier_stats))
+
+    lines = []
+    for metric, field, kind in (('gridsight_cache_hits_total', 'hits', 'counter'),
+                                ('gridsight_cache_misses_total', 'misses', 'counter'),
+                                ('gridsight_cache_evictions_total', 'evictions', 'counter'),
+                                ('gridsight_cache_entries', 'entries', 'gauge')):
+        lines.append(f'# TYPE {metric} {kind}')
+        for name, tier, stats in tiers:
+            if field in stats:
+                lines.append(f'{metric}{{cache="{name}",tier="{tier}"}} {stats[field]}')
+    return lines
+
+
+REGISTRY.register_callback(_collect_caches)
+
+
+def register_cache(name, cache, tier='memory'):
+    """
+    Export a cache's stats() counters (TTLCache, SQLiteCache or TieredCache)
+
+    tier labels a single-tier cache; a TieredCache reports its own tiers.
+    """
+    _caches.append((name, cache, tier))
+
+
+_breakers = []
+_BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+def _collect_breakers():
+    lines = []
+    for metric, field, kind in (('gridsight_circuit_state', 'state', 'gauge'),
+                                ('gridsight_circuit_opened_total', 'opened', 'counter'),
+                                ('gridsight_circuit_rejected_total', 'rejected', 'counter')):
+        lines.append(f'# TYPE {metric} {kind}')
+        for name, breaker in _breakers:
+            value = breaker.stats()[field]
+            lines.append(f'{metric}{{circuit="{name}"}} {_BREAKER_STATES.get(value, value)}')
+    return lines
+
+
+REGISTRY.register_callback(_collect_breakers)
+
+
+def register_breaker(name, breaker):
+    """Export a CircuitBreaker's state (0 closed, 1 half-open, 2 open) and counters"""
+    _breakers.append((name, breaker))
+
+
+class StageTimings:
+    """Stage durations (seconds) and candidate counts for one request"""
+
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def count(self, name, n):
+        self.counts[name] = self.counts.get(name, 0) + int(n)
+
+    def merge(self, other):
+        for name, seconds in other.seconds.items():
+            self.add(name, seconds)
+        for name, n in other.counts.items():
+            self.count(name, n)
+
+    def to_dict(self):
+        return {name: round(seconds, 6) for name, seconds in self.seconds.items()}
+
+
+def record_timings(timings):
+    """Observe a finished request's stage durations and candidate counts"""
+    for name, seconds in timings.seconds.items():
+        STAGE_SECONDS.observe(seconds, stage=name)
+    for name, n in timings.counts.items():
+        CANDIDATES.inc(n, stage=name)
@@ -0,0 +1,191 @@
+"""
+Local query parser
+
+extract_query() reads the fields an analysis needs (region, energy type,
+site count, acreage, slope limit, priorities) in a single pass of one
+pattern compiled at import: an alternation of the acreage, slope and
+site-count patterns, every state and region group name, the energy types
+and priority words, and a catch-all for any other word.
+
+It also rates each field. A field is certain when it is mentioned once,
+without ambiguity, or when it is not mentioned and the default is the one
+Gemini is told to use. Words no pattern accounts for ("avoid protected
+areas", "large", "not in Texas") make the parse uncertain, since Gemini
+may read a constraint or priority into them. gemini_agents.parse_user_query
+skips Gemini when the overall confidence reaches LOCAL_PARSE_MIN_CONFIDENCE.
+
+The region is None when the query names none; the caller picks the
+default. A capitalized word after "in" that is not a supported state or
+group ("solar in Atlantis", "in Ohio") is returned as the region, so it
+is rejected instead of quietly replaced by the default.
+
+    python query_parser.py "50-acre solar site in Arizona, flat terrain"
+"""
+import argparse
+import json
+import re
+
+from utils import REGION_GROUPS, STATE_BOUNDARIES
+
+DEFAULT_REGION = 'Arizona'  # For requests whose query and filters name no region
+DEFAULT_ACREAGE = 50
+FLAT_MAX_SLOPE = 3.0
+UNCERTAIN = 0.5
+
+_STATE_NAMES = {name.lower(): name for name in STATE_BOUNDARIES}
+_GROUP_NAMES = {name.lower(): name for name in REGION_GROUPS if name != 'All'}
+_REGION_NAMES = {**_STATE_NAMES, **_GROUP_NAMES}
+
+ENERGY_TYPES = {
+    'solar': 'solar', 'photovoltaic': 'solar', 'pv': 'solar', 'wind': 'wind',
+    'hydro': 'hydro', 'hydroelectric': 'hydro', 'hydropower': 'hydro', 'geothermal': 'geothermal',
+}
+PRIORITY_WORDS = {
+    'flat': 'flat terrain', 'level': 'flat terrain', 'gentle': 'flat terrain',
+    'grid': 'near grid', 'transmission': 'near grid', 'power line': 'near grid', 'power lines': 'near grid',
+    'sun': 'high irradiance', 'sunny': 'high irradiance', 'sunshine': 'high irradiance',
+    'sunlight': 'high irradiance', 'irradiance': 'high irradiance',
+}
+PRIORITIES = ('flat terrain', 'near grid', 'high irradiance')
+# Energy words that also ask for a priority, as "solar" always has
+ENERGY_PRIORITIES = {'solar': 'high irradiance'}
+
+
+def _words(names):
+    # Longest first, so "new mexico" is never read as a shorter name
+    return '|'.join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+
+
+# One scanner over the lowercased query. At each position the first
+# alternative that matches wins; anything that is not a field is a word.
+QUERY_PATTERN = re.compile('|'.join((
+    r'(?P<acres>\b(?P<acres_value>\d[\d,]*)[\s-]*(?:acres?|ac)\b)',
+    r'(?P<slope>(?:[<≤]\s*)?\b(?P<slope_value>\d+(?:\.\d+)?)\s*'
+    r'(?:°\s*(?:slopes?\b)?|(?:degrees?|deg)\b(?:\s+slopes?\b)?|slopes?\b))',
+    r'(?P<sites>\b(?P<sites_value>\d+)\s+(?:(?P<sites_word>\w+)\s+)?(?:sites|locations)\b)',
+    r'(?P<region>\b(?:' + _words(_REGION_NAMES) + r')\b)',
+    r'(?P<nationwide>\b(?:anywhere|nationwide|all (?:\d+ )?(?:supported )?states)\b)',
+    r'(?P<energy>\b(?:' + _words(ENERGY_TYPES) + r')\b)',
+    r'(?P<priority>\b(?:' + _words(PRIORITY_WORDS) + r')\b)',
+    r'(?P<word>[a-z]+|\d+(?:\.\d+)?)',
+)))
+
+# Words that introduce a place name ("in Ohio")
+PLACE_WORDS = frozenset(('in', 'across', 'within', 'inside'))
+
+# Words that carry no parameter of their own
+FILLER_WORDS = frozenset('''
+    a an the i me my we us our you please can could would show find get give list search want need
+    looking look where what which should is are be to build put
+    best top good great ideal optimal suitable prime promising possible potential new
+    site sites location locations spot spots place places area areas land ground terrain
+    farm farms plant plants installation installations project projects array arrays park parks
+    energy power generation development
+    for in on at of with and or within around across inside near close by from
+    state states usa united america somewhere region
+    slope slopes under below less than max maximum most low lowest minimal
+    degree degrees high higher exposure access
+'''.split())
+
+
+def extract_query(user_input):
+    """
+    Parse a query in one pass of QUERY_PATTERN
+
+    Returns:
+        (parsed, details): parsed has the same fields as a Gemini parse,
+        with confidence the lowest field confidence; details holds the
+        per-field confidences and the words no pattern accounted for
+    """
+    named, site_counts, acreages, slopes, energy_types = [], set(), set(), set(), []
+    priorities = set()
+    nationwide = False
+    unparsed, places = [], []
+    user_input = user_input or ''
+    previous = None
+
+    for match in QUERY_PATTERN.finditer(user_input.lower()):
+        kind = match.lastgroup
+        if kind == 'word':
+            if match.group() not in FILLER_WORDS:
+                unparsed.append(match.group())
+                if previous in PLACE_WORDS and user_input[match.start():match.end()].istitle():
+                    places.append(user_input[match.start():match.end()])
+        elif kind == 'region':
+            name = _REGION_NAMES[match.group()]
+            if name not in named:
+                named.append(name)
+        elif kind == 'acres':
+            acreages.add(int(match.group('acres_value').replace(',', '')))
+        elif kind == 'slope':
+            slopes.add(float(match.group('slope_value')))
+        elif kind == 'sites':
+            site_counts.add(int(match.group('sites_value')))
+            word = match.group('sites_word')
+            if word in ENERGY_TYPES:
+                energy_types.append(ENERGY_TYPES[word])
+                if word in ENERGY_PRIORITIES:
+                    priorities.add(ENERGY_PRIORITIES[word])
+            elif word in PRIORITY_WORDS:
+                priorities.add(PRIORITY_WORDS[word])
+            elif word is not None and word not in FILLER_WORDS:
+                unparsed.append(word)
+        elif kind == 'energy':
+            energy_types.append(ENERGY_TYPES[match.group()])
+            if match.group() in ENERGY_PRIORITIES:
+                priorities.add(ENERGY_PRIORITIES[match.group()])
+        elif kind == 'priority':
+            priorities.add(PRIORITY_WORDS[match.group()])
+        elif kind == 'nationwide':
+            nationwide = True
+        previous = match.group() if kind == 'word' else None
+
+    # Region: a state beats a group, which beats a nationwide phrase;
+    # "anywhere in the Southwest" is the Southwest. An unknown place is kept
+    # so the request is rejected rather than run for the default region.
+    states = [name for name in named if name in STATE_BOUNDARIES]
+    if states:
+        region = states[0]
+    elif named:
+        region = named[0]
+    elif places:
+        region = places[0]
+    else:
+        region = 'All' if nationwide else None
+    energy_types = list(dict.fromkeys(energy_types))
+    max_slope = min(slopes) if slopes else None
+    if 'flat terrain' in priorities and max_slope is None:
+        max_slope = FLAT_MAX_SLOPE  # Implicit constraint for "flat"
+
+    fields = {
+        'region': 1.0 if len(named) == 1 or (not named and nationwide) else UNCERTAIN,
+        'num_sites': 1.0 if len(site_counts) <= 1 else UNCERTAIN,
+        'acreage': 1.0 if len(acreages) <= 1 else UNCERTAIN,
+        'max_slope': 1.0 if len(slopes) <= 1 else UNCERTAIN,
+        'energy_type': 1.0 if len(energy_types) <= 1 else UNCERTAIN,
+        'unparsed': 1.0 if not unparsed else UNCERTAIN,
+    }
+    parsed = {
+        "energy_type": energy_types[0] if energy_types else 'solar',
+        "region": region,
+        "num_sites": min(site_counts) if site_counts else None,
+        "acreage": max(acreages) if acreages else DEFAULT_ACREAGE,
+        "max_slope": max_slope,
+        "priorities": [priority for priority in PRIORITIES if priority in priorities],
+        "constraints": [],
+        "confidence": min(fields.values())
+    }
+    return parsed, {'fields': fields, 'unparsed': unparsed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Parse queries with the local parser')
+    parser.add_argument('queries', nargs='+')
+    args = parser.parse_args(argv)
+    for query in args.queries:
+        parsed, details = extract_query(query)
+        print(json.dumps({'query': query, 'parsed': parsed, **details}))
+
+
+if __name__ == '__main__':
+    main()
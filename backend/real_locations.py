@@ -162,13 +162,14 @@ REAL_LOCATIONS = {
     ],
 }
 
-def get_real_locations_for_state(state_name, num_sites=10):
+def get_real_locations_for_state(state_name, num_sites=10, rng=None):
     """
     Get real-world suitable locations for a given state
 
     Args:
         state_name: Name of the state
         num_sites: Number of locations to return
+        rng: Optional numpy Generator for a reproducible selection
 
     Returns:
         List of location dictionaries with lat, lon, name, and type
@@ -180,8 +181,9 @@ def get_real_locations_for_state(state_name, num_sites=10):
         return None
 
     # Return requested number, or all if fewer available
-    import random
     if len(locations) <= num_sites:
         return locations
-    else:
-        return random.sample(locations, num_sites)
+    if rng is None:
+        import numpy as np
+        rng = np.random.default_rng()
+    return [locations[i] for i in sorted(rng.choice(len(locations), num_sites, replace=False))]
@@ -0,0 +1,254 @@
+"""Persistent cache of remotely sampled pixel values by geohash cell
+
+Earth Engine lookups (see gee_backend) are keyed by the geohash cell of
+each candidate point and by a dataset version that covers the source
+assets, band mapping, scale and cell precision. Cells already in this
+cache are never fetched again, so repeated and overlapping analyses
+(curated Phoenix-area sites, then a whole-state Arizona run) only pay for
+the cells they have not seen. Cells the service returned no data for are
+cached too, as NULLs.
+
+The cache is one SQLite table shared by every worker on the host. It is
+bounded by GEE_SAMPLE_CACHE_MAX_CELLS, evicting least recently used cells.
+stats() counts this process' lookups; lifetime hit and miss totals for all
+processes are kept in the file and shown by `report`. Lookups only add to
+in-memory counts, which are written with the next put_many or by
+flush_counters(), so reading cached cells stays read-only.
+
+    python sample_cache.py report
+    python sample_cache.py clear
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+DEFAULT_SAMPLE_CACHE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'gee_samples.sqlite3')
+GEE_SAMPLE_CACHE_MAX_CELLS = int(os.getenv('GEE_SAMPLE_CACHE_MAX_CELLS', 500_000))
+LAYERS = ('ghi', 'slope', 'land_cover')
+
+# SQLite's default limit on bound parameters is 999
+_CHUNK = 500
+# accessed_at is only refreshed when older than this, so repeated lookups of
+# the same area stay read-only; eviction order is exact to within this window
+ACCESS_RESOLUTION_SECONDS = 600
+# flush_counters() writes the lifetime hit/miss totals at most this often
+COUNTER_FLUSH_SECONDS = 60
+
+
+class SampleCache:
+    """ghi / slope / land_cover per (dataset version, geohash cell), LRU-bounded"""
+
+    def __init__(self, path, max_entries=GEE_SAMPLE_CACHE_MAX_CELLS):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Hits and misses not yet added to sample_counters
+        self._unflushed = {'hits': 0, 'misses': 0}
+        self._counters_flushed = time.time()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS samples ('
+                'dataset TEXT NOT NULL, cell TEXT NOT NULL, '
+                'ghi REAL, slope REAL, land_cover INTEGER, accessed_at REAL NOT NULL, '
+                'PRIMARY KEY (dataset, cell)) WITHOUT ROWID'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS samples_accessed ON samples(accessed_at)')
+            conn.execute('CREATE TABLE IF NOT EXISTS sample_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            # Upper bound on the row count, so puts only count rows when near the limit
+            self._row_estimate = conn.execute('SELECT COUNT(*) FROM samples').fetchone()[0]
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        # Losing the last writes on power failure only costs refetches
+        conn.execute('PRAGMA synchronous=NORMAL')
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, dataset, cells):
+        """
+        Look up cells of one dataset version
+
+        Returns:
+            Dict of cell -> (ghi, slope, land_cover) for the cells present;
+            a cached no-data cell maps to (None, None, None)
+        """
+        cells = list(cells)
+        found = {}
+        now = time.time()
+        with self._connect() as conn:
+            for start in range(0, len(cells), _CHUNK):
+                chunk = cells[start:start + _CHUNK]
+                marks = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT cell, ghi, slope, land_cover FROM samples WHERE dataset = ? AND cell IN ({marks})',
+                    [dataset, *chunk]
+                ).fetchall()
+                for cell, ghi, slope, land_cover in rows:
+                    found[cell] = (ghi, slope, land_cover)
+                if rows:
+                    conn.execute(
+                        f'UPDATE samples SET accessed_at = ? '
+                        f'WHERE dataset = ? AND cell IN ({marks}) AND accessed_at < ?',
+                        [now, dataset, *chunk, now - ACCESS_RESOLUTION_SECONDS]
+                    )
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(cells) - len(found)
+            self._unflushed['hits'] += len(found)
+            self._unflushed['misses'] += len(cells) - len(found)
+        return found
+
+    def put_many(self, dataset, values):
+        """Store a dict of cell -> (ghi, slope, land_cover) and evict over max_entries"""
+        if not values:
+            return
+        now = time.time()
+        rows = [(dataset, cell, *cell_values, now) for cell, cell_values in values.items()]
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO samples (dataset, cell, ghi, slope, land_cover, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self._prune(conn, len(rows))
+            self._write_counters(conn)
+
+    def flush_counters(self, force=False):
+        """Add this process' unwritten hits and misses to the lifetime totals"""
+        with self._lock:
+            pending = any(self._unflushed.values())
+            due = force or time.time() - self._counters_flushed >= COUNTER_FLUSH_SECONDS
+        if pending and due:
+            with self._connect() as conn:
+                self._write_counters(conn)
+
+    def _write_counters(self, conn):
+        with self._lock:
+            counts = [(name, value) for name, value in self._unflushed.items() if value]
+            self._unflushed = {'hits': 0, 'misses': 0}
+            self._counters_flushed = time.time()
+        if counts:
+            conn.executemany(
+                'INSERT INTO sample_counters (name, value) VALUES (?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+                counts
+            )
+
+    def _prune(self, conn, added):
+        with self._lock:
+            self._row_estimate += added
+            if self._row_estimate <= self.max_entries:
+                return
+        # Other processes may have pruned too; count before deleting
+        count = conn.execute('SELECT COUNT(*) FROM samples').fetchone()[0]
+        overflow = max(0, count - self.max_entries)
+        if overflow:
+            conn.execute(
+                'DELETE FROM samples WHERE (dataset, cell) IN ('
+                'SELECT dataset, cell FROM samples ORDER BY accessed_at LIMIT ?)', (overflow,)
+            )
+        with self._lock:
+            self._row_estimate = count - overflow
+            self.evictions += overflow
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM samples')
+            conn.execute('DELETE FROM sample_counters')
+        with self._lock:
+            self._row_estimate = 0
+            self._unflushed = {'hits': 0, 'misses': 0}
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT COUNT(*) FROM samples').fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    def report(self):
+        """Cells per dataset version and the size of the cache file"""
+        self.flush_counters(force=True)
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT dataset, COUNT(*), SUM(ghi IS NULL), MIN(accessed_at), MAX(accessed_at) '
+                'FROM samples GROUP BY dataset ORDER BY dataset'
+            ).fetchall()
+            totals = dict(conn.execute('SELECT name, value FROM sample_counters').fetchall())
+        lookups = totals.get('hits', 0) + totals.get('misses', 0)
+        return {
+            'path': self.path,
+            'file_bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            **self.stats(),
+            'lifetime_hits': totals.get('hits', 0),
+            'lifetime_misses': totals.get('misses', 0),
+            'lifetime_hit_rate': round(totals.get('hits', 0) / lookups, 4) if lookups else None,
+            'datasets': [
+                {'dataset': dataset, 'cells': cells, 'no_data_cells': no_data or 0,
+                 'oldest_access': oldest, 'newest_access': newest}
+                for dataset, cells, no_data, oldest, newest in rows
+            ],
+        }
+
+
+@lru_cache(maxsize=None)
+def _open_cache(path):
+    return SampleCache(path)
+
+
+def get_sample_cache(path=None):
+    """Shared SampleCache for GEE_SAMPLE_CACHE_PATH, or None when set to ''"""
+    path = os.getenv('GEE_SAMPLE_CACHE_PATH', DEFAULT_SAMPLE_CACHE_PATH) if path is None else path
+    if not path:
+        return None
+    return _open_cache(os.path.abspath(path))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Geohash sample cache for Earth Engine lookups')
+    parser.add_argument('command', choices=['report', 'clear'])
+    parser.add_argument('--path', default=None, help='Cache file (default: GEE_SAMPLE_CACHE_PATH)')
+    args = parser.parse_args(argv)
+
+    cache = get_sample_cache(args.path)
+    if cache is None:
+        print('[CACHE] GEE_SAMPLE_CACHE_PATH is empty, nothing to do')
+        return
+    if args.command == 'clear':
+        cache.clear()
+        print(f'[CACHE] Cleared {cache.path}')
+        return
+
+    report = cache.report()
+    print(f"[CACHE] {report['path']}: {report['entries']} cells, {report['file_bytes'] / 1e6:.1f} MB "
+          f"(limit {report['max_entries']} cells)")
+    hit_rate = report['lifetime_hit_rate']
+    print(f"[CACHE] Lifetime lookups: {report['lifetime_hits']} hits, {report['lifetime_misses']} misses"
+          f"{f', hit rate {hit_rate:.1%}' if hit_rate is not None else ''}")
+    for entry in report['datasets']:
+        print(f"[CACHE]   {entry['dataset']}: {entry['cells']} cells ({entry['no_data_cells']} without data)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Batched, seeded candidate sampler
+
+Draws candidate coordinates inside a bounding box in vectorized batches
+from a per-request generator, filters each batch against the state's
+land mask and keeps refilling until the target count is reached or the
+draw budget runs out. Besides plain uniform sampling it offers
+low-discrepancy Halton and Sobol sequences, which cover a state evenly
+with fewer points.
+"""
+import numpy as np
+
+SAMPLING_METHODS = ('uniform', 'halton', 'sobol')
+
+# Direction numbers for the second Sobol dimension (primitive polynomial x + 1)
+_SOBOL_BITS = 32
+_SOBOL_DIRECTIONS = np.empty(_SOBOL_BITS, dtype=np.uint64)
+_SOBOL_DIRECTIONS[0] = 1 << (_SOBOL_BITS - 1)
+for _k in range(1, _SOBOL_BITS):
+    _SOBOL_DIRECTIONS[_k] = _SOBOL_DIRECTIONS[_k - 1] ^ (_SOBOL_DIRECTIONS[_k - 1] >> np.uint64(1))
+
+
+def _radical_inverse(indices, base):
+    """Van der Corput radical inverse of integer indices in the given base"""
+    indices = indices.copy()
+    result = np.zeros(len(indices), dtype=np.float64)
+    scale = 1.0 / base
+    while np.any(indices > 0):
+        result += scale * (indices % base)
+        indices //= base
+        scale /= base
+    return result
+
+
+def halton_points(start, count, shift):
+    """
+    Points start..start+count of the 2-D Halton sequence (bases 2 and 3)
+
+    shift is a random Cranley-Patterson rotation in [0, 1)^2.
+    """
+    indices = np.arange(start + 1, start + count + 1, dtype=np.int64)
+    points = np.column_stack([_radical_inverse(indices, 2), _radical_inverse(indices, 3)])
+    return (points + shift) % 1.0
+
+
+def sobol_points(start, count, scramble):
+    """
+    Points start..start+count of the 2-D Sobol sequence
+
+    scramble is a pair of 32-bit integers applied as a random digital shift.
+    """
+    indices = np.arange(start, start + count, dtype=np.uint64)
+    x = np.zeros(count, dtype=np.uint64)
+    y = np.zeros(count, dtype=np.uint64)
+    one = np.uint64(1)
+    for bit in range(_SOBOL_BITS):
+        set_bits = ((indices >> np.uint64(bit)) & one).astype(bool)
+        # First dimension is the bit-reversed index, second uses the direction numbers
+        x[set_bits] ^= np.uint64(1 << (_SOBOL_BITS - 1 - bit))
+        y[set_bits] ^= _SOBOL_DIRECTIONS[bit]
+    x ^= np.uint64(scramble[0])
+    y ^= np.uint64(scramble[1])
+    return np.column_stack([x, y]).astype(np.float64) / float(1 << _SOBOL_BITS)
+
+
+class CandidateSampler:
+    """
+    Seeded sampler of candidate coordinates inside a bounding box
+
+    Args:
+        boundary: (min_lon, min_lat, max_lon, max_lat)
+        land_mask: Optional landmask.LandMask used to reject water points
+        seed: Int seed or numpy Generator; the same seed gives the same points
+        method: 'uniform', 'halton' or 'sobol'
+    """
+
+    def __init__(self, boundary, land_mask=None, seed=None, method='uniform', batch_size=4096):
+        if method not in SAMPLING_METHODS:
+            raise ValueError(f"Unknown sampling method '{method}', expected one of {SAMPLING_METHODS}")
+        self.min_lon, self.min_lat, self.max_lon, self.max_lat = boundary
+        self.land_mask = land_mask
+        self.method = method
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        self.drawn = 0
+        # Per-sampler randomization of the low-discrepancy sequences
+        self._shift = self.rng.random(2)
+        self._scramble = self.rng.integers(0, 1 << _SOBOL_BITS, size=2, dtype=np.uint64)
+
+    @property
+    def acceptance(self):
+        """Expected fraction of draws that land on valid ground"""
+        return self.land_mask.land_fraction if self.land_mask is not None else 1.0
+
+    def _unit_points(self, count):
+        if self.method == 'halton':
+            points = halton_points(self.drawn, count, self._shift)
+        elif self.method == 'sobol':
+            points = sobol_points(self.drawn, count, self._scramble)
+        else:
+            points = self.rng.random((count, 2))
+        self.drawn += count
+        return points
+
+    def draw(self, count):
+        """Draw one batch and return the (lats, lons) that pass the land mask"""
+        unit = self._unit_points(count)
+        lons = self.min_lon + unit[:, 0] * (self.max_lon - self.min_lon)
+        lats = self.min_lat + unit[:, 1] * (self.max_lat - self.min_lat)
+        if self.land_mask is not None:
+            land = self.land_mask.contains(lats, lons)
+            lats, lons = lats[land], lons[land]
+        return lats, lons
+
+    def sample(self, num_points, budget=None):
+        """
+        Draw batches until num_points valid points are found
+
+        Args:
+            num_points: Target number of points
+            budget: Maximum number of raw draws (default: 20x the expected need)
+
+        Returns:
+            (lats, lons) arrays with at most num_points entries
+        """
+        batches = list(self.iter_sample(num_points, budget))
+        lats = np.concatenate([lats for lats, _ in batches]) if batches else np.empty(0)
+        lons = np.concatenate([lons for _, lons in batches]) if batches else np.empty(0)
+        return lats, lons
+
+    def iter_sample(self, num_points, budget=None):
+        """
+        sample() one batch at a time
+
+        Yields:
+            (lats, lons) of each batch of at most batch_size draws, together
+            at most num_points entries; the same points sample() returns
+        """
+        if budget is None:
+            budget = int(np.ceil(num_points / max(self.acceptance, 0.01))) * 20
+        found = 0
+        used = 0
+
+        while found < num_points and used < budget:
+            # Size the batch for the expected acceptance rate
+            shortfall = num_points - found
+            count = int(np.ceil(shortfall / max(self.acceptance, 0.01) * 1.1))
+            count = min(max(count, 16), self.batch_size, budget - used)
+            lats, lons = self.draw(count)
+            used += count
+            lats, lons = lats[:shortfall], lons[:shortfall]
+            found += len(lats)
+            if len(lats):
+                yield lats, lons
+
+        if found < num_points:
+            print(f"[SAMPLER] Budget of {budget} draws exhausted with {found}/{num_points} points")
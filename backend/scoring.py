@@ -0,0 +1,493 @@
+"""Vectorized scoring engine for candidate solar sites
+
+Candidates are kept as parallel column arrays (lat, lon, irradiance, slope,
+land cover code, grid distance) and every sub-score is computed with NumPy
+array operations. Dicts are only built for the final top-N sites.
+"""
+import numpy as np
+from metrics import StageTimings
+from utils import LAND_COVER_SUITABILITY, land_cover_name
+
+CRITERIA = ('irradiance', 'slope', 'grid_distance', 'land_cover')
+
+DEFAULT_CRITERIA_WEIGHTS = {
+    'irradiance': 0.4,
+    'slope': 0.3,
+    'grid_distance': 0.2,
+    'land_cover': 0.1
+}
+
+# Same ranges as normalize_irradiance / normalize_slope / estimate_grid_score
+IRRADIANCE_MIN, IRRADIANCE_MAX = 3.0, 7.5
+SLOPE_MAX = 15.0
+GRID_DISTANCE_MAX = 50.0
+
+# Lookup table indexed by land cover code (unlisted codes score 50)
+_LAND_COVER_TABLE = np.full(256, 50.0)
+for _code, _score in LAND_COVER_SUITABILITY.items():
+    _LAND_COVER_TABLE[_code] = _score
+
+
+class CandidateColumns:
+    """Candidate sites stored as parallel column arrays"""
+
+    def __init__(self, lat, lon, irradiance, slope, land_cover, grid_distance,
+                 names=None, types=None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.irradiance = np.asarray(irradiance, dtype=np.float64)
+        self.slope = np.asarray(slope, dtype=np.float64)
+        self.land_cover = np.asarray(land_cover, dtype=np.uint8)
+        self.grid_distance = np.asarray(grid_distance, dtype=np.float64)
+        # Optional real-world location labels, one entry per candidate
+        self.names = names
+        self.types = types
+
+    def __len__(self):
+        return len(self.lat)
+
+    def take(self, idx):
+        """Return a new CandidateColumns holding only the rows in idx"""
+        return CandidateColumns(
+            lat=self.lat[idx],
+            lon=self.lon[idx],
+            irradiance=self.irradiance[idx],
+            slope=self.slope[idx],
+            land_cover=self.land_cover[idx],
+            grid_distance=self.grid_distance[idx],
+            names=_take_labels(self.names, idx),
+            types=_take_labels(self.types, idx)
+        )
+
+    @classmethod
+    def concat(cls, parts):
+        """Concatenate several CandidateColumns into one (no parts: no candidates)"""
+        if not parts:
+            return cls(*(np.empty(0) for _ in range(6)))
+        has_labels = any(part.names is not None for part in parts)
+        names, types = None, None
+        if has_labels:
+            names, types = [], []
+            for part in parts:
+                names.extend(part.names if part.names is not None else [None] * len(part))
+                types.extend(part.types if part.types is not None else [None] * len(part))
+        return cls(
+            lat=np.concatenate([part.lat for part in parts]),
+            lon=np.concatenate([part.lon for part in parts]),
+            irradiance=np.concatenate([part.irradiance for part in parts]),
+            slope=np.concatenate([part.slope for part in parts]),
+            land_cover=np.concatenate([part.land_cover for part in parts]),
+            grid_distance=np.concatenate([part.grid_distance for part in parts]),
+            names=names,
+            types=types
+        )
+
+
+def _take_labels(labels, idx):
+    """Index a plain list of labels with an integer array"""
+    if labels is None:
+        return None
+    return [labels[i] for i in idx]
+
+
+def normalize_irradiance_array(values):
+    """Vectorized normalize_irradiance"""
+    span = IRRADIANCE_MAX - IRRADIANCE_MIN
+    return np.clip((values - IRRADIANCE_MIN) / span * 100, 0, 100)
+
+
+def normalize_slope_array(values):
+    """Vectorized normalize_slope"""
+    return np.maximum(0, 100 - (values / SLOPE_MAX * 100))
+
+
+def score_land_cover_array(codes):
+    """Vectorized score_land_cover"""
+    return _LAND_COVER_TABLE[codes]
+
+
+def estimate_grid_score_array(distances):
+    """Vectorized estimate_grid_score"""
+    return np.maximum(0, 100 - (distances / GRID_DISTANCE_MAX * 100))
+
+
+def score_candidates(columns, criteria_weights=None):
+    """
+    Compute all sub-scores and the weighted total for a batch of candidates
+
+    Returns:
+        Dict of arrays: irradiance, slope, grid_distance, land_cover and total
+    """
+    scores = score_components(columns)
+    scores['total'] = weighted_total(scores, criteria_weights)
+    return scores
+
+
+def score_components(columns):
+    """Per-criterion sub-scores (0-100) for a batch; independent of the weights"""
+    return {
+        'irradiance': normalize_irradiance_array(columns.irradiance),
+        'slope': normalize_slope_array(columns.slope),
+        'grid_distance': estimate_grid_score_array(columns.grid_distance),
+        'land_cover': score_land_cover_array(columns.land_cover),
+    }
+
+
+def normalize_weights(criteria_weights, base=DEFAULT_CRITERIA_WEIGHTS):
+    """
+    Merge criteria weights over base and scale them to sum to 1
+
+    Keeps weighted totals on the 0-100 scale whatever the caller sent.
+
+    Raises:
+        ValueError: for a non-numeric or negative weight, or a zero sum
+    """
+    try:
+        weights = {**base, **(criteria_weights or {})}
+        weights = {key: float(weights[key]) for key in CRITERIA}
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'criteria_weights must be numbers: {e}') from None
+    # Written so that NaN fails too
+    if not all(value >= 0 for value in weights.values()):
+        raise ValueError('criteria_weights must not be negative')
+    total = sum(weights.values())
+    if not total > 0:
+        raise ValueError('criteria_weights must sum to more than 0')
+    return {key: value / total for key, value in weights.items()}
+
+
+def weighted_total(components, criteria_weights=None):
+    """Weighted sum of sub-score arrays"""
+    weights = criteria_weights or DEFAULT_CRITERIA_WEIGHTS
+    return (
+        components['irradiance'] * weights['irradiance'] +
+        components['slope'] * weights['slope'] +
+        components['grid_distance'] * weights['grid_distance'] +
+        components['land_cover'] * weights['land_cover']
+    )
+
+
+def build_site(columns, scores, idx, rank):
+    """Build the public site dict for the candidate at index idx"""
+    site = {
+        'coordinates': {'lat': float(columns.lat[idx]), 'lon': float(columns.lon[idx])},
+        'score': round(float(scores['total'][idx]), 1),
+        'metrics': {
+            'solar_irradiance': round(float(columns.irradiance[idx]), 2),
+            'solar_irradiance_score': round(float(scores['irradiance'][idx]), 0),
+            'slope': round(float(columns.slope[idx]), 2),
+            'slope_score': round(float(scores['slope'][idx]), 0),
+            'grid_distance': float(columns.grid_distance[idx]),
+            'grid_distance_score': round(float(scores['grid_distance'][idx]), 0),
+            'land_cover': land_cover_name(int(columns.land_cover[idx])),
+            'land_cover_score': int(scores['land_cover'][idx])
+        }
+    }
+
+    if columns.names is not None and columns.names[idx]:
+        site['location_name'] = columns.names[idx]
+        site['location_type'] = columns.types[idx]
+
+    site['rank'] = rank
+    return site
+
+
+def slope_mask(slope, constraints):
+    """
+    Evaluate the cheap max_slope constraint on raw slope values
+
+    Applied before any other metric is computed or scored so rejected
+    candidates never pay for the expensive ones.
+    """
+    max_slope = (constraints or {}).get('max_slope')
+    if max_slope is None:
+        return None
+    return np.round(slope, 2) <= max_slope
+
+
+def top_k_indices(keys, seq, k):
+    """
+    Indices of the k largest keys, ties broken by ascending seq
+
+    Uses argpartition so selection is O(n) rather than a full sort; only
+    the (at most k plus ties) survivors are ordered.
+    """
+    if k <= 0 or len(keys) == 0:
+        return np.empty(0, dtype=np.intp)
+    if len(keys) <= k:
+        idx = np.arange(len(keys))
+    else:
+        threshold = keys[np.argpartition(-keys, k - 1)[:k]].min()
+        idx = np.flatnonzero(keys >= threshold)
+    order = np.lexsort((seq[idx], -keys[idx]))[:k]
+    return idx[order]
+
+
+class TopK:
+    """
+    Bounded top-k accumulator for streamed candidate batches
+
+    Keeps at most k scored candidates at any time, so memory stays O(k)
+    no matter how many batches are pushed through it.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.columns = None
+        self.scores = None
+        self.seq = np.empty(0, dtype=np.int64)
+        self.seen = 0
+
+    def push(self, columns, scores, seq):
+        """Merge a scored batch, keeping only the best k overall"""
+        if len(columns) == 0:
+            return
+        if self.columns is not None:
+            columns = CandidateColumns.concat([self.columns, columns])
+            scores = {key: np.concatenate([self.scores[key], scores[key]]) for key in scores}
+            seq = np.concatenate([self.seq, seq])
+
+        keep = top_k_indices(np.round(scores['total'], 1), seq, self.k)
+        self.columns = columns.take(keep)
+        self.scores = {key: values[keep] for key, values in scores.items()}
+        self.seq = seq[keep]
+
+    def ranked(self):
+        """The retained candidates, best first, still in columnar form"""
+        return RankedSites(self.columns, self.scores)
+
+    def sites(self):
+        """Build site dicts for the retained candidates, best first"""
+        return self.ranked().to_dicts()
+
+
+class RankedSites:
+    """
+    Ranked candidates kept as columns until the response is built
+
+    Per-state workers return these instead of lists of site dicts, so only
+    numpy arrays are pickled between processes and only the sites that
+    survive the final merge are turned into the public dict shape.
+    """
+
+    __slots__ = ('columns', 'scores', 'regions')
+
+    def __init__(self, columns, scores, regions=None):
+        # columns is None for an empty ranking
+        self.columns = columns
+        self.scores = scores
+        # Optional state name per site for multi-region analyses
+        self.regions = regions
+
+    def __len__(self):
+        return 0 if self.columns is None else len(self.columns)
+
+    @classmethod
+    def merge(cls, parts, k):
+        """
+        Best k sites of several rankings
+
+        Ties go to the earlier part, then to the better rank within it,
+        like a stable k-way merge of the per-part lists.
+        """
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls(None, None)
+
+        columns = CandidateColumns.concat([part.columns for part in parts])
+        scores = {key: np.concatenate([part.scores[key] for part in parts]) for key in parts[0].scores}
+        regions = None
+        if any(part.regions is not None for part in parts):
+            regions = []
+            for part in parts:
+                regions.extend(part.regions if part.regions is not None else [None] * len(part))
+
+        keep = top_k_indices(np.round(scores['total'], 1), np.arange(len(columns)), k)
+        return cls(
+            columns.take(keep),
+            {key: values[keep] for key, values in scores.items()},
+            [regions[i] for i in keep] if regions is not None else None
+        )
+
+    def to_dicts(self):
+        """Public site dicts, ranked from 1"""
+        sites = []
+        for idx in range(len(self)):
+            site = build_site(self.columns, self.scores, idx, idx + 1)
+            if self.regions is not None:
+                site['region'] = self.regions[idx]
+            sites.append(site)
+        return sites
+
+
+class ScoredCandidates:
+    """
+    Candidates that passed the slope filter, with their sub-score vectors
+
+    Sub-scores do not depend on the criteria weights, so an analysis can be
+    re-ranked under new weights by recomputing only the weighted sum and
+    the top-k selection, without resampling or rescoring.
+    """
+
+    def __init__(self, columns, components, seq, regions=None):
+        self.columns = columns
+        self.components = {key: np.asarray(components[key], dtype=np.float64)
+                           for key in CRITERIA}
+        self.seq = np.asarray(seq, dtype=np.int64)
+        # Optional state name per candidate for multi-region analyses
+        self.regions = regions
+
+    def __len__(self):
+        return len(self.columns)
+
+    @classmethod
+    def concat(cls, parts):
+        """
+        Concatenate in order; seq is renumbered so earlier parts win ties,
+        matching the region order of a k-way merge. No parts (a region
+        where no candidate had data) give an empty ScoredCandidates.
+        """
+        regions = None
+        if any(part.regions is not None for part in parts):
+            regions = []
+            for part in parts:
+                regions.extend(part.regions if part.regions is not None else [None] * len(part))
+        return cls(
+            CandidateColumns.concat([part.columns for part in parts]),
+            {key: np.concatenate([np.empty(0)] + [part.components[key] for part in parts]) for key in CRITERIA},
+            np.arange(sum(len(part) for part in parts)),
+            regions
+        )
+
+    def rank(self, num_sites=10, criteria_weights=None, constraints=None):
+        """
+        Rank under the given weights
+
+        Gives the same sites as rank_candidate_stream did for the batches
+        these candidates came from, when called with the same weights.
+        """
+        scores = dict(self.components)
+        scores['total'] = weighted_total(self.components, criteria_weights)
+        rounded = np.round(scores['total'], 1)
+
+        idx = np.arange(len(self))
+        min_acreage = (constraints or {}).get('min_acreage')
+        if min_acreage and min_acreage > 100:
+            idx = np.flatnonzero(rounded >= 70)
+        keep = idx[top_k_indices(rounded[idx], self.seq[idx], num_sites)]
+
+        return RankedSites(
+            self.columns.take(keep),
+            {key: values[keep] for key, values in scores.items()},
+            [self.regions[i] for i in keep] if self.regions is not None else None
+        ).to_dicts()
+
+    def to_dict(self):
+        """JSON-serializable form for the shared analysis store"""
+        columns = self.columns
+        return {
+            'lat': columns.lat.tolist(),
+            'lon': columns.lon.tolist(),
+            'irradiance': columns.irradiance.tolist(),
+            'slope': columns.slope.tolist(),
+            'land_cover': columns.land_cover.tolist(),
+            'grid_distance': columns.grid_distance.tolist(),
+            'names': columns.names,
+            'types': columns.types,
+            'components': {key: self.components[key].tolist() for key in CRITERIA},
+            'seq': self.seq.tolist(),
+            'regions': self.regions,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        columns = CandidateColumns(
+            lat=data['lat'],
+            lon=data['lon'],
+            irradiance=data['irradiance'],
+            slope=data['slope'],
+            land_cover=data['land_cover'],
+            grid_distance=data['grid_distance'],
+            names=data['names'],
+            types=data['types']
+        )
+        return cls(columns, data['components'], data['seq'], data['regions'])
+
+
+def rank_candidate_stream(batches, num_sites=10, criteria_weights=None, constraints=None,
+                          retain=None, timings=None, compact=False):
+    """
+    Filter, score and rank candidates arriving in batches
+
+    Hard constraints are pushed down: max_slope is checked on the raw slope
+    column before scoring, and only survivors are scored. Each batch is
+    folded into a TopK accumulator, so no batch is retained after it has
+    been processed -- unless retain is a list, in which case a
+    ScoredCandidates per batch is appended to it for later re-ranking.
+
+    Stage durations go to timings under 'filtering', 'scoring' and 'ranking'.
+
+    Returns:
+        List of top-ranked site dicts, or a RankedSites if compact
+    """
+    constraints = constraints or {}
+    max_slope = constraints.get('max_slope')
+    min_acreage = constraints.get('min_acreage')
+    timings = timings if timings is not None else StageTimings()
+    top = TopK(num_sites)
+    offset = 0
+    passed_slope = 0
+    passed_acreage = 0
+
+    for columns in batches:
+        seq = np.arange(offset, offset + len(columns))
+        offset += len(columns)
+
+        # Filter by max slope before computing any score
+        with timings.stage('filtering'):
+            mask = slope_mask(columns.slope, constraints)
+            if mask is not None:
+                keep = np.flatnonzero(mask)
+                columns, seq = columns.take(keep), seq[keep]
+                passed_slope += len(keep)
+
+        with timings.stage('scoring'):
+            scores = score_candidates(columns, criteria_weights)
+            if retain is not None:
+                retain.append(ScoredCandidates(columns, scores, seq))
+        timings.count('scored', len(columns))
+
+        # For large sites, require higher scores
+        if min_acreage and min_acreage > 100:
+            with timings.stage('filtering'):
+                keep = np.flatnonzero(np.round(scores['total'], 1) >= 70)
+                columns, seq = columns.take(keep), seq[keep]
+                scores = {key: values[keep] for key, values in scores.items()}
+                passed_acreage += len(keep)
+
+        with timings.stage('ranking'):
+            top.push(columns, scores, seq)
+        timings.count('ranked', len(columns))
+
+    if max_slope is not None:
+        print(f"[GEE] Filtered to {passed_slope} sites with slope <= {max_slope}°")
+    if min_acreage and min_acreage > 100:
+        print(f"[GEE] Filtered to {passed_acreage} sites suitable for {min_acreage}+ acres")
+
+    with timings.stage('ranking'):
+        return top.ranked() if compact else top.sites()
+
+
+def rank_candidates(columns, num_sites=10, criteria_weights=None, constraints=None, retain=None,
+                    timings=None, compact=False):
+    """
+    Score, filter and rank a batch of candidates
+
+    Produces the same sites as the per-point reference implementation
+    (gee_queries.rank_candidates_reference) for the same candidates.
+
+    Returns:
+        List of top-ranked site dicts, or a RankedSites if compact
+    """
+    return rank_candidate_stream([columns], num_sites, criteria_weights, constraints, retain, timings,
+                                 compact)
@@ -0,0 +1,47 @@
+"""Test setup: import the backend modules and keep every store local"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Must be set before the backend modules read their configuration
+os.environ['GEE_BACKEND'] = ''
+os.environ['GEMINI_API_KEY'] = ''
+os.environ['PARSE_CACHE_PATH'] = ''
+os.environ['EXPLANATION_CACHE_PATH'] = ''
+os.environ['ANALYSIS_STORE_PATH'] = ''
+os.environ['GEE_SAMPLE_CACHE_PATH'] = ''
+os.environ['JOB_STORE_PATH'] = ''
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def offline_gemini(monkeypatch):
+    """Every Gemini call fails at once, as it does without network access"""
+    import gemini_agents
+    from circuit_breaker import CircuitBreaker
+
+    def unavailable():
+        raise RuntimeError('Gemini is not available in tests')
+
+    async def unavailable_async():
+        unavailable()
+
+    monkeypatch.setattr(gemini_agents, 'get_model', unavailable)
+    monkeypatch.setattr(gemini_agents, 'get_model_async', unavailable_async)
+    monkeypatch.setattr(gemini_agents, 'gemini_breaker', CircuitBreaker())
+    gemini_agents.parse_cache.memory.clear()
+    gemini_agents.explanation_cache.memory.clear()
+
+
+@pytest.fixture
+def client():
+    """Flask test client with the result caches emptied"""
+    import app as app_module
+    from analysis_store import analysis_store, result_cache
+
+    analysis_store.memory.clear()
+    result_cache.clear()
+    return app_module.app.test_client()
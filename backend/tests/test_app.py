@@ -0,0 +1,144 @@
+"""Request validation of the Flask API, with Gemini unavailable"""
+import time
+
+import pytest
+
+QUERY = '50-acre solar site in Kansas'
+
+
+def analyze(client, **body):
+    return client.post('/api/analyze', json={'query': QUERY, 'filters': {'seed': 1}, **body})
+
+
+@pytest.mark.parametrize('explain_top, expected', [('3', 3), (2.0, 2), (-4, 0), (500, 10)])
+def test_explain_top_is_coerced_and_clamped(client, explain_top, expected):
+    response = analyze(client, explain_top=explain_top)
+
+    assert response.status_code == 200
+    sites = response.get_json()['sites']
+    assert len(sites) == 10
+    # With Gemini failing, explained sites get the error fallback text
+    fallback = [site for site in sites if 'making it suitable' in site['explanation']]
+    assert len(fallback) == expected
+
+
+@pytest.mark.parametrize('explain_top', ['three', [3], True])
+def test_invalid_explain_top_is_rejected(client, explain_top):
+    response = analyze(client, explain_top=explain_top)
+
+    assert response.status_code == 400
+    assert 'explain_top' in response.get_json()['message']
+
+
+def test_jobs_run_with_a_memory_only_store(client):
+    # conftest sets JOB_STORE_PATH to ''
+    response = client.post('/api/jobs', json={'query': QUERY, 'filters': {'seed': 1}, 'explain_top': 0})
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+
+    for _ in range(200):
+        job = client.get(status_url).get_json()
+        if job['job_status'] in ('succeeded', 'failed'):
+            break
+        time.sleep(0.05)
+
+    assert job['job_status'] == 'succeeded'
+    assert len(job['result']['sites']) == 10
+
+
+@pytest.mark.parametrize('query', ['solar in Kansas', 'solar in Texas'])
+def test_unknown_sampling_method_is_rejected(client, query):
+    # Texas has real locations and never reaches the sampler
+    response = client.post('/api/analyze', json={'query': query, 'filters': {'sampling_method': 'bogus'}})
+
+    assert response.status_code == 400
+    assert 'sampling method' in response.get_json()['message']
+
+
+def analysis_id(client):
+    response = analyze(client, explain_top=0)
+    return response.get_json()['metadata']['analysis_id']
+
+
+def test_rerank_normalizes_partial_weights(client):
+    response = client.post('/api/rerank', json={'analysis_id': analysis_id(client),
+                                                'criteria_weights': {'slope': 0.9}})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    weights = body['metadata']['criteria_weights']
+    assert sum(weights.values()) == pytest.approx(1.0)
+    # The original 0.4 / 0.9 / 0.2 / 0.1 divided by their sum of 1.6
+    assert weights['slope'] == pytest.approx(0.9 / 1.6)
+    assert all(0 <= site['score'] <= 100 for site in body['sites'])
+
+
+INVALID_WEIGHTS = [
+    {'slope': -0.5},
+    {'irradiance': 0, 'slope': 0, 'grid_distance': 0, 'land_cover': 0},
+    {'slope': 'steep'},
+]
+
+
+@pytest.mark.parametrize('weights', INVALID_WEIGHTS)
+def test_rerank_rejects_invalid_weights(client, weights):
+    response = client.post('/api/rerank', json={'analysis_id': analysis_id(client), 'criteria_weights': weights})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('weights', INVALID_WEIGHTS)
+def test_analyze_rejects_invalid_weights(client, weights):
+    response = analyze(client, explain_top=0, filters={'seed': 1, 'criteria_weights': weights})
+
+    assert response.status_code == 400
+    assert 'criteria_weights' in response.get_json()['message']
+
+
+def test_analyze_and_rerank_scale_weights_alike(client):
+    doubled = {'irradiance': 0.8, 'slope': 0.6, 'grid_distance': 0.4, 'land_cover': 0.2}
+    default = analyze(client, explain_top=0).get_json()
+    scaled = analyze(client, explain_top=0, filters={'seed': 1, 'criteria_weights': doubled}).get_json()
+    reranked = client.post('/api/rerank', json={'analysis_id': default['metadata']['analysis_id'],
+                                                'criteria_weights': doubled}).get_json()
+
+    scores = [site['score'] for site in default['sites']]
+    assert [site['score'] for site in scaled['sites']] == scores
+    assert [site['score'] for site in reranked['sites']] == scores
+    assert all(score <= 100 for score in scores)
+
+
+@pytest.mark.parametrize('explain_top, kept', [(0, True), (3, False)])
+def test_fallback_results_expire_early(client, monkeypatch, explain_top, kept):
+    import analysis_store
+    from analysis_store import result_cache
+
+    response = analyze(client, explain_top=explain_top)
+    assert response.status_code == 200
+    analysis_id = response.get_json()['metadata']['analysis_id']
+    assert result_cache.get(analysis_id) is not None
+
+    # Past ANALYSIS_FALLBACK_TTL but well within ANALYSIS_TTL
+    later = time.time() + analysis_store.ANALYSIS_FALLBACK_TTL + 1
+    monkeypatch.setattr(time, 'time', lambda: later)
+    assert (result_cache.get(analysis_id) is not None) == kept
+
+
+@pytest.mark.parametrize('body', [
+    {'query': 'solar in Atlantis'},
+    {'query': 'solar sites', 'filters': {'region': 'Narnia'}},
+])
+def test_unknown_regions_are_rejected(client, body):
+    response = client.post('/api/analyze', json=body)
+
+    assert response.status_code == 400
+    assert 'Unsupported region' in response.get_json()['message']
+
+
+@pytest.mark.parametrize('filters, region', [({'region': 'Texas'}, 'Texas'), ({}, 'Kansas')])
+def test_filter_region_takes_precedence(client, filters, region):
+    response = client.post('/api/analyze', json={
+        'query': QUERY, 'explain_top': 0, 'filters': {'seed': 1, **filters}})
+
+    assert response.status_code == 200
+    assert response.get_json()['metadata']['region'] == region
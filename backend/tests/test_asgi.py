@@ -0,0 +1,43 @@
+"""The async entry point keeps blocking cache I/O off the event loop"""
+import asyncio
+
+import pytest
+from starlette.testclient import TestClient
+
+
+def on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+@pytest.fixture
+def cache_calls(client, monkeypatch):
+    """(cache, method, ran on the event loop) for every result, parse and explanation cache call"""
+    from analysis_store import result_cache
+    from gemini_agents import explanation_cache, parse_cache
+
+    calls = []
+    for name, cache in (('result', result_cache), ('parse', parse_cache), ('explanation', explanation_cache)):
+        for method in ('get', 'set'):
+            def recorded(*args, _name=name, _method=method, _call=getattr(cache, method), **kwargs):
+                calls.append((_name, _method, on_event_loop()))
+                return _call(*args, **kwargs)
+            monkeypatch.setattr(cache, method, recorded)
+    return calls
+
+
+def test_analyze_reads_and_writes_caches_in_threads(cache_calls):
+    import asgi
+
+    with TestClient(asgi.app) as client:
+        body = {'query': 'solar farm in Kansas avoiding wetlands', 'explain_top': 3, 'filters': {'seed': 1}}
+        assert client.post('/api/analyze', json=body).status_code == 200
+        assert client.post('/api/analyze', json=body).status_code == 200
+
+    used = {(name, method) for name, method, _ in cache_calls}
+    assert {('result', 'get'), ('result', 'set'), ('parse', 'get'), ('parse', 'set'),
+            ('explanation', 'get')} <= used
+    assert not [call for call in cache_calls if call[2]]
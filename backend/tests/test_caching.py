@@ -0,0 +1,128 @@
+"""TTLCache, SQLiteCache and the TieredCache that puts them together"""
+import pytest
+
+import caching
+from caching import SQLiteCache, TieredCache, TTLCache
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(caching.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def disk(tmp_path, clock):
+    return SQLiteCache(str(tmp_path / 'cache.sqlite3'), max_entries=2, default_ttl=60)
+
+
+def test_memory_entries_expire(clock):
+    cache = TTLCache(default_ttl=60)
+    cache.set('default', 1)
+    cache.set('short', 2, ttl=10)
+    cache.set('forever', 3, ttl=0)
+
+    clock.advance(10)
+    assert cache.get('short') is None
+    assert cache.get('default') == 1
+
+    clock.advance(3600)
+    assert cache.get('default') is None
+    assert cache.get('forever') == 3
+    assert cache.stats()['expirations'] == 2
+
+
+def test_memory_evicts_least_recently_used(clock):
+    cache = TTLCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disk_entries_expire_with_remaining_ttl(disk, clock):
+    disk.set('key', {'value': [1, 2]})
+    disk.set('forever', 'x', ttl=0)
+
+    clock.advance(45)
+    assert disk.get_entry('key') == ({'value': [1, 2]}, 15)
+    assert disk.get_entry('forever') == ('x', None)
+
+    clock.advance(15)
+    assert disk.get_entry('key') == (None, None)
+
+
+def test_disk_evicts_least_recently_used(disk, clock):
+    disk.set('a', 1)
+    clock.advance(1)
+    disk.set('b', 2)
+    clock.advance(1)
+    disk.get('a')
+    clock.advance(1)
+    disk.set('c', 3)
+
+    assert len(disk) == 2
+    assert disk.get('b') is None
+    assert (disk.get('a'), disk.get('c')) == (1, 3)
+    assert disk.stats()['evictions'] == 1
+
+
+def test_disk_survives_a_new_instance(disk):
+    disk.set('key', 'value')
+
+    assert SQLiteCache(disk.path).get('key') == 'value'
+
+
+def test_tiered_writes_go_to_both_tiers(disk):
+    cache = TieredCache(TTLCache(), disk)
+
+    cache.set('key', 'value')
+
+    assert cache.memory.get('key') == 'value'
+    assert disk.get('key') == 'value'
+
+    cache.delete('key')
+    assert cache.get('key') is None
+    assert disk.get('key') is None
+
+
+def test_tiered_reads_promote_from_disk(disk, clock):
+    cache = TieredCache(TTLCache(default_ttl=3600), disk)
+    cache.set('key', 'value')
+    cache.memory.clear()
+
+    clock.advance(50)
+    assert cache.get('key') == 'value'
+    assert cache.stats()['disk']['hits'] == 1
+
+    # Promoted with the 10 seconds the disk row has left, not the memory default
+    clock.advance(5)
+    assert cache.get('key') == 'value'
+    assert cache.stats()['disk']['hits'] == 1
+    clock.advance(5)
+    assert cache.get('key') is None
+
+
+def test_tiered_without_disk_is_memory_only():
+    cache = TieredCache(TTLCache())
+    cache.set('key', 'value')
+    cache.memory.clear()
+
+    assert cache.get('key') is None
+    assert cache.stats()['disk'] is None
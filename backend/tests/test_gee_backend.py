@@ -0,0 +1,129 @@
+"""EarthEngineSampler lookups against the in-process fake_ee client"""
+import numpy as np
+import pytest
+
+import fake_ee
+from gee_backend import EarthEngineSampler
+from sample_cache import SampleCache
+
+# Roughly 40 x 60 km of central Texas; a few thousand precision-6 cells
+BOUNDS = (-99.0, 31.0, -98.4, 31.4)
+
+
+@pytest.fixture(autouse=True)
+def fake_service():
+    """No latency or failures, and fresh call counters, for every test"""
+    fake_ee.configure(latency=0.0, failure_rate=0.0, max_concurrent=40)
+    yield
+    fake_ee.configure(latency=0.0, failure_rate=0.0, max_concurrent=40)
+
+
+def points(n, seed=0, bounds=BOUNDS):
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(bounds[1], bounds[3], n)
+    lons = rng.uniform(bounds[0], bounds[2], n)
+    return lats, lons
+
+
+def lookup(sampler, lats, lons):
+    """All (index, values) blocks merged into per-point arrays, NaN for no data"""
+    merged = {name: np.full(len(lats), np.nan) for name in ('ghi', 'slope', 'land_cover')}
+    seen = np.zeros(len(lats), dtype=int)
+    for index, values in sampler.iter_lookup(lats, lons):
+        seen[index] += 1
+        for name, column in values.items():
+            merged[name][index] = column
+    assert seen.max() <= 1
+    return merged
+
+
+def sampler(**kwargs):
+    return EarthEngineSampler(fake_ee, **{'page_size': 200, 'backoff': 0.0, **kwargs})
+
+
+def assert_same(a, b):
+    for name in a:
+        np.testing.assert_array_equal(a[name], b[name])
+
+
+def test_output_does_not_depend_on_concurrency():
+    lats, lons = points(3000)
+    # Enough latency for the concurrent requests to overlap
+    fake_ee.configure(latency=0.01)
+
+    serial = lookup(sampler(concurrency=1), lats, lons)
+    parallel = lookup(sampler(concurrency=8), lats, lons)
+
+    assert_same(serial, parallel)
+    assert fake_ee.stats()['max_in_flight'] > 1
+
+
+def test_cached_cells_give_the_same_values(tmp_path):
+    lats, lons = points(2000)
+    cache = SampleCache(str(tmp_path / 'samples.sqlite3'))
+
+    cold_sampler = sampler(cache=cache)
+    cold = lookup(cold_sampler, lats, lons)
+    cold_sampler.flush()
+    calls = fake_ee.stats()['calls']
+    warm = lookup(sampler(cache=cache), lats, lons)
+
+    assert_same(cold, warm)
+    assert fake_ee.stats()['calls'] == calls
+
+
+def test_transient_failures_are_retried():
+    lats, lons = points(2000)
+    expected = lookup(sampler(), lats, lons)
+
+    fake_ee.configure(failure_rate=0.3, seed=1)
+    result = lookup(sampler(max_retries=20), lats, lons)
+
+    assert fake_ee.stats()['failures'] > 0
+    assert_same(expected, result)
+
+
+def test_retries_give_up_after_max_retries():
+    fake_ee.configure(failure_rate=1.0)
+
+    with pytest.raises(fake_ee.EEException, match='timed out'):
+        lookup(sampler(max_retries=2), *points(100))
+    assert fake_ee.stats()['calls'] == 3
+
+
+def test_non_retryable_errors_propagate(monkeypatch):
+    calls = []
+
+    def rejected(self):
+        calls.append(self)
+        raise fake_ee.EEException("Image.select: Pattern 'GHI' did not match any bands.")
+
+    monkeypatch.setattr(fake_ee.ComputedValue, 'getInfo', rejected)
+
+    with pytest.raises(fake_ee.EEException, match='did not match'):
+        lookup(sampler(concurrency=1), *points(100))
+    assert len(calls) == 1
+
+
+def test_no_data_cells_are_left_out():
+    lats, lons = points(2000)
+
+    result = lookup(sampler(), lats, lons)
+
+    missing = np.isnan(result['ghi'])
+    # fake_ee masks water (land cover 80) as no data
+    assert 0 < missing.sum() < len(lats)
+    assert not np.isnan(result['slope'][~missing]).any()
+    assert 80 not in result['land_cover'][~missing]
+
+
+def test_requests_stay_under_the_get_info_cap():
+    # Over 5000 distinct cells, so one unclamped page would be rejected
+    lats, lons = points(20000, bounds=(-100.0, 30.0, -97.0, 32.0))
+    large = sampler(page_size=20000)
+    assert large.page_size == fake_ee.GET_INFO_LIMIT
+
+    result = lookup(large, lats, lons)
+
+    assert fake_ee.stats()['calls'] > 1
+    assert not np.isnan(result['ghi']).all()
@@ -0,0 +1,346 @@
+"""Gemini call guarding and fallbacks, with fake calls instead of the SDK"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+import gemini_agents
+from circuit_breaker import CLOSED, OPEN, CircuitBreaker, CircuitOpenError
+
+# The real accessors; conftest replaces them with ones that raise
+GET_MODEL = gemini_agents.get_model
+GET_MODEL_ASYNC = gemini_agents.get_model_async
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """A configured key, no hedging and a breaker that opens after 2 failures"""
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    monkeypatch.setattr(gemini_agents, 'GEMINI_HEDGE_AFTER', 0)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    monkeypatch.setattr(gemini_agents, 'gemini_breaker', breaker)
+    return breaker
+
+
+@pytest.fixture
+def release():
+    """Event that unblocks slow fake calls at the end of a test"""
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+class FakeCall:
+    """Stands in for a Gemini request: records its timeouts, then acts"""
+
+    def __init__(self, *actions):
+        self.actions = list(actions)
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, timeout):
+        with self._lock:
+            self.timeouts.append(timeout)
+            action = self.actions[min(len(self.timeouts), len(self.actions)) - 1]
+        return action()
+
+
+def fail():
+    raise RuntimeError('503 Service Unavailable')
+
+
+def after(seconds):
+    return time.monotonic() + seconds
+
+
+@pytest.fixture
+def without_key(monkeypatch):
+    monkeypatch.setattr(gemini_agents, 'get_model', GET_MODEL)
+    monkeypatch.setattr(gemini_agents, 'get_model_async', GET_MODEL_ASYNC)
+    monkeypatch.setenv('GEMINI_API_KEY', '')
+
+
+def test_no_client_without_a_key(without_key):
+    assert gemini_agents.get_model() is None
+    assert not gemini_agents.gemini_status()['configured']
+    with pytest.raises(gemini_agents.CircuitOpenError):
+        gemini_agents.parse_user_query_gemini('solar in Kansas')
+
+
+def test_parse_without_a_key_falls_back_at_once(without_key):
+    started = time.perf_counter()
+    parsed = gemini_agents.parse_user_query('solar farm in Kansas avoiding wetlands')
+
+    assert parsed['parsed_by'] == 'fallback'
+    assert parsed['region'] == 'Kansas'
+    assert time.perf_counter() - started < 1.0
+
+
+def test_missing_key_is_an_open_circuit(breaker, monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', '')
+    call = FakeCall(lambda: 'ok')
+
+    with pytest.raises(CircuitOpenError):
+        gemini_agents._guarded_call('parse', call, after(5))
+
+    assert call.timeouts == []
+    assert breaker.stats()['consecutive_failures'] == 0
+
+
+def test_breaker_opens_after_threshold_and_probes_after_cool_down(breaker):
+    failing = FakeCall(fail)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            gemini_agents._guarded_call('parse', failing, after(5))
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        gemini_agents._guarded_call('parse', failing, after(5))
+    assert len(failing.timeouts) == 2
+
+    time.sleep(0.15)
+    assert gemini_agents._guarded_call('parse', FakeCall(lambda: 'ok'), after(5)) == 'ok'
+    assert breaker.state == CLOSED
+
+
+def test_remaining_deadline_caps_the_timeout(breaker, release):
+    deadline = after(0.3)
+    assert gemini_agents._deadline(4.0, deadline) == deadline
+
+    call = FakeCall(lambda: release.wait(5))
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        gemini_agents._guarded_call('parse', call, deadline)
+
+    assert 0 < call.timeouts[0] <= 0.3
+    assert time.monotonic() - started < 1.0
+    assert breaker.stats()['consecutive_failures'] == 1
+
+
+def test_no_call_once_the_deadline_has_passed(breaker):
+    call = FakeCall(lambda: 'ok')
+
+    with pytest.raises(TimeoutError):
+        gemini_agents._guarded_call('parse', call, after(-1))
+    assert call.timeouts == []
+
+
+@pytest.mark.parametrize('first', ['slow', 'failing'])
+def test_a_single_hedge_is_sent(breaker, release, monkeypatch, first):
+    monkeypatch.setattr(gemini_agents, 'GEMINI_HEDGE_AFTER', 0.05)
+    call = FakeCall(fail if first == 'failing' else lambda: release.wait(5), lambda: 'hedged')
+
+    assert gemini_agents._guarded_call('parse', call, after(1)) == 'hedged'
+    assert len(call.timeouts) == 2
+
+
+def test_hedging_stops_at_one_duplicate(breaker, release, monkeypatch):
+    monkeypatch.setattr(gemini_agents, 'GEMINI_HEDGE_AFTER', 0.05)
+    slow = FakeCall(lambda: release.wait(5))
+
+    with pytest.raises(TimeoutError):
+        gemini_agents._guarded_call('parse', slow, after(0.3))
+    assert len(slow.timeouts) == 2
+
+    failing = FakeCall(fail)
+    with pytest.raises(RuntimeError):
+        gemini_agents._guarded_call('parse', failing, after(1))
+    assert len(failing.timeouts) == 2
+
+
+def test_async_calls_share_the_breaker_and_hedge_once(breaker, monkeypatch):
+    monkeypatch.setattr(gemini_agents, 'GEMINI_HEDGE_AFTER', 0.05)
+    timeouts = []
+
+    async def failing(timeout):
+        timeouts.append(timeout)
+        raise RuntimeError('503 Service Unavailable')
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await gemini_agents._guarded_call_async('parse', failing, after(1))
+        with pytest.raises(CircuitOpenError):
+            await gemini_agents._guarded_call_async('parse', failing, after(1))
+
+    asyncio.run(run())
+    assert len(timeouts) == 4
+    assert all(0 < timeout <= 1 for timeout in timeouts)
+    assert breaker.state == OPEN
+
+
+CONFIDENT = '50-acre solar site in Kansas'
+UNSURE = 'solar farm in Kansas avoiding wetlands'
+
+
+@pytest.fixture
+def gemini_parse(breaker, monkeypatch):
+    """Gemini parses answered by a fake that records the queries it gets"""
+    queries = []
+
+    def parse(user_input, timeout=None):
+        queries.append(user_input)
+        parsed, _ = gemini_agents.extract_query(user_input)
+        return {**parsed, 'constraints': ['avoid wetlands'], 'confidence': 0.9}
+
+    async def parse_async(user_input, timeout=None):
+        return parse(user_input, timeout)
+
+    monkeypatch.setattr(gemini_agents, 'parse_user_query_gemini', parse)
+    monkeypatch.setattr(gemini_agents, 'parse_user_query_gemini_async', parse_async)
+    return queries
+
+
+def test_confident_parses_skip_gemini(gemini_parse):
+    parsed = gemini_agents.parse_user_query(CONFIDENT)
+
+    assert parsed['parsed_by'] == 'local'
+    assert gemini_parse == []
+
+
+def test_unsure_parses_ask_gemini_once_then_hit_the_cache(gemini_parse):
+    first = gemini_agents.parse_user_query(UNSURE)
+    second = gemini_agents.parse_user_query(UNSURE.upper() + '!')
+
+    assert first['parsed_by'] == 'gemini'
+    assert second['parsed_by'] == 'cache'
+    assert first['constraints'] == second['constraints'] == ['avoid wetlands']
+    assert gemini_parse == [UNSURE]
+
+
+def test_failed_gemini_parses_stay_fallbacks_in_the_cache(breaker):
+    # conftest makes every Gemini call fail
+    assert gemini_agents.parse_user_query(UNSURE)['parsed_by'] == 'fallback'
+    assert gemini_agents.parse_user_query(UNSURE)['parsed_by'] == 'fallback'
+
+
+def test_confidence_threshold_decides_the_tier(gemini_parse, monkeypatch):
+    monkeypatch.setattr(gemini_agents, 'LOCAL_PARSE_MIN_CONFIDENCE', 1.1)
+    assert gemini_agents.parse_user_query(CONFIDENT)['parsed_by'] == 'gemini'
+
+    monkeypatch.setattr(gemini_agents, 'LOCAL_PARSE_MIN_CONFIDENCE', 0.5)
+    assert gemini_agents.parse_user_query(UNSURE)['parsed_by'] == 'local'
+    assert gemini_parse == [CONFIDENT]
+
+
+def test_async_parse_uses_the_same_tiers(gemini_parse):
+    async def run():
+        return [(await gemini_agents.parse_user_query_async(query))['parsed_by']
+                for query in (CONFIDENT, UNSURE, UNSURE)]
+
+    assert asyncio.run(run()) == ['local', 'gemini', 'cache']
+
+
+class FakeResponse:
+    """Just the parts of a Gemini response that the readers use"""
+
+    def __init__(self, text):
+        self.text = text
+        self.candidates = [type('Candidate', (), {'content': type('Content', (), {'parts': [text]})()})()]
+
+
+class FakeModel:
+    def __init__(self, *texts):
+        self.texts = list(texts)
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return FakeResponse(self.texts[min(len(self.prompts), len(self.texts)) - 1])
+
+    async def generate_content_async(self, prompt, **kwargs):
+        return self.generate_content(prompt, **kwargs)
+
+
+@pytest.fixture
+def sites():
+    import numpy as np
+    from gee_queries import sample_candidates
+    from scoring import rank_candidates
+
+    return rank_candidates(sample_candidates('Kansas', 4, rng=np.random.default_rng(2), num_candidates=50), 4)
+
+
+@pytest.fixture
+def model(breaker, monkeypatch):
+    """Install a FakeModel with the given response texts"""
+    def install(*texts):
+        fake = FakeModel(*texts)
+        monkeypatch.setattr(gemini_agents, 'get_model', lambda: fake)
+
+        async def get_model_async():
+            return fake
+        monkeypatch.setattr(gemini_agents, 'get_model_async', get_model_async)
+        return fake
+    return install
+
+
+def cached(site, context=''):
+    return gemini_agents.explanation_cache.get(gemini_agents.explanation_cache_key(site, site['rank'], context))
+
+
+def test_batch_entries_are_matched_by_rank(sites, model):
+    model(gemini_agents.json.dumps([
+        {'rank': 2, 'explanation': ' Second. '},
+        {'rank': 1, 'explanation': 'First.'},
+        {'rank': 1, 'explanation': 'A duplicate.'},
+        {'rank': 99, 'explanation': 'Not one of the sites.'},
+        {'rank': 3, 'explanation': ''},
+        'not an entry',
+    ]))
+
+    explanations = gemini_agents.generate_site_explanations(sites, deadline=after(5))
+
+    assert explanations[1] == 'First.'
+    assert explanations[2] == 'Second.'
+    # Rank 3 had empty text and rank 4 is missing: both get the template
+    for site in sites[2:]:
+        assert explanations[site['rank']] == gemini_agents.template_site_explanation(site)
+        assert cached(site) is None
+    assert [cached(site) for site in sites[:2]] == ['First.', 'Second.']
+
+
+def test_wrapped_and_fenced_batches_are_read(sites, model):
+    entries = [{'rank': site['rank'], 'explanation': f"Site {site['rank']}."} for site in sites]
+    model('```json\n' + gemini_agents.json.dumps({'explanations': entries}) + '\n```')
+
+    explanations = gemini_agents.generate_site_explanations(sites, deadline=after(5))
+
+    assert explanations == {site['rank']: f"Site {site['rank']}." for site in sites}
+
+
+@pytest.mark.parametrize('text', ['Here are your explanations!', '{"rank": 1}', '   '])
+def test_unreadable_batches_fall_back_for_every_site(sites, model, text):
+    model(text)
+
+    explanations = gemini_agents.generate_site_explanations(sites, deadline=after(5))
+
+    assert explanations == {site['rank']: gemini_agents.fallback_site_explanation(site, site['rank'])
+                            for site in sites}
+    assert all(cached(site) is None for site in sites)
+
+
+def test_explain_sites_batches_the_top_sites(sites, model, monkeypatch):
+    monkeypatch.setattr(gemini_agents, 'EXPLANATION_BATCH_SIZE', 2)
+    fake = model(gemini_agents.json.dumps([{'rank': 1, 'explanation': 'First.'}]),
+                 gemini_agents.json.dumps([{'rank': 3, 'explanation': 'Third.'}]))
+
+    gemini_agents.explain_sites(sites, max_ai_sites=3, deadline=after(5))
+
+    # One call for #1-2 and a single-site call for #3, whose text is used as is
+    assert len(fake.prompts) == 2
+    assert [site['explanation'] for site in sites[:1]] == ['First.']
+    assert sites[1]['explanation'] == gemini_agents.template_site_explanation(sites[1])
+    assert sites[2]['explanation'] == fake.texts[1]
+    assert sites[3]['explanation'] == gemini_agents.template_site_explanation(sites[3])
+
+
+def test_async_batches_fill_missing_ranks_with_templates(sites, model):
+    model(gemini_agents.json.dumps([{'rank': 4, 'explanation': 'Fourth.'}]))
+
+    explanations = asyncio.run(gemini_agents.generate_site_explanations_async(sites, deadline=after(5)))
+
+    assert explanations[4] == 'Fourth.'
+    for site in sites[:3]:
+        assert explanations[site['rank']] == gemini_agents.template_site_explanation(site)
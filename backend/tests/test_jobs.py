@@ -0,0 +1,47 @@
+"""JobRunner state records and its in-flight count"""
+import threading
+
+from caching import TTLCache
+from jobs import JobRunner
+
+
+class FlakyStore(TTLCache):
+    """Fails the first write of each status listed in fail_on"""
+
+    def __init__(self, *fail_on):
+        super().__init__()
+        self.fail_on = set(fail_on)
+
+    def set(self, key, value, ttl=None):
+        if value.get('status') in self.fail_on:
+            self.fail_on.discard(value['status'])
+            raise OSError('database is locked')
+        super().set(key, value, ttl=ttl)
+
+
+def run(runner, fn, *args):
+    job = runner.submit('test', fn, *args)
+    runner._executor.shutdown(wait=True)
+    return runner.get(job['job_id'])
+
+
+def test_successful_jobs_record_their_result():
+    runner = JobRunner(TTLCache())
+
+    job = run(runner, sum, [1, 2, 3])
+
+    assert job['status'] == 'succeeded'
+    assert job['result'] == 6
+    assert runner.stats()['in_flight'] == 0
+
+
+def test_failed_running_record_still_releases_the_slot():
+    runner = JobRunner(FlakyStore('running'), queue_limit=1)
+    called = threading.Event()
+
+    job = run(runner, called.set)
+
+    assert not called.is_set()
+    assert job['status'] == 'failed'
+    assert 'database is locked' in job['error']
+    assert runner.stats()['in_flight'] == 0
@@ -0,0 +1,52 @@
+"""The local query parser and its per-field confidence"""
+import pytest
+
+from query_parser import UNCERTAIN, extract_query
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('50-acre solar site in Arizona, flat terrain',
+     {'region': 'Arizona', 'acreage': 50, 'max_slope': 3.0, 'priorities': ['flat terrain', 'high irradiance']}),
+    ('best 20 wind sites anywhere in the Southwest', {'region': 'Southwest', 'num_sites': 20, 'energy_type': 'wind'}),
+    ('solar in all 25 supported states', {'region': 'All'}),
+    ('Solar installation in California, <5° slope', {'region': 'California', 'max_slope': 5.0}),
+    ('1,200 acres of pv near transmission in New Mexico',
+     {'region': 'New Mexico', 'acreage': 1200, 'priorities': ['near grid']}),
+])
+def test_confident_parses(query, expected):
+    parsed, details = extract_query(query)
+
+    assert {key: parsed[key] for key in expected} == expected
+    assert parsed['confidence'] == 1.0
+    assert details['unparsed'] == []
+
+
+def test_solar_asks_for_high_irradiance():
+    assert extract_query('solar in Texas')[0]['priorities'] == ['high irradiance']
+    assert extract_query('best 5 solar sites in Texas')[0]['priorities'] == ['high irradiance']
+    assert extract_query('wind in Texas')[0]['priorities'] == []
+
+
+@pytest.mark.parametrize('query, field', [
+    ('solar in Texas or Kansas', 'region'),
+    ('solar sites', 'region'),
+    ('5 sites or 10 sites in Texas', 'num_sites'),
+    ('50 acres or 100 acres in Texas', 'acreage'),
+    ('under 3 degrees or 5° slope in Texas', 'max_slope'),
+    ('solar or wind in Texas', 'energy_type'),
+    ('solar in Texas avoiding protected areas', 'unparsed'),
+])
+def test_each_field_lowers_confidence(query, field):
+    parsed, details = extract_query(query)
+
+    assert details['fields'][field] == UNCERTAIN
+    assert all(value == 1.0 for name, value in details['fields'].items() if name != field)
+    assert parsed['confidence'] == UNCERTAIN
+
+
+def test_unknown_place_is_kept_as_region():
+    parsed, details = extract_query('solar in Atlantis')
+
+    assert parsed['region'] == 'Atlantis'
+    assert details['unparsed'] == ['atlantis']
+    assert extract_query('solar sites')[0]['region'] is None
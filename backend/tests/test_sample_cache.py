@@ -0,0 +1,50 @@
+"""SampleCache lookups and its lifetime hit/miss counters"""
+import sqlite3
+
+import pytest
+
+from sample_cache import SampleCache
+
+DATASET = 'fake_ee:test'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SampleCache(str(tmp_path / 'samples.sqlite3'))
+    cache.put_many(DATASET, {'9v6kp1': (6.1, 2.5, 30), '9v6kp2': (None, None, None)})
+    return cache
+
+
+def stored_counters(cache):
+    conn = sqlite3.connect(cache.path)
+    try:
+        return dict(conn.execute('SELECT name, value FROM sample_counters').fetchall())
+    finally:
+        conn.close()
+
+
+def test_lookups_return_values_and_no_data(cache):
+    found = cache.get_many(DATASET, ['9v6kp1', '9v6kp2', '9v6kp3'])
+
+    assert found == {'9v6kp1': (6.1, 2.5, 30), '9v6kp2': (None, None, None)}
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 1
+
+
+def test_lookups_do_not_write_counters(cache):
+    cache.get_many(DATASET, ['9v6kp1', '9v6kp3'])
+    cache.flush_counters()
+
+    assert stored_counters(cache) == {}
+
+
+def test_counters_are_written_with_puts_and_reports(cache):
+    cache.get_many(DATASET, ['9v6kp1', '9v6kp3'])
+    cache.put_many(DATASET, {'9v6kp3': (5.9, 1.0, 40)})
+    assert stored_counters(cache) == {'hits': 1, 'misses': 1}
+
+    cache.get_many(DATASET, ['9v6kp1', '9v6kp3'])
+    report = cache.report()
+
+    assert report['lifetime_hits'] == 3
+    assert report['lifetime_misses'] == 1
@@ -0,0 +1,62 @@
+"""The columnar ranking engine against the per-point reference implementation"""
+import numpy as np
+import pytest
+
+import gee_queries
+from gee_queries import analyze_solar_sites, rank_candidates_reference, sample_candidate_batches, sample_candidates
+from scoring import rank_candidates
+
+CONSTRAINTS = [
+    {},
+    {'max_slope': 3.0},
+    {'min_acreage': 500},
+    {'max_slope': 2.0, 'min_acreage': 200},
+]
+
+
+@pytest.mark.parametrize('region', ['Kansas', 'Arizona'])
+@pytest.mark.parametrize('seed', [0, 1, 7, 42])
+@pytest.mark.parametrize('constraints', CONSTRAINTS)
+def test_rank_candidates_matches_reference(region, seed, constraints):
+    # Kansas candidates are sampled points; Arizona's are labelled real locations
+    columns = sample_candidates(region, 10, rng=np.random.default_rng(seed), num_candidates=200)
+
+    sites = rank_candidates(columns, 10, None, constraints)
+    reference = rank_candidates_reference(columns, 10, None, constraints)
+
+    assert sites == reference
+    assert [site['rank'] for site in sites] == list(range(1, len(sites) + 1))
+
+
+def test_rank_candidates_matches_reference_with_weights():
+    weights = {'irradiance': 0.1, 'slope': 0.6, 'grid_distance': 0.2, 'land_cover': 0.1}
+    columns = sample_candidates('Kansas', 20, rng=np.random.default_rng(3), num_candidates=500)
+
+    assert rank_candidates(columns, 20, weights, {'max_slope': 5.0}) == \
+        rank_candidates_reference(columns, 20, weights, {'max_slope': 5.0})
+
+
+@pytest.mark.parametrize('constraints', [{}, {'max_slope': 3.0}])
+def test_blocks_rank_like_one_batch(monkeypatch, constraints):
+    monkeypatch.setattr(gee_queries, 'CANDIDATE_BLOCK_SIZE', 64)
+    blocks = list(sample_candidate_batches('Kansas', 10, rng=np.random.default_rng(5), num_candidates=500))
+    assert len(blocks) > 1
+    assert all(len(block) <= 64 for block in blocks)
+
+    columns = sample_candidates('Kansas', 10, rng=np.random.default_rng(5), constraints=constraints,
+                                num_candidates=500)
+    sites = analyze_solar_sites('Kansas', 10, constraints=constraints, seed=5, num_candidates=500)
+
+    assert sites == rank_candidates_reference(columns, 10, None, constraints)
+
+
+def test_region_without_candidates(monkeypatch):
+    # E.g. every Earth Engine cell of the state came back without data
+    monkeypatch.setattr(gee_queries, 'sample_candidate_batches', lambda *args: iter(()))
+
+    ranked, scored, _ = gee_queries._analyze_region('Kansas', 10, None, {}, 1, 'uniform', 100)
+
+    assert len(ranked) == 0
+    assert len(scored) == 0
+    assert scored.rank(10) == []
+    assert gee_queries.analyze_solar_regions(['Kansas', 'Nebraska'], 10, seed=1) == []
@@ -0,0 +1,67 @@
+"""TileStore lookups against synthetic tiles written by build_synthetic_tiles"""
+import os
+
+import numpy as np
+import pytest
+
+from gee_queries import sample_candidates
+from tile_store import NODATA, TileStore, build_synthetic_tiles
+
+BOUNDS = (-112.0, 33.0, -110.0, 34.0)
+RESOLUTION = 0.05
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('tiles')
+    build_synthetic_tiles(str(directory), resolution=RESOLUTION, bounds=BOUNDS, seed=7)
+    return TileStore(str(directory))
+
+
+def test_lookups_match_written_arrays(store):
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, store.height, 200)
+    cols = rng.integers(0, store.width, 200)
+    # Pixel centres, so rounding cannot move a point to a neighbour
+    lats = BOUNDS[3] - (rows + 0.5) * RESOLUTION
+    lons = BOUNDS[0] + (cols + 0.5) * RESOLUTION
+
+    values = store.sample(lats, lons)
+
+    assert store.layers['ghi'].shape == (20, 40)
+    for name in ('ghi', 'slope', 'land_cover'):
+        written = np.load(os.path.join(store.directory, f'{name}.npy'))
+        np.testing.assert_array_equal(values[name], written[rows, cols])
+
+
+def test_pixel_edges(store):
+    # The north-west corner is pixel (0, 0); the south and east edges are exclusive
+    rows, cols = store.pixel_indices([34.0, 33.0 + 1e-9], [-112.0, -110.0 - 1e-9])
+    assert rows.tolist() == [0, store.height - 1]
+    assert cols.tolist() == [0, store.width - 1]
+
+
+def test_out_of_extent_points_get_nodata(store):
+    lats = np.array([33.5, 35.0, 32.0, 33.5, 33.5, 33.0])
+    lons = np.array([-111.0, -111.0, -111.0, -113.0, -110.0, -111.0])
+
+    assert store.contains(lats, lons).tolist() == [True, False, False, False, False, True]
+    values = store.sample(lats, lons)
+    assert not np.isnan(values['ghi'][0])
+    assert np.isnan(values['ghi'][1:5]).all()
+    assert np.isnan(values['slope'][1:5]).all()
+    assert (values['land_cover'][1:5] == NODATA['land_cover']).all()
+    assert values['land_cover'][5] != NODATA['land_cover']
+
+
+def test_candidates_outside_the_tiles_are_dropped(tmp_path, monkeypatch):
+    # Tiles over the western half of Kansas only
+    bounds = (-102.1, 36.9, -98.0, 40.1)
+    build_synthetic_tiles(str(tmp_path), resolution=0.1, bounds=bounds)
+    monkeypatch.setenv('GRIDSIGHT_TILE_DIR', str(tmp_path))
+
+    columns = sample_candidates('Kansas', 10, rng=np.random.default_rng(1), num_candidates=400)
+
+    assert 0 < len(columns) < 400
+    assert (columns.lon < bounds[2]).all()
+    assert not np.isnan(columns.irradiance).any()
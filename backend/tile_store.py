@@ -0,0 +1,210 @@
+"""Local memory-mapped raster tile store for GHI, slope and land cover
+
+Pre-exported rasters live on disk as .npy files and are opened with
+numpy's mmap mode, so every gunicorn worker shares the same pages through
+the OS cache. Sampling a batch of (lat, lon) is a pure array index lookup.
+
+Build synthetic tiles for offline development and tests with:
+
+    python tile_store.py build --out data/tiles
+"""
+import argparse
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+MANIFEST_NAME = 'manifest.json'
+
+# Continental US extent (west, south, east, north)
+CONUS_BOUNDS = (-125.0, 24.0, -66.0, 50.0)
+
+LAYERS = {
+    'ghi': 'float32',         # NASA POWER GHI, kWh/m²/day
+    'slope': 'float32',       # SRTM-derived slope, degrees
+    'land_cover': 'uint8',    # ESA WorldCover class code
+}
+
+# Value sample() returns for points outside the raster extent
+NODATA = {
+    'ghi': np.nan,
+    'slope': np.nan,
+    'land_cover': 0,          # WorldCover's own no-data code
+}
+
+
+class TileStore:
+    """Read-only view over memory-mapped raster layers on a regular lat/lon grid"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            self.manifest = json.load(f)
+
+        self.west, self.south, self.east, self.north = self.manifest['bounds']
+        self.resolution = self.manifest['resolution']
+        self.height, self.width = self.manifest['shape']
+        self.layers = {
+            name: np.load(os.path.join(directory, spec['file']), mmap_mode='r')
+            for name, spec in self.manifest['layers'].items()
+        }
+
+    def pixel_indices(self, lats, lons):
+        """
+        Convert coordinate arrays into (row, col) pixel indices, clipped to the grid
+
+        Points outside the extent get the nearest edge pixel; use contains()
+        to tell them apart.
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        rows = np.floor((self.north - lats) / self.resolution).astype(np.intp)
+        cols = np.floor((lons - self.west) / self.resolution).astype(np.intp)
+        np.clip(rows, 0, self.height - 1, out=rows)
+        np.clip(cols, 0, self.width - 1, out=cols)
+        return rows, cols
+
+    def contains(self, lats, lons):
+        """Boolean mask of coordinates that fall inside the raster extent"""
+        lats = np.asarray(lats)
+        lons = np.asarray(lons)
+        return ((lats >= self.south) & (lats < self.north) &
+                (lons >= self.west) & (lons < self.east))
+
+    def sample(self, lats, lons, layers=None):
+        """
+        Look up raster values for a batch of coordinates
+
+        Args:
+            lats, lons: Coordinate arrays of equal length
+            layers: Layer names to read (default: all)
+
+        Returns:
+            Dict of layer name -> array of sampled values; points outside the
+            raster extent get the layer's NODATA value
+        """
+        rows, cols = self.pixel_indices(lats, lons)
+        outside = ~self.contains(lats, lons)
+        names = layers or list(self.layers)
+        values = {}
+        for name in names:
+            layer = np.asarray(self.layers[name][rows, cols])
+            if outside.any():
+                layer[outside] = NODATA.get(name, 0)
+            values[name] = layer
+        return values
+
+
+@lru_cache(maxsize=None)
+def _open_store(directory):
+    return TileStore(directory)
+
+
+def get_tile_store(directory=None):
+    """
+    Return the shared TileStore for GRIDSIGHT_TILE_DIR, or None if not set up
+
+    The store is opened once per process; the mapped pages themselves are
+    shared between processes by the OS.
+    """
+    directory = directory or os.getenv('GRIDSIGHT_TILE_DIR')
+    if not directory or not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+        return None
+    return _open_store(os.path.abspath(directory))
+
+
+def _smooth_noise(rng, shape, cells):
+    """Smooth random field in [0, 1] made by bilinear upsampling of a coarse grid"""
+    height, width = shape
+    coarse = rng.random((cells + 1, cells + 1))
+    y = np.linspace(0, cells, height)
+    x = np.linspace(0, cells, width)
+    y0 = np.minimum(y.astype(int), cells - 1)
+    x0 = np.minimum(x.astype(int), cells - 1)
+    fy = (y - y0)[:, None]
+    fx = (x - x0)[None, :]
+    top = coarse[y0][:, x0] * (1 - fx) + coarse[y0][:, x0 + 1] * fx
+    bottom = coarse[y0 + 1][:, x0] * (1 - fx) + coarse[y0 + 1][:, x0 + 1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def build_synthetic_tiles(directory, resolution=0.02, bounds=CONUS_BOUNDS, seed=42):
+    """
+    Write a deterministic synthetic tile set with realistic-looking patterns
+
+    GHI falls off with latitude and peaks in the desert southwest, slope
+    follows a smooth random terrain, and land cover is drawn from the same
+    class mix the simulators use.
+
+    Returns:
+        The directory the tiles were written to
+    """
+    west, south, east, north = bounds
+    width = int(round((east - west) / resolution))
+    height = int(round((north - south) / resolution))
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    # Pixel-centre coordinates
+    lats = north - (np.arange(height) + 0.5) * resolution
+    lons = west + (np.arange(width) + 0.5) * resolution
+    lat_grid = lats[:, None]
+    lon_grid = lons[None, :]
+
+    # Irradiance: latitude gradient plus a southwest desert bump
+    desert = np.exp(-(((lon_grid + 112.0) / 8.0) ** 2 + ((lat_grid - 34.0) / 5.0) ** 2))
+    ghi = 5.5 - np.abs(lat_grid - 25) * 0.05 + 0.5 + 0.8 * desert
+    ghi = ghi + (_smooth_noise(rng, (height, width), 40) - 0.5) * 0.6
+    ghi = np.clip(ghi, 3.0, 7.5).astype(np.float32)
+
+    # Slope: mostly flat with rugged patches, in degrees
+    terrain = _smooth_noise(rng, (height, width), 60) * _smooth_noise(rng, (height, width), 15)
+    slope = np.clip(terrain ** 2 * 30.0, 0.0, 15.0).astype(np.float32)
+
+    # Land cover: 70% suitable classes, clustered in smooth patches
+    classes = np.array([60, 30, 40, 10, 20, 50, 80], dtype=np.uint8)
+    bins = np.array([0.25, 0.5, 0.7, 0.8, 0.9, 0.96])
+    patch = _smooth_noise(rng, (height, width), 120)
+    order = np.argsort(patch, axis=None)
+    ranks = np.empty(order.size)
+    ranks[order] = np.linspace(0, 1, order.size)
+    land_cover = classes[np.digitize(ranks.reshape(height, width), bins)]
+
+    layers = {'ghi': ghi, 'slope': slope, 'land_cover': land_cover}
+    manifest = {
+        'bounds': list(bounds),
+        'resolution': resolution,
+        'shape': [height, width],
+        'synthetic': True,
+        'seed': seed,
+        'layers': {},
+    }
+    for name, dtype in LAYERS.items():
+        filename = f'{name}.npy'
+        np.save(os.path.join(directory, filename), layers[name].astype(dtype))
+        manifest['layers'][name] = {'file': filename, 'dtype': dtype}
+
+    with open(os.path.join(directory, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"[TILES] Wrote {width}x{height} synthetic tiles to {directory}")
+    return directory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage the local raster tile store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='Write synthetic tiles for offline use')
+    build.add_argument('--out', default=os.getenv('GRIDSIGHT_TILE_DIR', 'data/tiles'))
+    build.add_argument('--resolution', type=float, default=0.02, help='Pixel size in degrees')
+    build.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        build_synthetic_tiles(args.out, resolution=args.resolution, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
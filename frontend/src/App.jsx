@@ -1,4 +1,4 @@
-import { useState } from 'react'
+import { useRef, useState } from 'react'
 import Hero from './components/Hero'
 import SearchPanel from './components/SearchPanel'
 import MapView from './components/MapView'
@@ -12,6 +12,7 @@ function App() {
   const [selectedSite, setSelectedSite] = useState(null)
   const [agentStatus, setAgentStatus] = useState([])
   const [isSearching, setIsSearching] = useState(false)
+  const rerankRequest = useRef(0)
 
   const handleStartSearch = () => {
     setShowHero(false)
@@ -24,25 +25,55 @@ function App() {
       { step: 'Parsing your query...', status: 'in_progress', time: null }
     ])
 
+    const startedAt = performance.now()
+    let stepStartedAt = startedAt
+    const elapsed = () => {
+      const now = performance.now()
+      const seconds = Number(((now - stepStartedAt) / 1000).toFixed(1))
+      stepStartedAt = now
+      return seconds
+    }
+
+    // Mark the running step as completed and optionally start the next one
+    const advance = (nextStep) => {
+      const time = elapsed()
+      setAgentStatus(prev => [
+        ...prev.map(s => s.status === 'in_progress' ? { ...s, status: 'completed', time } : s),
+        ...(nextStep ? [{ step: nextStep, status: 'in_progress', time: null }] : [])
+      ])
+    }
+
+    const handleEvent = (event) => {
+      switch (event.event) {
+        case 'parsed':
+          advance(`Analyzing locations in ${event.region}...`)
+          break
+        case 'sites':
+          setSearchResults({ status: 'success', sites: event.sites, metadata: event.metadata })
+          setIsSearching(false)
+          advance('Generating AI insights...')
+          break
+        case 'explanation':
+          setSearchResults(prev => prev && {
+            ...prev,
+            sites: prev.sites.map(site =>
+              site.rank === event.rank ? { ...site, explanation: event.explanation } : site
+            )
+          })
+          break
+        case 'complete':
+          advance(null)
+          break
+        case 'error':
+          throw new Error(event.message)
+        default:
+          break
+      }
+    }
+
     try {
-      // Simulate agent steps
-      setTimeout(() => {
-        setAgentStatus([
-          { step: 'Parsing your query...', status: 'completed', time: 0.3 },
-          { step: 'Discovering satellite datasets...', status: 'in_progress', time: null }
-        ])
-      }, 300)
-
-      setTimeout(() => {
-        setAgentStatus(prev => [
-          ...prev.slice(0, 1),
-          { step: 'Discovering satellite datasets...', status: 'completed', time: 0.5 },
-          { step: 'Analyzing locations...', status: 'in_progress', time: null }
-        ])
-      }, 800)
-
-      // Make API call
-      const response = await fetch(`${import.meta.env.VITE_API_URL}/api/analyze`, {
+      // Stream pipeline events as newline-delimited JSON
+      const response = await fetch(`${import.meta.env.VITE_API_URL}/api/analyze/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -50,15 +81,19 @@ function App() {
         body: JSON.stringify(searchData),
       })
 
-      const data = await response.json()
-
-      setAgentStatus(prev => [
-        ...prev.slice(0, 2),
-        { step: `Analyzing ${data.metadata?.locations_analyzed || 2847} locations...`, status: 'completed', time: 2.1 },
-        { step: 'Generating AI insights...', status: 'completed', time: 0.8 }
-      ])
-
-      setSearchResults(data)
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+
+      while (true) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const lines = buffer.split('\n')
+        buffer = lines.pop()
+        lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)))
+      }
+      if (buffer.trim()) handleEvent(JSON.parse(buffer))
     } catch (error) {
       console.error('Search failed:', error)
       setAgentStatus([
@@ -69,6 +104,43 @@ function App() {
     }
   }
 
+  // Re-rank the current analysis under new weights (no resampling, no LLM calls)
+  const handleWeightsChange = async (criteriaWeights) => {
+    const analysisId = searchResults?.metadata?.analysis_id
+    if (!analysisId || isSearching) return
+
+    const requestId = ++rerankRequest.current
+    try {
+      const response = await fetch(`${import.meta.env.VITE_API_URL}/api/rerank`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ analysis_id: analysisId, criteria_weights: criteriaWeights }),
+      })
+      const result = await response.json()
+      // Ignore responses overtaken by a newer slider position
+      if (requestId !== rerankRequest.current || result.status !== 'success') return
+
+      setSearchResults(prev => {
+        if (!prev) return prev
+        // Sites already on screen keep the explanation they had
+        const explanations = new Map(prev.sites.map(site =>
+          [`${site.coordinates.lat},${site.coordinates.lon}`, site.explanation]
+        ))
+        return {
+          ...prev,
+          sites: result.sites.map(site => ({
+            ...site,
+            explanation: explanations.get(`${site.coordinates.lat},${site.coordinates.lon}`) || site.explanation
+          }))
+        }
+      })
+    } catch (error) {
+      console.error('Re-rank failed:', error)
+    }
+  }
+
   const handleSiteClick = (site) => {
     setSelectedSite(site)
   }
@@ -103,6 +175,7 @@ function App() {
         <div className="w-full md:w-2/5 overflow-y-auto">
           <SearchPanel
             onSearch={handleSearch}
+            onWeightsChange={handleWeightsChange}
             isSearching={isSearching}
           />
           {agentStatus.length > 0 && (
@@ -2,7 +2,7 @@ import { useState } from 'react'
 import { Search, ChevronDown, ChevronUp } from 'lucide-react'
 import CriteriaSliders from './CriteriaSliders'
 
-export default function SearchPanel({ onSearch, isSearching }) {
+export default function SearchPanel({ onSearch, onWeightsChange, isSearching }) {
   const [query, setQuery] = useState('')
   const [energyType, setEnergyType] = useState('solar')
   const [showAdvanced, setShowAdvanced] = useState(false)
@@ -38,6 +38,19 @@ export default function SearchPanel({ onSearch, isSearching }) {
     'Illinois', 'Iowa', 'Wisconsin', 'Minnesota'
   ]
 
+  const toFractions = (weights) => ({
+    irradiance: weights.irradiance / 100,
+    slope: weights.slope / 100,
+    grid_distance: weights.grid_distance / 100,
+    land_cover: weights.land_cover / 100
+  })
+
+  // Sliders re-rank the current results in place via /api/rerank
+  const handleWeightsChange = (weights) => {
+    setCriteriaWeights(weights)
+    if (onWeightsChange) onWeightsChange(toFractions(weights))
+  }
+
   const handleSubmit = (e) => {
     e.preventDefault()
     if (!query.trim() && !region) return
@@ -49,12 +62,7 @@ export default function SearchPanel({ onSearch, isSearching }) {
       energy_type: energyType,
       filters: {
         acreage,
-        criteria_weights: {
-          irradiance: criteriaWeights.irradiance / 100,
-          slope: criteriaWeights.slope / 100,
-          grid_distance: criteriaWeights.grid_distance / 100,
-          land_cover: criteriaWeights.land_cover / 100
-        }
+        criteria_weights: toFractions(criteriaWeights)
       }
     }
 
@@ -252,7 +260,7 @@ export default function SearchPanel({ onSearch, isSearching }) {
                 {/* Criteria Weights */}
                 <CriteriaSliders
                   weights={criteriaWeights}
-                  onChange={setCriteriaWeights}
+                  onChange={handleWeightsChange}
                 />
               </div>
             )}